@@ -0,0 +1,325 @@
+"""Benchmark suite for the VPP dashboard and its simulation core.
+
+Times each stage on its own at several scales, then end-to-end page
+reruns through Streamlit's ``AppTest`` harness, and appends one JSON
+record per measurement to a JSON-lines file so runs can be compared over
+time.  The default file, ``benchmarks/results.jsonl``, holds this
+machine's timings and is ignored by git:
+
+    python benchmarks/bench_vpp.py                    # full suite
+    python benchmarks/bench_vpp.py --quick            # smallest scales only
+    python benchmarks/bench_vpp.py --only dispatch fleet
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from vpp import dispatch, engine, events, forecast, physics, scheduling, thermal, tiles, timeseries  # noqa: E402
+from vpp.fleet import Fleet  # noqa: E402
+from vpp.zones import ZoneRegistry  # noqa: E402
+
+ZONE_SCALES = [4, 100, 1_000, 10_000]
+FLEET_SCALES = [100_000, 1_000_000, 5_000_000]
+DEFAULT_OUT = ROOT / "benchmarks" / "results.jsonl"
+
+
+def timeit(fn, min_time=0.2, max_repeat=50):
+    """Run ``fn`` until ``min_time`` has elapsed (at least 3 runs); return timings."""
+    fn()  # warm-up
+    times, started = [], time.perf_counter()
+    while len(times) < 3 or (time.perf_counter() - started < min_time and len(times) < max_repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return times
+
+
+class Recorder:
+    def __init__(self, out):
+        self.out = out
+        self.meta = {
+            "run_id": uuid.uuid4().hex[:12],
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_rev": _git_rev(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+        }
+        self.records = []
+
+    def record(self, stage, scale, times):
+        rec = dict(self.meta, stage=stage, scale=scale, n=len(times),
+                   min_s=min(times), median_s=statistics.median(times), mean_s=statistics.fmean(times))
+        self.records.append(rec)
+        print(f"{stage:<28} {scale:>10,}  median {rec['median_s'] * 1e3:10.3f} ms  min {rec['min_s'] * 1e3:10.3f} ms")
+
+    def save(self):
+        self.out.parent.mkdir(parents=True, exist_ok=True)
+        with self.out.open("a") as fh:
+            for rec in self.records:
+                fh.write(json.dumps(rec) + "\n")
+
+
+def _git_rev():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ---------------------------------------------------------
+# المراحل (Stages)
+# ---------------------------------------------------------
+def bench_physics(rec, zone_scales, fleet_scales):
+    rec.record("physics.scalar", 1, timeit(lambda: physics.grid_physics(20, 60, 14.3, 4.0, 18.0)))
+    axes = (np.arange(0, 51), np.arange(0, 81), np.linspace(8, 20, 13), np.linspace(2, 8, 7), np.linspace(15, 25, 11))
+    n = int(np.prod([len(a) for a in axes]))
+    rec.record("physics.sweep", n, timeit(lambda: physics.scenario_sweep(*axes)))
+
+
+def bench_fleet(rec, zone_scales, fleet_scales):
+    zones = ZoneRegistry.synthetic(max(zone_scales), seed=0)
+    for n in fleet_scales:
+        rec.record("fleet.synthesize", n, timeit(
+            lambda: Fleet.synthesize(zones.ev_density, n, zone_lat=zones.lat, zone_lon=zones.lon, seed=1),
+            max_repeat=3))
+        fleet = Fleet.synthesize(zones.ev_density, n, zone_lat=zones.lat, zone_lon=zones.lon, seed=1)
+        rec.record("fleet.summary_full_pass", n, timeit(
+            lambda: fleet.summary(plug_status=fleet.participation_status(20, 60)), max_repeat=10))
+        rec.record("fleet.participation_summary", n, timeit(lambda: fleet.participation_summary(20, 60)))
+        status = fleet.participation_status(20, 60)
+        bbox = zones.bounds(pad_deg=0.1)
+        rec.record("tiles.city_view", n, timeit(
+            lambda: tiles.fleet_view(fleet.lat, fleet.lon, status, bbox, 9.5), max_repeat=10))
+
+
+def bench_dispatch(rec, zone_scales, fleet_scales):
+    rng = np.random.default_rng(0)
+    for z in zone_scales:
+        available = rng.random(z) * 50
+        local = np.where(rng.random(z) < 0.1, rng.random(z) * 5, 0.0)
+        cost = rng.random(z)
+        target = available.sum() * 0.6
+        rec.record("dispatch.pro_rata", z, timeit(lambda: dispatch.allocate(target, available, local, sell_price=0.8)))
+        rec.record("dispatch.merit_order", z, timeit(lambda: dispatch.allocate(target, available, local, cost=cost)))
+
+
+def bench_views(rec, zone_scales, fleet_scales):
+    rng = np.random.default_rng(0)
+    for z in zone_scales:
+        zones = ZoneRegistry.synthetic(z, seed=0)
+        mw = np.where(rng.random(z) < 0.5, rng.random(z) * 50, 0.0)
+        payout = dispatch.settlement_payout(mw, 0.8)
+        rec.record("views.map_data", z, timeit(
+            lambda: (engine.map_status(mw, 0.0, False), zones.zone_loads(14.4))))
+        rec.record("views.table_data", z, timeit(lambda: engine.settlement_frame(zones.name, mw, payout, True)))
+
+
+def bench_scheduling(rec, zone_scales, fleet_scales):
+    zones = ZoneRegistry.synthetic(max(zone_scales), seed=0)
+    tariff = scheduling.tariff_from_prices(0.8, 0.18)
+    headroom = scheduling.headroom_profile(18.4, 0.4, 18.0)
+    for n in fleet_scales:
+        fleet = Fleet.synthesize(zones.ev_density, n, seed=1)
+        status = fleet.participation_status(20, 60)
+        rec.record("scheduling.cohorts", n, timeit(lambda: scheduling.fleet_cohorts(fleet, status, seed=7), max_repeat=10))
+        cohorts = scheduling.fleet_cohorts(fleet, status, seed=7)
+        rec.record("scheduling.schedule_fleet", n, timeit(
+            lambda: scheduling.schedule_fleet(cohorts, tariff, headroom), max_repeat=10))
+
+
+def bench_events(rec, zone_scales, fleet_scales):
+    for n in fleet_scales:
+        zones = ZoneRegistry.synthetic(zone_scales[-1], seed=0)
+        fleet = Fleet.synthesize(zones.ev_density, n, seed=1)
+        plan = events.plan_trips(fleet, 2, work_zone_share=zones.load, seed=7)
+        rec.record("events.plan_trips", n, timeit(lambda: events.plan_trips(fleet, 2, work_zone_share=zones.load, seed=7),
+                                                  max_repeat=5))
+        rec.record("events.simulate_availability", len(plan.time_min),
+                   timeit(lambda: events.simulate_availability(fleet, plan=plan), max_repeat=3))
+
+
+def bench_forecast(rec, zone_scales, fleet_scales):
+    for z in zone_scales:
+        zones = ZoneRegistry.synthetic(z, seed=0)
+        values = timeseries.simulate_load(zones.zone_loads(14.3), days=29, step_minutes=15, seed=1).load
+        model = forecast.SeasonalForecaster.fit(values, 0.0)
+        rec.record("forecast.fit_29d", z, timeit(lambda: forecast.SeasonalForecaster.fit(values, 0.0), max_repeat=5))
+        step = values[:, -1]
+        rec.record("forecast.update_step", z, timeit(lambda: model.update(step)))
+        rec.record("forecast.forecast_48h", z, timeit(lambda: (model._cache.clear(), model.forecast(192))))
+        load_fc = model.forecast(192)
+        available = np.full(load_fc.mean.shape, 50.0)
+        capacity = zones.zone_capacity(16.0)
+        rec.record("engine.commit_day_ahead", z, timeit(lambda: engine.commit_day_ahead(load_fc.mean, capacity, available)))
+
+
+def bench_history(rec, zone_scales, fleet_scales):
+    import tempfile
+
+    from vpp import history
+
+    # سنة بدقة دقيقة واحدة لكل حي (one year of one-minute steps per zone)
+    with tempfile.TemporaryDirectory() as tmp:
+        for z in zone_scales[:2]:
+            zones = ZoneRegistry.synthetic(z, seed=0)
+            loads, caps = zones.zone_loads(14.3), zones.zone_capacity(18.0)
+
+            def fresh(days):
+                store = history.HistoryStore(Path(tmp) / uuid.uuid4().hex, n_zones=z, step_s=60, start_ts=0.0,
+                                             capacity_steps=days * 1440)
+                return history.backfill(store, loads, caps, days=days, seed=1)
+            rec.record("history.backfill_week_1min", z, timeit(lambda: fresh(7), max_repeat=5))
+            store = fresh(365)
+            for days in (1, 30, 365):
+                window = store.window("load_gw", 0.0, days * 86400.0, zone=0)
+                for method in ("minmax", "lttb"):
+                    rec.record(f"history.{method}_{days}d", len(window.values), timeit(
+                        lambda: history.downsample(store.window("load_gw", 0.0, days * 86400.0, zone=0), 2000, method),
+                        max_repeat=10))
+
+
+def bench_network(rec, zone_scales, fleet_scales):
+    from vpp.network import DCNetwork
+
+    rng = np.random.default_rng(0)
+    for n in (1_000, 10_000):
+        rec.record("network.build_factorize", n, timeit(lambda: DCNetwork.synthetic(n, seed=0), max_repeat=5))
+        net = DCNetwork.synthetic(n, seed=0)
+        injection = -rng.random(n) * 10
+        rec.record("network.solve", n, timeit(lambda: net.solve(injection)))
+        batch = -rng.random((n, 100)) * 10
+        rec.record("network.solve_x100", n, timeit(lambda: net.solve(batch), max_repeat=10))
+        buses = rng.choice(n, 100, replace=False)
+        flow = net.solve(injection).flow_mw
+        rec.record("network.relief_100_buses", n, timeit(lambda: net.relief_needed(flow, buses), max_repeat=10))
+
+
+def bench_thermal(rec, zone_scales, fleet_scales):
+    for z in zone_scales:
+        zones = ZoneRegistry.synthetic(z, seed=0)
+        peak = zones.zone_loads(14.3) * 1000
+        fleet = thermal.TransformerFleet.synthesize(peak, seed=1)
+        loads = zones.zone_loads(14.4)
+        dispatch_mw = np.full(z, 50.0)
+        rec.record("thermal.daily_aging", len(fleet),
+                   timeit(lambda: thermal.daily_aging(fleet, loads, dispatch_mw, seed=99), max_repeat=10))
+    # سنة كاملة على دفعات زمنية (a year of 15-min steps, chunked)
+    fleet = thermal.TransformerFleet.synthesize(ZoneRegistry.synthetic(zone_scales[0], seed=0).zone_loads(14.3) * 1000, seed=1)
+    steps = 365 * 96
+    day = np.tile(np.linspace(0.6, 1.1, 96), 365)
+    load_pu = np.broadcast_to(day, (len(fleet), steps))
+    ambient = thermal.riyadh_ambient(np.arange(steps) * 0.25)
+    rec.record("thermal.simulate_aging_year", len(fleet),
+               timeit(lambda: thermal.simulate_aging(fleet, load_pu, ambient), max_repeat=3))
+
+
+def bench_batch(rec, zone_scales, fleet_scales):
+    zones, fleet, _ = engine.default_world(fleet_size=fleet_scales[0], seed=7)
+    rng = np.random.default_rng(0)
+    for n in (100, 10_000):
+        frame = pd.DataFrame({"pct_charging": rng.integers(0, 51, n), "pct_v2g": rng.integers(0, 81, n)})
+        rec.record("engine.run_batch", n, timeit(lambda: engine.run_batch(frame, zones, fleet), max_repeat=10))
+
+
+def bench_figures(rec, zone_scales, fleet_scales):
+    import figures
+
+    rng = np.random.default_rng(0)
+    rec.record("figures.gauge", 1, timeit(lambda: figures.gauge(95, "Weak Transformers (Load %)", "red")))
+    series = timeseries.simulate_load(18.4, dispatch_gw=0.4, seed=99)
+    rec.record("figures.load_curve", 24, timeit(lambda: figures.load_curve(series)))
+    fleet = Fleet.synthesize(np.ones(10), fleet_scales[0], seed=1)
+    plan = scheduling.schedule_fleet(scheduling.fleet_cohorts(fleet, fleet.participation_status(20, 60), seed=7),
+                                     scheduling.tariff_from_prices(0.8, 0.18), scheduling.headroom_profile(18.4, 0.4, 18.0))
+    rec.record("figures.charging_profile", scheduling.INTERVALS, timeit(lambda: figures.charging_profile(plan)))
+    hot_spot = rng.normal(105, 12, 10_000)
+    rec.record("figures.hot_spot_histogram", len(hot_spot),
+               timeit(lambda: figures.hot_spot_histogram(hot_spot - 4, hot_spot)))
+    for z in zone_scales:
+        zones = ZoneRegistry.synthetic(z, seed=0)
+        status = rng.integers(0, 3, z)
+        loads = zones.zone_loads(14.4)
+        rec.record("figures.grid_map", z, timeit(lambda: figures.grid_map(zones, status, loads), max_repeat=10))
+    zones = ZoneRegistry.synthetic(max(zone_scales), seed=0)
+    for n in fleet_scales:
+        fleet = Fleet.synthesize(zones.ev_density, n, zone_lat=zones.lat, zone_lon=zones.lon, seed=1)
+        view = tiles.fleet_view(fleet.lat, fleet.lon, fleet.participation_status(20, 60), zones.bounds(0.1), 9.5)
+        rec.record("figures.fleet_map", n, timeit(lambda: figures.fleet_map(view, (24.75, 46.65), 9.5)))
+
+
+def bench_apptest(rec, zone_scales, fleet_scales):
+    from streamlit.testing.v1 import AppTest
+
+    script = str(ROOT / "et_test.py")
+
+    def cold():
+        AppTest.from_file(script, default_timeout=120).run()
+
+    at = AppTest.from_file(script, default_timeout=120)
+    at.run()
+    slider = [s for s in at.slider if s.label.startswith("Sell Price")][0]
+    prices = iter(np.tile([0.8, 0.9], 1000))
+
+    def slider_change():
+        slider.set_value(float(next(prices))).run()
+
+    def dispatch_toggle():
+        # ACTIVATE ثم SCRAM: كل نقرة تعيد تشغيل الصفحة مرتين بسبب st.rerun (each click reruns twice)
+        [b for b in at.button if "ACTIVATE" in b.label or "SCRAM" in b.label][0].click().run()
+
+    rec.record("apptest.cold_run", 1, timeit(cold, max_repeat=5))
+    rec.record("apptest.rerun", 1, timeit(at.run, max_repeat=10))
+    rec.record("apptest.slider_change", 1, timeit(slider_change, max_repeat=10))
+    rec.record("apptest.dispatch_toggle", 1, timeit(dispatch_toggle, max_repeat=10))
+
+
+STAGES = {
+    "physics": bench_physics,
+    "fleet": bench_fleet,
+    "dispatch": bench_dispatch,
+    "views": bench_views,
+    "scheduling": bench_scheduling,
+    "events": bench_events,
+    "history": bench_history,
+    "forecast": bench_forecast,
+    "network": bench_network,
+    "thermal": bench_thermal,
+    "batch": bench_batch,
+    "figures": bench_figures,
+    "apptest": bench_apptest,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="+", choices=sorted(STAGES), help="run only these stages")
+    parser.add_argument("--quick", action="store_true", help="smallest zone and fleet scales only")
+    parser.add_argument("--out", type=Path, default=DEFAULT_OUT, help="JSON-lines results file (appended)")
+    args = parser.parse_args(argv)
+
+    zone_scales = ZONE_SCALES[:2] if args.quick else ZONE_SCALES
+    fleet_scales = FLEET_SCALES[:1] if args.quick else FLEET_SCALES
+    rec = Recorder(args.out)
+    for name in args.only or STAGES:
+        STAGES[name](rec, zone_scales, fleet_scales)
+    rec.save()
+    print(f"\n{len(rec.records)} measurements appended to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
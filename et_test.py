@@ -1,17 +1,43 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import plotly.graph_objects as go
-import plotly.express as px
+import os
 import time
+import uuid
+
+import figures
+from vpp import dispatch, engine, events, forecast, montecarlo, physics, scheduling, thermal, tiles, timeseries
+from vpp.cache import cache_stats, memoize
+from vpp.constants import AVG_CHARGER_CAPACITY_KW, GRID_VOLTAGE_LIMIT_MW, TOTAL_FLEET
+from vpp.control import ControlInputs, DispatchController
+from vpp.fleet import V2G_READY, Fleet
+from vpp.history import (
+    ALL_ZONES, CITY, DEFAULT_HISTORY_DIR, GROSS_LOAD, HistoryRecorder, HistoryStore, backfill, downsample,
+)
+from vpp.ledger import SettlementLedger
+from vpp.network import DCNetwork
+from vpp.profiling import Profiler
+from vpp.state import GridStateStore
+from vpp.telemetry import ReplaySource, SyntheticSource, TelemetryAggregator, TelemetryPipeline
+from vpp.zones import ZoneRegistry
 
 # ---------------------------------------------------------
 # 1. إعدادات الصفحة (System Configuration)
 # ---------------------------------------------------------
 st.set_page_config(layout="wide", page_title="Riyadh VPP Command Center", page_icon="⚡", initial_sidebar_state="expanded")
 
+# قياس زمن أقسام الصفحة في كل إعادة تشغيل (Per-rerun section timings, shared by all sessions)
+@st.cache_resource
+def get_profiler():
+    return Profiler(jsonl_path=os.environ.get("VPP_PROFILE_JSONL"), prom_path=os.environ.get("VPP_PROFILE_PROM"))
+
+PROFILER = get_profiler()
+PROFILER.begin_run(view=st.session_state.get('selected_zone'))
+span = PROFILER.span
+
 # [Visual Styling]: النسخة البيضاء (Light Mode Corporate Style)
-st.markdown("""
+with span("css"):
+    st.markdown("""
 <style>
     /* 1. الخلفية العامة والنصوص */
     .stApp { 
@@ -134,18 +160,26 @@ st.markdown("""
 # ---------------------------------------------------------
 # 2. الثوابت والمعايير الهندسية (Engineering Constants)
 # ---------------------------------------------------------
-AVG_CHARGER_CAPACITY_KW = 8.5 
-CHARGING_CONCURRENCY_FACTOR = 0.85 
-INVERTER_EFFICIENCY = 0.95 
-GRID_VOLTAGE_LIMIT_MW = 250.0 
-
-# تعريف أوزان الأحياء (Data Model)
-ZONE_WEIGHTS = {
-    "Al-Olaya (Business)": {"load": 0.35, "ev_density": 0.40, "lat": 24.69, "lon": 46.68},
-    "Al-Malqa (North)":    {"load": 0.25, "ev_density": 0.30, "lat": 24.81, "lon": 46.60},
-    "Al-Nargis (Res.)":    {"load": 0.25, "ev_density": 0.20, "lat": 24.84, "lon": 46.66},
-    "Diplomatic Quarter":  {"load": 0.15, "ev_density": 0.10, "lat": 24.68, "lon": 46.62},
-}
+# سجل الأحياء والمحطات (Zone / substation registry, data/riyadh_zones.csv)
+@st.cache_resource
+def load_zone_registry():
+    return ZoneRegistry.from_file()
+
+ZONES = load_zone_registry()
+
+# شبكة النقل والتوزيع: حافلات وخطوط (bus / line network, data/riyadh_network.csv)
+@st.cache_resource
+def load_network():
+    return DCNetwork.from_file()
+
+NETWORK = load_network()
+
+# المحولات لكل حي، مقاسة على الحمل الافتراضي (per-zone transformer assets, sized against the default load)
+@st.cache_resource
+def load_transformers():
+    return thermal.TransformerFleet.synthesize(ZONES.zone_loads(14.3) * 1000, seed=99)
+
+TRANSFORMERS = load_transformers()
 
 # ---------------------------------------------------------
 # 3. إدارة الحالة (Session State Management)
@@ -155,62 +189,298 @@ if 'global_grid_cap' not in st.session_state: st.session_state.global_grid_cap =
 if 'base_residential_load' not in st.session_state: st.session_state.base_residential_load = 14.3
 if 'sell_price' not in st.session_state: st.session_state.sell_price = 0.80
 if 'buy_price' not in st.session_state: st.session_state.buy_price = 0.18
-if 'dispatch_active' not in st.session_state: st.session_state.dispatch_active = False
+if 'operator_id' not in st.session_state: st.session_state.operator_id = uuid.uuid4().hex[:8]
 
-if 'zones_data' not in st.session_state:
-    st.session_state.zones_data = {
-        z: {"status": "STABLE", "payout": 0, "dispatched_mw": 0, "local_deficit": 0} 
-        for z in ZONE_WEIGHTS.keys()
-    }
+# حالة التوزيع مشتركة بين كل المشغّلين (Dispatch state is one store shared by every operator session)
+@st.cache_resource
+def get_grid_state():
+    return GridStateStore(ZONES.names)
+
+GRID_STATE = get_grid_state()
+
+# أسطول المركبات مشترك بين الجلسات (Per-vehicle fleet store, shared by all sessions)
+@st.cache_resource
+def load_fleet():
+    return Fleet.synthesize(
+        ZONES.ev_density, TOTAL_FLEET, zone_lat=ZONES.lat, zone_lon=ZONES.lon, seed=99,
+    )
+
+# سجل التسويات الدائم (Persistent settlement ledger, shared by all sessions)
+@st.cache_resource
+def get_ledger():
+    return SettlementLedger(batch_size=1)
+
+# قراءات العدادات والشواحن الحية (Live meter / charger telemetry, shared by all sessions)
+TELEMETRY_REPLAY_FILE = os.environ.get("VPP_TELEMETRY_REPLAY")
+
+# السجل التاريخي على القرص: سنة محاكاة ثم القراءات الحية (on-disk history: a simulated year, then live readings)
+HISTORY_DIR = os.environ.get("VPP_HISTORY_DIR", DEFAULT_HISTORY_DIR)
+HISTORY_STEP_S = 900
+
+# العجز المسجل من تدفق القدرة نفسه الذي يعرضه الحي (recorded deficits come from the same power flow as the live view)
+def zone_deficit_gw(zone_load_gw):
+    return engine.zone_balance(zone_load_gw.T, 18.0, ZONES, NETWORK)[2].T
+
+@st.cache_resource
+def get_history():
+    store = HistoryStore(HISTORY_DIR, n_zones=len(ZONES), step_s=HISTORY_STEP_S, start_ts=time.time() - 365 * 86400)
+    if not len(store):
+        backfill(store, ZONES.zone_loads(14.3), ZONES.zone_capacity(18.0),
+                 zone_dispatch_gw=load_fleet().participation_summary(20, 60).zone_vpp_mw / 1000.0, days=365, seed=99,
+                 zone_deficit=zone_deficit_gw)
+    return store
+
+# التنبؤ بالحمل لكل حي، يُحدَّث تدريجياً من السجل (per-zone load forecaster, updated incrementally from the history)
+FORECAST_FIT_DAYS = 28
+
+@st.cache_resource
+def get_load_forecaster():
+    history = get_history()
+    # الحمل الإجمالي لا الصافي، وإلا قُدّر الالتزام بأقل من اللازم (gross load: net load already has V2G taken off)
+    window = history.window(GROSS_LOAD, history.end_ts - (FORECAST_FIT_DAYS + 1) * 86400, zone=ALL_ZONES)
+    return forecast.SeasonalForecaster.fit(window.values, window.start_ts, step_s=HISTORY_STEP_S)
+
+@st.cache_resource
+def get_telemetry_pipeline():
+    if TELEMETRY_REPLAY_FILE:
+        source = ReplaySource(TELEMETRY_REPLAY_FILE, speed=1.0)
+    else:
+        # مصدر تجريبي بديل (synthetic stand-in around the default residential load)
+        source = SyntheticSource(ZONES.load * 14.3 * 1000, chargers_per_zone=TOTAL_FLEET // len(ZONES), seed=7)
+    recorder = HistoryRecorder(get_history(), ZONES.zone_capacity(18.0), grid_state=GRID_STATE,
+                               zone_deficit=zone_deficit_gw)
+    return TelemetryPipeline(source, TelemetryAggregator(len(ZONES)), on_batch=recorder).start()
+
+# حلقة التحكم في الخلفية: إعادة التوزيع كل ثانية وتصاعد العواكس (Background control loop: re-allocation every second, inverter ramping)
+@st.cache_resource
+def get_controller():
+    return DispatchController(GRID_STATE, load_fleet(), ledger=get_ledger(), interval=1.0,
+                              zones=ZONES, network=NETWORK).start()
+
+CONTROLLER = get_controller()
 
 # ---------------------------------------------------------
 # 4. المحرك الفيزيائي (Physics Engine Core)
 # ---------------------------------------------------------
+@memoize(maxsize=64)
+def get_fleet_summary(pct_charging, pct_v2g):
+    return load_fleet().participation_summary(pct_charging, pct_v2g)
+
+@memoize(maxsize=256)
+def _grid_physics(pct_charging, pct_v2g, base_residential_load, industrial_load, global_grid_cap, ev_load_kw=None):
+    # التجميع من أسطول المركبات (Aggregates come from the per-vehicle fleet)
+    fleet_summary = get_fleet_summary(pct_charging, pct_v2g)
+    if ev_load_kw is not None:
+        fleet_summary = fleet_summary._replace(ev_load_kw=ev_load_kw)
+    result = physics.fleet_physics(fleet_summary, base_residential_load, industrial_load, global_grid_cap)
+    return tuple(v.item() for v in result)
+
 def calculate_grid_physics(pct_charging, pct_v2g):
-    total_fleet = 100000
-    
-    # 1. حمل الشحن
-    num_charging = int(total_fleet * (pct_charging / 100))
-    ev_load_total_kw = num_charging * AVG_CHARGER_CAPACITY_KW * CHARGING_CONCURRENCY_FACTOR 
-    ev_load_gw = ev_load_total_kw / 1e6 
-    
-    # 2. الأحمال الكلية
-    total_res_load = st.session_state.base_residential_load + ev_load_gw
-    total_city_load = total_res_load + st.session_state.industrial_load
-    
-    # 3. العجز
-    grid_cap = st.session_state.global_grid_cap
-    raw_deficit = max(0, total_city_load - grid_cap)
-    
-    # 4. قدرة VPP
-    num_v2g = int(total_fleet * (pct_v2g / 100))
-    vpp_cap_mw = (num_v2g * AVG_CHARGER_CAPACITY_KW * INVERTER_EFFICIENCY) / 1000.0 
-    
-    return total_city_load, total_res_load, raw_deficit, vpp_cap_mw, num_charging, num_v2g
+    return _grid_physics(
+        pct_charging, pct_v2g,
+        st.session_state.base_residential_load,
+        st.session_state.industrial_load,
+        st.session_state.global_grid_cap,
+        ev_load_kw=st.session_state.get('live_ev_load_kw'),
+    )
+
+def push_control_inputs(pct_charging, pct_v2g, force=False):
+    """Hand this operator's inputs to the control loop when they changed since they last did."""
+    grid = GRID_STATE.snapshot()
+    if not (grid.dispatch_active or force):
+        st.session_state.pop('dispatch_inputs', None)
+        return grid
+    live = st.session_state.get('live_ev_load_kw') is not None
+    inputs = ControlInputs(
+        None if live else st.session_state.base_residential_load,
+        st.session_state.industrial_load, st.session_state.global_grid_cap,
+        pct_charging, pct_v2g, st.session_state.sell_price, live_telemetry=live,
+    )
+    # جلسة تنضم أثناء التوزيع تتبنّى مدخلات التوزيع القائم (a session joining mid-dispatch adopts the running inputs)
+    if not force and st.session_state.setdefault('dispatch_inputs', inputs) == inputs:
+        return grid
+    st.session_state.dispatch_inputs = inputs
+    CONTROLLER.set_inputs(inputs)
+    return grid
+
+# ---------------------------------------------------------
+# 5. مصنع الرسوم البيانية (Figure Builders)
+# ---------------------------------------------------------
+# الرسوم مخزنة حسب مدخلاتها فقط، فلا تُعدّل بعد الإنشاء (Cached figures are shared: never mutate them)
+# تدفق القدرة بعد كل تغيير في التوزيع، بنفس التفكيك المخزن (power flow after each dispatch change, reusing the cached factorization)
+@memoize(maxsize=64)
+def solve_network(total_res_load, dispatched_mw):
+    flow, buses = engine.zone_power_flow(NETWORK, ZONES, ZONES.zone_loads(total_res_load), dispatched_mw)
+    return flow, NETWORK.relief_needed(flow.flow_mw, buses) / 1000.0
+
+# يوم حراري لكل المحولات مع الحقن الحالي وبدونه (one thermal day for every asset, with and without the current V2G)
+@memoize(maxsize=32)
+def run_thermal(total_res_load, dispatched_mw):
+    return thermal.daily_aging(TRANSFORMERS, ZONES.zone_loads(total_res_load), dispatched_mw, seed=99)
+
+@memoize(maxsize=16)
+def build_hot_spot_histogram(total_res_load, dispatched_mw):
+    with_v2g, without = run_thermal(total_res_load, dispatched_mw)
+    return figures.hot_spot_histogram(with_v2g.peak_hot_spot_c, without.peak_hot_spot_c)
+
+@memoize(maxsize=32)
+def build_gauge(value, title, bar_color):
+    return figures.gauge(value, title, bar_color)
+
+@memoize(maxsize=32)
+def build_grid_map(status_code, zone_load):
+    return figures.grid_map(ZONES, status_code, zone_load)
+
+@memoize(maxsize=8)
+def run_reserve_risk(base_residential_load, industrial_load, grid_cap, pct_charging, pct_v2g, n_trials):
+    # نفس قيود الموزّع الحي: العجز المحلي من تدفق القدرة (same constraints as the live allocator: power-flow local deficits)
+    total_res_load = _grid_physics(pct_charging, pct_v2g, base_residential_load, industrial_load, grid_cap)[1]
+    local_deficit_gw = engine.local_balance(total_res_load, grid_cap, ZONES, NETWORK)[2]
+    scenario = montecarlo.RiskScenario(
+        base_residential_load, industrial_load, grid_cap, pct_charging,
+        get_fleet_summary(pct_charging, pct_v2g).zone_vpp_mw, local_deficit_mw=local_deficit_gw * 1000,
+    )
+    return montecarlo.run_risk(scenario, n_trials=n_trials, seed=99)
+
+# حدود العرض ومستوى التكبير (Fleet map viewports)
+CITY_BBOX = ZONES.bounds(pad_deg=0.15)
+CITY_ZOOM = 9.5
+ZONE_ZOOM = 12.5
+FLEET_POINT_LIMIT = 20000
+
+@memoize(maxsize=32)
+def build_fleet_map(pct_charging, pct_v2g, focus):
+    fleet = load_fleet()
+    status = fleet.participation_status(pct_charging, pct_v2g)
+    if focus in ZONES:
+        i = ZONES.index_of(focus)
+        center = (ZONES.lat[i], ZONES.lon[i])
+        bbox, zoom = tiles.bbox_around(*center, 0.05), ZONE_ZOOM
+    else:
+        bbox, zoom = CITY_BBOX, CITY_ZOOM
+        center = ((bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2)
+
+    # تجميع على الخادم أو نقاط عند التكبير (Server-side tiles, or points when zoomed in)
+    view = tiles.fleet_view(fleet.lat, fleet.lon, status, bbox, zoom, point_limit=FLEET_POINT_LIMIT)
+    return figures.fleet_map(view, center, zoom)
+
+@memoize(maxsize=32)
+def build_load_curve(total_city_load, total_dispatched_mw):
+    load_series = timeseries.simulate_load(
+        total_city_load, dispatch_gw=total_dispatched_mw / 1000.0, seed=99
+    )
+    return figures.load_curve(load_series)
+
+@memoize(maxsize=16)
+def get_fleet_cohorts(pct_charging, pct_v2g):
+    fleet = load_fleet()
+    return scheduling.fleet_cohorts(fleet, fleet.participation_status(pct_charging, pct_v2g), seed=7)
+
+# جدول الشحن لليوم التالي حسب التعرفة وسعة الشبكة (day-ahead schedule against the tariff and grid headroom)
+@memoize(maxsize=32)
+def plan_charging(pct_charging, pct_v2g, sell_price, buy_price, total_city_load, ev_load_gw, grid_cap):
+    return scheduling.schedule_fleet(
+        get_fleet_cohorts(pct_charging, pct_v2g),
+        scheduling.tariff_from_prices(sell_price, buy_price),
+        scheduling.headroom_profile(total_city_load, ev_load_gw, grid_cap),
+    )
+
+@memoize(maxsize=32)
+def build_charging_profile(schedule):
+    return figures.charging_profile(schedule)
+
+HISTORY_SERIES = {"load_gw": ("Load (GW)", '#D32F2F'), "deficit_gw": ("Deficit (GW)", '#FF6D00'),
+                  "dispatch_mw": ("V2G Dispatch (MW)", '#00C853')}
+
+# يقرأ النافذة فقط من الملف ثم يقلّصها (reads only the window from the mapped file, then downsamples it)
+# stored_steps في المفتاح حتى تتحدث النوافذ عند وصول قراءات جديدة (part of the key so the live edge refreshes)
+@memoize(maxsize=32)
+def build_history_curve(field, zone, start_ts, end_ts, method, stored_steps, n_points=2000):
+    window = get_history().window(field, start_ts, end_ts, zone=zone)
+    ts, values = downsample(window, n_points, method)
+    label, color = HISTORY_SERIES[field]
+    return figures.history_curve(ts, values, label, color, n_raw=len(window.values))
+
+# محاكاة الأحداث لليوم: وصول ومغادرة وعتبات الشحن (event-driven day: arrivals, departures, charge thresholds)
+@memoize(maxsize=8)
+def simulate_fleet_day(pct_v2g):
+    fleet = load_fleet()
+    enrolled = fleet.participation_status(0, pct_v2g) == V2G_READY
+    return events.simulate_availability(fleet, enrolled=enrolled, work_zone_share=ZONES.load, seed=7)
+
+@memoize(maxsize=16)
+def dispatch_over_day(pct_v2g, total_city_load, grid_cap):
+    series = simulate_fleet_day(pct_v2g)
+    # الحمل الكلي هو ذروة اليوم (total_city_load is the daily peak, as in the charging headroom)
+    load = timeseries.simulate_load(total_city_load / timeseries.HOURLY_LOAD_FACTORS.max(), step_minutes=15, noise_sd=0.0).load
+    deficit_mw = np.maximum(load - grid_cap, 0.0) * 1000.0
+    return series, deficit_mw, dispatch.allocate(deficit_mw, series.zone_vpp_mw)
+
+# يوم المحاكاة مصفوف على أيام السجل (the simulated day is aligned to the history's day frame)
+@memoize(maxsize=8)
+def get_availability_forecaster(pct_v2g):
+    series = simulate_fleet_day(pct_v2g)
+    return forecast.SeasonalForecaster.fit(series.zone_vpp_mw.T, get_history().start_ts, step_s=HISTORY_STEP_S, warm_steps=0)
+
+@memoize(maxsize=16)
+def plan_day_ahead(horizon_steps, basis, pct_v2g, grid_cap, forecast_version):
+    load_fc = get_load_forecaster().forecast(horizon_steps)
+    avail_fc = get_availability_forecaster(pct_v2g).forecast(horizon_steps, start_ts=load_fc.start_ts)
+    zone_load = load_fc.upper if basis == "P95" else load_fc.mean
+    return load_fc, avail_fc, engine.commit_day_ahead(zone_load, ZONES.zone_capacity(grid_cap), np.maximum(avail_fc.mean, 0.0))
+
+@memoize(maxsize=16)
+def build_forecast_chart(scope, horizon_steps, basis, pct_v2g, grid_cap, forecast_version):
+    load_fc, _, commitment = plan_day_ahead(horizon_steps, basis, pct_v2g, grid_cap, forecast_version)
+    history = get_history()
+    rows = slice(None) if scope == "City" else slice(ZONES.index_of(scope), ZONES.index_of(scope) + 1)
+    # نطاق المدينة مجموع نطاقات الأحياء (city band: zone bands summed, i.e. fully correlated)
+    scoped = forecast.Forecast(load_fc.start_ts, load_fc.step_s, *(a[rows].sum(axis=0) for a in load_fc[2:]))
+    recent = history.window(GROSS_LOAD, load_fc.start_ts - 86400, zone=CITY if scope == "City" else ZONES.index_of(scope))
+    capacity = ZONES.zone_capacity(grid_cap)[rows].sum()
+    return figures.load_forecast(recent, scoped, commitment.allocation_mw[:, rows].sum(axis=1), capacity)
+
+@memoize(maxsize=16)
+def build_fleet_availability(pct_v2g, total_city_load, grid_cap, static_mw):
+    series, deficit_mw, _ = dispatch_over_day(pct_v2g, total_city_load, grid_cap)
+    return figures.fleet_availability(series, ZONES.name, static_mw=static_mw, deficit_mw=deficit_mw)
 
 # ---------------------------------------------------------
-# 5. دالة عرض الحي (Local View)
+# 6. دالة عرض الحي (Local View)
 # ---------------------------------------------------------
+# تُنفّذ قبل إعادة تشغيل الجزء فلا حاجة لـ st.rerun (button callbacks run before the fragment reruns)
+# الأمر يحدد نقطة الضبط فقط، وحلقة التحكم ترفع خرج العواكس تدريجياً (sets the set-point; the control loop ramps the inverters)
+def inject_zone(zone_name, mw):
+    GRID_STATE.set_zone(zone_name, mw, float(dispatch.settlement_payout(mw, st.session_state.sell_price)),
+                        by=st.session_state.operator_id)
+
+def stop_zone(zone_name):
+    GRID_STATE.set_zone(zone_name, 0.0, 0.0, by=st.session_state.operator_id)
+
+# أزرار الحقن تعيد تشغيل عرض الحي فقط (INJECT / STOP rerun this view alone)
+@st.fragment
 def render_local_view(zone_name):
     pct_charging = st.session_state.get('pct_charging', 20)
     pct_v2g = st.session_state.get('pct_v2g', 60)
     _, total_res_load, raw_grid_deficit, _, _, _ = calculate_grid_physics(pct_charging, pct_v2g)
     
-    params = ZONE_WEIGHTS[zone_name]
-    total_fleet_riyadh = 100000
+    zone_idx = ZONES.index_of(zone_name)
+    fleet_summary = get_fleet_summary(pct_charging, pct_v2g)
     
-    local_load_gw = total_res_load * params["load"]
-    local_cap_gw = st.session_state.global_grid_cap * 0.8 * params["load"] 
-    local_deficit_gw = max(0, local_load_gw - local_cap_gw)
-    st.session_state.zones_data[zone_name]['local_deficit'] = local_deficit_gw
+    zone_load, _, zone_deficit = engine.local_balance(total_res_load, st.session_state.global_grid_cap, ZONES, NETWORK)
+    local_load_gw = float(zone_load[zone_idx])
+    local_deficit_gw = float(zone_deficit[zone_idx])
+    # للعرض فقط؛ حلقة التحكم تكتب العجز المحلي في الحالة المشتركة (display only: the control loop owns the shared deficit)
+    grid = GRID_STATE.snapshot()
+    st.session_state.grid_version = grid.version
     
-    local_v2g_cars = int(total_fleet_riyadh * params["ev_density"] * (pct_v2g/100))
-    available_vpp_mw = (local_v2g_cars * AVG_CHARGER_CAPACITY_KW * INVERTER_EFFICIENCY) / 1000.0
+    local_v2g_cars = int(fleet_summary.zone_num_v2g[zone_idx])
+    available_vpp_mw = float(fleet_summary.zone_vpp_mw[zone_idx])
     
     st.title(f"📍 {zone_name} | Substation Control")
     
     # تنبيهات الشبكة
-    current_total_dispatched = sum([d['dispatched_mw'] for z, d in st.session_state.zones_data.items()])
+    current_total_dispatched = grid.total_dispatched_mw
     net_deficit = max(0, raw_grid_deficit - (current_total_dispatched/1000))
 
     if net_deficit > 0.005:
@@ -232,8 +502,9 @@ def render_local_view(zone_name):
         
     c3.metric("Available V2G", f"{available_vpp_mw:.1f} MW", f"{local_v2g_cars} Cars")
     
-    is_dispatched = st.session_state.zones_data[zone_name]['dispatched_mw'] > 0
-    status_text = "INJECTING" if is_dispatched else "STANDBY"
+    is_dispatched = grid.target_mw[zone_idx] > 0
+    is_ramping = not np.isclose(grid.dispatched_mw[zone_idx], grid.target_mw[zone_idx])
+    status_text = "RAMPING" if is_ramping else "INJECTING" if is_dispatched else "STANDBY"
     status_color = "#00C853" if is_dispatched else "#999" # تعديل اللون ليتناسب مع الأبيض
     
     c4.markdown(f"""<div class="kpi-card" style="border-left: 5px solid {status_color};">
@@ -248,72 +519,293 @@ def render_local_view(zone_name):
     c_btn, c_rest = st.columns([1, 2])
     with c_btn:
         if not is_dispatched:
-            if st.button(f"⚡ INJECT {target_dispatch:.0f} MW"):
-                with st.spinner("Syncing Inverters..."):
-                    time.sleep(0.5)
-                    st.session_state.zones_data[zone_name]['dispatched_mw'] = target_dispatch
-                    st.session_state.zones_data[zone_name]['payout'] = target_dispatch * 1000 * st.session_state.sell_price * 4
-                    st.session_state.zones_data[zone_name]['status'] = "STABILIZED"
-                    st.rerun()
+            st.button(f"⚡ INJECT {target_dispatch:.0f} MW", on_click=inject_zone, args=(zone_name, target_dispatch))
         else:
-            if st.button("🔴 STOP INJECTION"):
-                st.session_state.zones_data[zone_name]['dispatched_mw'] = 0
-                st.session_state.zones_data[zone_name]['payout'] = 0
-                st.session_state.zones_data[zone_name]['status'] = "STABLE"
-                st.rerun()
+            st.button("🔴 STOP INJECTION", on_click=stop_zone, args=(zone_name,))
                 
-    lt1, lt2 = st.tabs(["🛡️ Infrastructure Health", "💰 Local Financials"])
+    lt1, lt2, lt3 = st.tabs(["🛡️ Infrastructure Health", "💰 Local Financials", "🔌 Network Flows"])
     
     with lt1:
         st.subheader("Asset Health Monitoring")
+        # نموذج حراري IEEE C57.91 للمحولات (thermal model: daily peak load and hot spot per asset)
+        with_v2g, without = run_thermal(total_res_load, grid.dispatched_mw)
+        in_zone = TRANSFORMERS.zone_id == zone_idx
+        weak = in_zone & (TRANSFORMERS.asset_class == thermal.WEAK)
+        modern = in_zone & (TRANSFORMERS.asset_class == thermal.MODERN)
+
         g1, g2 = st.columns(2)
-        load_pct_weak = 95 if (not is_dispatched and local_deficit_gw > 0) else 40
-        fig_w = go.Figure(go.Indicator(mode="gauge+number", value=load_pct_weak, title={'text': "Weak Transformers (Load %)"}, 
-                                       gauge={'axis': {'range': [0, 120]}, 'bar': {'color': "red" if load_pct_weak > 90 else "#FFA500"}}))
-        # [Visual Update]: White Background Logic
-        fig_w.update_layout(paper_bgcolor="white", font={'color': "black"}, height=250)
+        load_pct_weak = round(float(with_v2g.peak_load_pu[weak].mean()) * 100)
+        fig_w = build_gauge(load_pct_weak, "Weak Transformers (Load %)", "red" if load_pct_weak > 100 else "#FFA500")
         g1.plotly_chart(fig_w, use_container_width=True)
 
-        load_pct_strong = 60
-        if is_dispatched: load_pct_strong = 75
-        fig_s = go.Figure(go.Indicator(mode="gauge+number", value=load_pct_strong, title={'text': "Modern Substations (Load %)"}, 
-                                       gauge={'axis': {'range': [0, 120]}, 'bar': {'color': "#00C853"}}))
-        fig_s.update_layout(paper_bgcolor="white", font={'color': "black"}, height=250)
+        load_pct_strong = round(float(with_v2g.peak_load_pu[modern].mean()) * 100)
+        fig_s = build_gauge(load_pct_strong, "Modern Substations (Load %)", "#FFA500" if load_pct_strong > 100 else "#00C853")
         g2.plotly_chart(fig_s, use_container_width=True)
 
+        h1, h2, h3 = st.columns(3)
+        h1.metric("Peak Hot-Spot (weak, P95)", f"{np.percentile(with_v2g.peak_hot_spot_c[weak], 95):.1f} °C",
+                  f"{np.percentile(with_v2g.peak_hot_spot_c[weak], 95) - np.percentile(without.peak_hot_spot_c[weak], 95):+.1f} °C vs no V2G",
+                  delta_color="inverse")
+        zone_lol = float(with_v2g.loss_of_life_h[in_zone].sum())
+        h2.metric("Insulation Life Used Today", f"{zone_lol:,.0f} h",
+                  f"{zone_lol - float(without.loss_of_life_h[in_zone].sum()):+,.0f} h vs no V2G", delta_color="inverse")
+        city_saved = float(without.loss_of_life_h.sum() - with_v2g.loss_of_life_h.sum())
+        h3.metric("City Life Saved by V2G", f"{city_saved:,.0f} h/day",
+                  f"{len(TRANSFORMERS):,} transformers", delta_color="off")
+
+        fig_hs = build_hot_spot_histogram(total_res_load, grid.dispatched_mw)
+        st.plotly_chart(fig_hs, use_container_width=True)
+
     with lt2:
         if is_dispatched:
             f1, f2 = st.columns(2)
-            f1.metric("Revenue (4h Cycle)", f"{st.session_state.zones_data[zone_name]['payout']:,.0f} SAR")
-            f2.metric("Power Exported", f"{st.session_state.zones_data[zone_name]['dispatched_mw']:.1f} MW")
+            f1.metric("Revenue (4h Cycle)", f"{grid.payout_sar[zone_idx]:,.0f} SAR")
+            f2.metric("Power Exported", f"{grid.dispatched_mw[zone_idx]:.1f} MW")
         else:
             st.info("No active settlement in this zone.")
 
+    with lt3:
+        # خطوط الحي أولاً، والتخفيف = نقص التحميل لكل ميغاواط يُحقن هنا (this zone's lines first; relief per MW injected here)
+        flow, relief_gw = solve_network(total_res_load, grid.dispatched_mw)
+        bus = NETWORK.bus_index([zone_name])[0]
+        relief_per_mw = -np.sign(flow.flow_mw) * NETWORK.ptdf([bus])[:, 0]
+        df_lines = pd.DataFrame({
+            "Line": NETWORK.line_name,
+            "Flow (MW)": flow.flow_mw.round(1),
+            "Rating (MW)": NETWORK.rating_mw,
+            "Loading": flow.loading * 100,
+            "Relief per MW here": relief_per_mw.round(3),
+        })
+        df_lines["_local"] = np.isin(np.arange(NETWORK.n_lines), NETWORK.lines_at(bus))
+        df_lines = df_lines.sort_values(["_local", "Loading"], ascending=False).drop(columns="_local")
+        st.dataframe(df_lines, use_container_width=True, hide_index=True, column_config={
+            "Loading": st.column_config.ProgressColumn("Loading (%)", format="%.0f%%", min_value=0, max_value=150),
+        })
+        constrained = [z for z, r in zip(ZONES.names, relief_gw) if r > 0]
+        if constrained:
+            st.warning(f"Constrained zones after dispatch: {', '.join(constrained)}")
+        else:
+            st.success("No line above its rating after dispatch.")
+
 # ---------------------------------------------------------
-# 6. الواجهة الرئيسية والتحكم (Main Dashboard)
+# 7. أجزاء لوحة المدينة (City Overview Fragments)
 # ---------------------------------------------------------
-with st.sidebar:
+# كل جزء يعيد تشغيل نفسه فقط عند تغيير عناصره (each fragment reruns alone when its own widgets change)
+# متابعة تغييرات المشغّلين الآخرين: إعادة الرسم فقط عند تغيّر الإصدار (redraw only when the shared version moves)
+@st.fragment(run_every=1.0)
+def follow_grid_state():
+    if GRID_STATE.version != st.session_state.get('grid_version'):
+        st.rerun()
+
+@st.fragment
+def render_fleet_panel(pct_charging, pct_v2g):
+    with span("map.fleet"):
+        st.subheader("📊 Fleet Distribution")
+        fleet_focus = st.selectbox("Map Focus", ["City"] + ZONES.names, label_visibility="collapsed")
+        fig_fleet = build_fleet_map(pct_charging, pct_v2g, fleet_focus)
+        st.plotly_chart(fig_fleet, use_container_width=True)
+
+@st.fragment
+def render_analytics(total_city_load, total_res_load, pct_charging, pct_v2g):
+    # التعرفة هنا: تغيير السعر يحدّث التسوية والتعرفة فقط (tariff changes refresh settlement / tariff views only)
+    p1, p2 = st.columns(2)
+    st.session_state.sell_price = p1.slider("Sell Price (SAR/kWh)", 0.1, 2.0, st.session_state.sell_price, key='sell_price_input')
+    st.session_state.buy_price = p2.slider("Buy Price (SAR/kWh)", 0.05, 1.0, st.session_state.buy_price, key='buy_price_input')
+    grid = push_control_inputs(pct_charging, pct_v2g)
+    st.session_state.grid_version = grid.version
+    total_dispatched_mw = grid.total_dispatched_mw
+
+    # التبويبات تُرسم عند فتحها فقط (only the open tab is rendered)
+    t1, t2, t3, t4, t5, t6, t7 = st.tabs(["📈 Load Curve Analysis", "🔌 Charging Profile", "📋 Operations Settlement", "🎲 Reserve Risk",
+                                          "🕰️ History Replay", "🚗 Fleet Availability", "🔮 Day-Ahead Forecast"],
+                             key='analytics_tab', on_change="rerun")
+    
+    if t1.open:
+        with t1, span("tab.load_curve"):
+            fig_l = build_load_curve(total_city_load, total_dispatched_mw)
+            st.plotly_chart(fig_l, use_container_width=True)
+
+    if t2.open:
+        with t2, span("tab.charging_profile"):
+            plan = plan_charging(pct_charging, pct_v2g, st.session_state.sell_price, st.session_state.buy_price,
+                                 total_city_load, total_res_load - st.session_state.base_residential_load,
+                                 st.session_state.global_grid_cap)
+            s1, s2, s3 = st.columns(3)
+            s1.metric("Optimized Energy Cost", f"{plan.energy_cost_sar:,.0f} SAR",
+                      f"{plan.energy_cost_sar - plan.baseline_cost_sar:,.0f} SAR vs charge-on-arrival", delta_color="inverse")
+            s2.metric("Peak Fleet Import", f"{plan.charge_mw.max():.0f} MW", f"{plan.discharge_mw.max():.0f} MW V2G export")
+            s3.metric("Unmet Energy", f"{plan.unmet_mwh:.1f} MWh", f"{plan.n_vehicles:,} cars in {plan.n_cohorts:,} cohorts",
+                      delta_color="off")
+            fig_sc = build_charging_profile(plan)
+            st.plotly_chart(fig_sc, use_container_width=True)
+
+    if t3.open:
+        with t3, span("tab.settlement"):
+            st.subheader("📊 Zone Operations & Settlement Report")
+        
+            df_ops, (total_active_cars, total_mw_table, total_payout) = engine.settlement_frame(
+                ZONES.name, grid.dispatched_mw, grid.payout_sar, grid.dispatch_active
+            )
+            st.dataframe(
+                df_ops, 
+                use_container_width=True, 
+                column_config={
+                    "Status": st.column_config.TextColumn("System Status"),
+                    "Est. Payout (SAR)": st.column_config.TextColumn("Payment Due (SAR)"),
+                }
+            )
+        
+            st.markdown("---")
+            c_tot1, c_tot2, c_tot3 = st.columns(3)
+            c_tot1.metric("Total Participating Cars", f"{total_active_cars:,}")
+            c_tot2.metric("Total Power Dispatched", f"{total_mw_table:.2f} MW")
+            c_tot3.metric("Total Settlement Amount", f"{total_payout:,.0f} SAR", "4 Hours Cycle")
+
+            st.markdown("---")
+            st.subheader("🧾 Settlement Ledger (Billing)")
+            ledger = get_ledger()
+            month_start = np.datetime64('today', 'M').astype('datetime64[s]').astype(np.int64)
+            l1, l2 = st.columns([2, 1])
+            with l1:
+                st.caption("Month to date by zone")
+                st.dataframe(ledger.totals("zone", start=month_start), use_container_width=True, hide_index=True)
+            with l2:
+                st.caption("Monthly totals")
+                st.dataframe(ledger.totals("month"), use_container_width=True, hide_index=True)
+
+    if t4.open:
+        with t4, span("tab.reserve_risk"):
+            st.subheader("🎲 Monte Carlo Reserve Risk")
+            r1, r2 = st.columns([1, 3])
+            n_trials = r1.select_slider("Trials", [10_000, 50_000, 100_000, 250_000, 500_000], value=100_000)
+            risk_params = (st.session_state.base_residential_load, st.session_state.industrial_load,
+                           st.session_state.global_grid_cap, pct_charging, pct_v2g, n_trials)
+            if r1.button("▶ Run Simulation"):
+                st.session_state.risk_params = risk_params
+
+            if st.session_state.get('risk_params') == risk_params:
+                with st.spinner("Sampling scenarios..."):
+                    risk = run_reserve_risk(*risk_params)
+                m1, m2, m3 = r2.columns(3)
+                m1.metric("Deficit Probability", f"{risk.deficit_probability:.1%}")
+                m2.metric("Unserved After VPP", f"{risk.unserved_probability:.1%}")
+                m3.metric("P95 Unserved Energy", f"{risk.unserved_p95_mwh:,.0f} MWh", f"Mean {risk.unserved_mean_mwh:,.0f} MWh", delta_color="off")
+
+                fig_risk = figures.reserve_risk(ZONES.name, risk)
+                st.plotly_chart(fig_risk, use_container_width=True)
+            else:
+                r2.info("Press Run to sample load, plug-in and V2G availability uncertainty.")
+
+    if t5.open:
+        with t5, span("tab.history"):
+            history = get_history()
+            h1, h2, h3, h4 = st.columns(4)
+            scope = h1.selectbox("Scope", ["City"] + ZONES.names, key='history_scope')
+            field = h2.selectbox("Series", list(HISTORY_SERIES), format_func=lambda f: HISTORY_SERIES[f][0], key='history_field')
+            window_days = h3.select_slider("Window", [1, 7, 30, 90, 365], value=7, format_func=lambda d: f"{d} d", key='history_window')
+            method = h4.radio("Downsampling", ["minmax", "lttb"], format_func={"minmax": "Min/Max", "lttb": "LTTB"}.get,
+                              horizontal=True, key='history_method')
+
+            # الحدود بالأيام الكاملة لتبقى ثابتة أثناء التسجيل الحي (day-aligned bounds stay put while live steps arrive)
+            first_day = pd.Timestamp(history.start_ts, unit='s').ceil('D')
+            last_day = max(first_day, pd.Timestamp(history.end_ts, unit='s').floor('D') - pd.Timedelta(days=window_days))
+            replay_start = st.slider("Replay", first_day.to_pydatetime(), max(last_day, first_day + pd.Timedelta(days=1)).to_pydatetime(),
+                                     value=last_day.to_pydatetime(), step=pd.Timedelta(seconds=HISTORY_STEP_S).to_pytimedelta(),
+                                     format="YYYY-MM-DD HH:mm", disabled=last_day <= first_day, key='history_start')
+            start_ts = pd.Timestamp(replay_start).timestamp()
+            zone = CITY if scope == "City" else ZONES.index_of(scope)
+            fig_h = build_history_curve(field, zone, start_ts, start_ts + window_days * 86400, method, len(history))
+            st.plotly_chart(fig_h, use_container_width=True)
+            st.caption(f"{len(history):,} steps of {HISTORY_STEP_S // 60} min on disk ({history.nbytes / 1e6:.1f} MB memory-mapped); "
+                       f"only the selected window is read.")
+
+    if t6.open:
+        with t6, span("tab.fleet_availability"):
+            series, deficit_mw, plan = dispatch_over_day(pct_v2g, total_city_load, st.session_state.global_grid_cap)
+            vpp_mw = series.zone_vpp_mw.sum(axis=1)
+            commute = ((series.hours >= 7) & (series.hours < 9)) | ((series.hours >= 16) & (series.hours < 18))
+            static_mw = get_fleet_summary(pct_charging, pct_v2g).vpp_cap_mw
+            a1, a2, a3 = st.columns(3)
+            a1.metric("Overnight V2G Capacity", f"{vpp_mw.max():,.0f} MW", f"{static_mw:,.0f} MW static assumption", delta_color="off")
+            a2.metric("Commute-Hour Minimum", f"{vpp_mw[commute].min():,.0f} MW",
+                      f"{vpp_mw[commute].min() - vpp_mw.max():,.0f} MW vs overnight", delta_color="normal")
+            served = plan.allocation_mw.sum() / max(deficit_mw.sum(), 1e-9)
+            a3.metric("Deficit Covered Through the Day", f"{served:.0%}",
+                      f"Peak unserved {plan.unserved_mw.max():,.0f} MW", delta_color="off")
+            fig_av = build_fleet_availability(pct_v2g, total_city_load, st.session_state.global_grid_cap, static_mw)
+            st.plotly_chart(fig_av, use_container_width=True)
+            st.caption(f"{series.event_counts.sum():,} plug-in / departure / SoC events in {series.n_batches:,} batches "
+                       f"for {len(load_fleet()):,} vehicles.")
+
+    if t7.open:
+        with t7, span("tab.forecast"):
+            forecaster = get_load_forecaster()
+            # خطوات السجل الجديدة فقط تُضاف إلى الحالة (only steps new to the history are fed in)
+            forecast.follow_history(forecaster, get_history())
+            f1, f2, f3 = st.columns(3)
+            scope = f1.selectbox("Scope", ["City"] + ZONES.names, key='forecast_scope')
+            horizon_h = f2.select_slider("Horizon", [24, 48], value=24, format_func=lambda h: f"{h} h", key='forecast_horizon')
+            basis = f3.radio("Commit Against", ["Mean", "P95"], horizontal=True, key='forecast_basis')
+            horizon_steps = horizon_h * 3600 // HISTORY_STEP_S
+            load_fc, avail_fc, commitment = plan_day_ahead(horizon_steps, basis, pct_v2g, st.session_state.global_grid_cap,
+                                                           forecaster.updates)
+            rows = slice(None) if scope == "City" else slice(ZONES.index_of(scope), ZONES.index_of(scope) + 1)
+            peak_step = int(load_fc.mean[rows].sum(axis=0).argmax())
+            committed = commitment.allocation_mw[:, rows].sum(axis=1)
+            m1, m2, m3 = st.columns(3)
+            m1.metric("Forecast Peak Load", f"{load_fc.mean[rows].sum(axis=0)[peak_step]:.2f} GW",
+                      pd.Timestamp(load_fc.times()[peak_step], unit='s').strftime("%a %H:%M"), delta_color="off")
+            m2.metric("V2G Commitment", f"{committed.sum() * HISTORY_STEP_S / 3600:,.0f} MWh",
+                      f"Peak {committed.max():,.0f} MW", delta_color="off")
+            m3.metric("Uncovered Deficit", f"{commitment.unserved_mw.max():,.0f} MW",
+                      f"Min. forecast V2G {avail_fc.mean[rows].sum(axis=0).min():,.0f} MW", delta_color="off")
+            fig_fc = build_forecast_chart(scope, horizon_steps, basis, pct_v2g, st.session_state.global_grid_cap, forecaster.updates)
+            st.plotly_chart(fig_fc, use_container_width=True)
+            st.caption(f"Holt-Winters state for {forecaster.n_series} zones, {forecaster.updates:,} incremental updates; "
+                       f"availability from the event-driven fleet day.")
+
+# ---------------------------------------------------------
+# 8. الواجهة الرئيسية والتحكم (Main Dashboard)
+# ---------------------------------------------------------
+with st.sidebar, span("sidebar"):
     st.title("🏙️ Scope Selection")
-    options = ["Riyadh City Overview"] + list(ZONE_WEIGHTS.keys())
-    selected_zone = st.selectbox("Select View", options)
+    options = ["Riyadh City Overview"] + ZONES.names
+    selected_zone = st.selectbox("Select View", options, key='selected_zone')
     
     st.markdown("---")
     st.header("⚙️ Simulation Params")
     
+    live_telemetry = st.toggle("📡 Live Telemetry", value=False)
     st.session_state.global_grid_cap = st.slider("Grid Capacity (GW)", 15.0, 25.0, 18.0)
-    st.session_state.base_residential_load = st.slider("Base Res. Load (GW)", 8.0, 20.0, 14.3)
+    st.session_state.base_residential_load = st.slider("Base Res. Load (GW)", 8.0, 20.0, 14.3, disabled=live_telemetry)
     st.session_state.industrial_load = st.slider("Ind. Load (GW)", 2.0, 8.0, 4.0)
+    st.session_state.live_ev_load_kw = None
+
+    if live_telemetry:
+        telemetry = get_telemetry_pipeline()
+        CONTROLLER.attach_telemetry(telemetry.aggregator)
+        if telemetry.aggregator.readings:
+            live_res_gw, live_ev_kw = telemetry.aggregator.physics_inputs()
+            st.session_state.base_residential_load = live_res_gw
+            st.session_state.live_ev_load_kw = live_ev_kw
+            st.caption(f"Live: {live_res_gw:.2f} GW res. | {live_ev_kw/1000:.0f} MW EV | {telemetry.aggregator.readings:,} readings")
+        else:
+            st.caption("Waiting for telemetry...")
     
     st.markdown("---")
-    st.session_state.sell_price = st.slider("Sell Price (SAR/kWh)", 0.1, 2.0, 0.80)
-    st.session_state.buy_price = st.slider("Buy Price (SAR/kWh)", 0.05, 1.0, 0.18)
-    
     pct_charging = st.slider("Charging %", 0, 50, 20)
     pct_v2g = st.slider("V2G Ready %", 0, 80, 60)
     
     st.session_state.pct_charging = pct_charging
     st.session_state.pct_v2g = pct_v2g
 
+    with st.expander("🧠 Cache Stats"):
+        st.dataframe(pd.DataFrame(cache_stats()), use_container_width=True, hide_index=True)
+
+    # لوحة التشخيص تُملأ في نهاية الصفحة (Debug panel is filled in after the last section runs)
+    show_profiler = st.toggle("⏱️ Profiler", value=False)
+    profiler_slot = st.empty()
+
     st.markdown("---")
     st.markdown("### 👨‍💻 Developed By")
     st.markdown("**Eng. Mohamed Alwedaa**")
@@ -329,35 +821,22 @@ with st.sidebar:
     """, unsafe_allow_html=True)
 
 if selected_zone != "Riyadh City Overview":
-    render_local_view(selected_zone)
+    with span("local_view"):
+        render_local_view(selected_zone)
 else:
     st.title("🇸🇦 Riyadh City | VPP Strategic Analytics")
     
-    total_city_load, total_res_load, raw_deficit, vpp_cap_mw, num_charging, num_v2g = calculate_grid_physics(pct_charging, pct_v2g)
+    with span("physics"):
+        total_city_load, total_res_load, raw_deficit, vpp_cap_mw, num_charging, num_v2g = calculate_grid_physics(pct_charging, pct_v2g)
     
     # ---------------------------------------------------------
     # [Dynamic Dispatch Loop]
     # ---------------------------------------------------------
-    if st.session_state.dispatch_active:
-        deficit_mw = raw_deficit * 1000
-        
-        if vpp_cap_mw > 0:
-            dispatch_ratio = min(1.0, deficit_mw / vpp_cap_mw) if deficit_mw > 0 else 0
-        else:
-            dispatch_ratio = 0
-        
-        for z, params in ZONE_WEIGHTS.items():
-            local_fleet = 100000 * params['ev_density']
-            local_max_cap = (local_fleet * (pct_v2g/100) * AVG_CHARGER_CAPACITY_KW * INVERTER_EFFICIENCY) / 1000
-            
-            target_local_dispatch = local_max_cap * dispatch_ratio
-            
-            st.session_state.zones_data[z]['dispatched_mw'] = target_local_dispatch
-            st.session_state.zones_data[z]['payout'] = target_local_dispatch * 1000 * st.session_state.sell_price * 4
-            st.session_state.zones_data[z]['status'] = "STABILIZED" if target_local_dispatch > 0 else "STABLE"
-
-    manual_dispatch_sum = sum([d['dispatched_mw'] for z, d in st.session_state.zones_data.items()])
-    total_dispatched_mw = manual_dispatch_sum
+    with span("dispatch"):
+        grid = push_control_inputs(pct_charging, pct_v2g)
+        st.session_state.grid_version = grid.version
+
+    total_dispatched_mw = grid.total_dispatched_mw
 
     net_deficit_gw = max(0, raw_deficit - (total_dispatched_mw/1000.0))
 
@@ -366,8 +845,7 @@ else:
     k1.metric("Total Load", f"{total_city_load:.2f} GW")
     
     remaining_vpp_mw = max(0, vpp_cap_mw - total_dispatched_mw)
-    one_car_capacity_mw = (AVG_CHARGER_CAPACITY_KW * INVERTER_EFFICIENCY) / 1000
-    remaining_cars = int(remaining_vpp_mw / one_car_capacity_mw) if remaining_vpp_mw > 0 else 0
+    remaining_cars = int(engine.cars_for_mw(remaining_vpp_mw))
 
     k2.metric(
         "Unused VPP Cap", 
@@ -392,182 +870,50 @@ else:
     with col_act_ctrl:
         st.markdown("#### Central Dispatch")
         
-        if st.session_state.dispatch_active:
+        if grid.dispatch_active:
             btn_txt = "🔴 SCRAM (STOP ALL)"
         else:
             btn_txt = "⚡ ACTIVATE ALL VPPs"
 
         if raw_deficit > 0:
             if st.button(btn_txt):
-                st.session_state.dispatch_active = not st.session_state.dispatch_active
-                if not st.session_state.dispatch_active:
-                    for z in st.session_state.zones_data:
-                        st.session_state.zones_data[z]['dispatched_mw'] = 0
-                        st.session_state.zones_data[z]['payout'] = 0
-                        st.session_state.zones_data[z]['status'] = "STABLE"
+                if grid.dispatch_active:
+                    GRID_STATE.stop_dispatch(by=st.session_state.operator_id)
+                else:
+                    GRID_STATE.start_dispatch(by=st.session_state.operator_id)
+                    push_control_inputs(pct_charging, pct_v2g, force=True)
                 st.rerun()
         else:
             st.info("Grid Stable. No Action Needed.")
+        st.caption(f"Control loop: {CONTROLLER.ticks:,} cycles | last {CONTROLLER.last_tick_s * 1000:.1f} ms")
 
-    map_data = []
-    for zone, params in ZONE_WEIGHTS.items():
-        status = "STABLE"
-        color = "#00C853" # Green
-        if net_deficit_gw > 0:
-            status = "CRITICAL"
-            color = "#D32F2F" # Red
-        elif st.session_state.dispatch_active or st.session_state.zones_data[zone]['dispatched_mw'] > 0:
-            status = "INJECTING"
-            color = "#2962FF" # Blue for Active
-            
-        map_data.append({
-            "Zone": zone, "lat": params['lat'], "lon": params['lon'], 
-            "Status": status, "Color": color, "Load": total_res_load * params['load']
-        })
-    
-    df_map = pd.DataFrame(map_data)
+    map_status = engine.map_status(grid.dispatched_mw, net_deficit_gw, grid.dispatch_active)
     
     c_map1, c_map2 = st.columns([2, 1])
-    with c_map1:
+    with c_map1, span("map.grid"):
         st.subheader("🗺️ Live Grid Control Map")
-        # [Visual Update]: Light Map Style (Positron)
-        fig_map = px.scatter_mapbox(df_map, lat="lat", lon="lon", color="Status", size="Load",
-                                    color_discrete_map={"INJECTING": "#2962FF", "CRITICAL": "#D32F2F", "STABLE": "#00C853"},
-                                    zoom=10, mapbox_style="carto-positron", height=450, size_max=40)
-        fig_map.update_layout(margin={"r":0,"t":0,"l":0,"b":0}, paper_bgcolor="white", font=dict(color="black"))
+        fig_map = build_grid_map(map_status, ZONES.zone_loads(total_res_load))
         st.plotly_chart(fig_map, use_container_width=True)
+        flow, relief_gw = solve_network(total_res_load, grid.dispatched_mw)
+        worst = int(flow.loading.argmax())
+        constrained = [z for z, r in zip(ZONES.names, relief_gw) if r > 0]
+        st.caption(f"Network: {len(NETWORK)} buses / {NETWORK.n_lines} lines | peak loading {flow.loading[worst]:.0%} "
+                   f"on {NETWORK.line_name[worst]} | constrained: {', '.join(constrained) or 'none'}")
     
     with c_map2:
-        st.subheader("📊 Fleet Distribution")
-        np.random.seed(99)
-        fleet_map_df = pd.DataFrame({
-            'lat': np.random.normal(24.71, 0.08, 1000),
-            'lon': np.random.normal(46.67, 0.08, 1000),
-            'Status': np.random.choice(['Charging', 'V2G Ready', 'Idle'], 1000, p=[pct_charging/100, pct_v2g/100, (100-pct_charging-pct_v2g)/100])
-        })
-        color_map_fleet = {'Charging': '#D32F2F', 'V2G Ready': '#00C853', 'Idle': '#999999'}
-        # [Visual Update]: Light Map Style
-        fig_fleet = px.scatter_mapbox(fleet_map_df, lat="lat", lon="lon", color="Status", color_discrete_map=color_map_fleet, 
-                                      zoom=9.5, mapbox_style="carto-positron", height=450)
-        
-        fig_fleet.update_layout(
-            margin={"r":0,"t":0,"l":0,"b":0}, 
-            paper_bgcolor="white", 
-            font=dict(color="black"), 
-            showlegend=True,
-            legend=dict(x=0, y=1, bgcolor="rgba(255,255,255,0.7)", font=dict(size=10, color="black"))
-        )
-        st.plotly_chart(fig_fleet, use_container_width=True)
+        render_fleet_panel(pct_charging, pct_v2g)
 
-    t1, t2, t3 = st.tabs(["📈 Load Curve Analysis", "🔌 Charging Profile", "📋 Operations Settlement"])
-    
-    with t1:
-        hours = list(range(24))
-        base_curve = []
-        for h in hours:
-            if 0 <= h < 6:   factor = 0.55 
-            elif 6 <= h < 11: factor = 0.75 
-            elif 11 <= h < 15: factor = 0.65 
-            elif 15 <= h < 19: factor = 0.98 
-            elif 19 <= h < 23: factor = 0.85 
-            else: factor = 0.60
-            base_curve.append(total_city_load * (factor + np.random.normal(0, 0.01)))
-
-        opt_curve = []
-        dispatch_gw = total_dispatched_mw / 1000.0
-        
-        for h, val in enumerate(base_curve):
-            if 15 <= h <= 18 and dispatch_gw > 0:
-                opt_curve.append(max(0, val - dispatch_gw))
-            else:
-                opt_curve.append(val)
+    render_analytics(total_city_load, total_res_load, pct_charging, pct_v2g)
 
-        fig_l = go.Figure()
-        fig_l.add_vrect(x0=15, x1=18, fillcolor="red", opacity=0.1, annotation_text="Peak Zone", annotation_position="top left")
-        fig_l.add_trace(go.Scatter(x=hours, y=base_curve, name='BAU Load', line=dict(color='#D32F2F', width=2, dash='dot')))
-        fig_l.add_trace(go.Scatter(x=hours, y=opt_curve, name='Optimized (V2G)', fill='tozeroy', line=dict(color='#00C853', width=3)))
-        
-        # [Visual Update]: White Template
-        fig_l.update_layout(
-            template="plotly_white", height=350, 
-            paper_bgcolor="white", margin=dict(l=0,r=0,t=10,b=0), 
-            font=dict(color="black"), 
-            xaxis_title="Hour", yaxis_title="GW",
-            xaxis=dict(title_font=dict(color="black"), tickfont=dict(color="black")),
-            yaxis=dict(title_font=dict(color="black"), tickfont=dict(color="black")),
-            legend=dict(font=dict(color="black"))
-        )
-        st.plotly_chart(fig_l, use_container_width=True)
-
-    with t2:
-        hours = list(range(24))
-        prices = [st.session_state.sell_price if 13 <= h <= 17 else st.session_state.buy_price for h in hours]
-        charging_profile = [vpp_cap_mw * 0.1] * 24
-        for h in range(7): charging_profile[h] = vpp_cap_mw * 0.8
-        
-        fig_sc = go.Figure()
-        fig_sc.add_trace(go.Bar(x=hours, y=charging_profile, name='Fleet Load (MW)', marker_color='#00C853', yaxis='y'))
-        fig_sc.add_trace(go.Scatter(x=hours, y=prices, name='Tariff (SAR)', line=dict(color='#D32F2F', width=3, dash='dot'), yaxis='y2'))
-        
-        # [Visual Update]: White Template
-        fig_sc.update_layout(
-            template="plotly_white", paper_bgcolor="white", height=350, 
-            font=dict(color="black"),
-            yaxis=dict(title="MW", tickfont=dict(color="#00C853"), title_font=dict(color="#00C853")),
-            yaxis2=dict(title="SAR", tickfont=dict(color="#D32F2F"), title_font=dict(color="#D32F2F"), overlaying="y", side="right"),
-            legend=dict(x=0, y=1.1, orientation="h", font=dict(color="black"))
-        )
-        st.plotly_chart(fig_sc, use_container_width=True)
-
-    with t3:
-        st.subheader("📊 Zone Operations & Settlement Report")
-        
-        table_data = []
-        total_active_cars = 0
-        total_payout = 0
-        total_mw_table = 0
-        
-        for zone, params in ZONE_WEIGHTS.items():
-            state_data = st.session_state.zones_data[zone]
-            z_mw = state_data['dispatched_mw']
-            z_payout = state_data['payout']
-            
-            if z_mw > 0:
-                if st.session_state.dispatch_active:
-                    status = "🟢 Active (Central)"
-                else:
-                    status = "🟢 Active (Local)"
-                
-                one_car_capacity_mw = (AVG_CHARGER_CAPACITY_KW * INVERTER_EFFICIENCY) / 1000
-                z_cars = int(z_mw / one_car_capacity_mw)
-            else:
-                status = "⚪ Standby"
-                z_cars = 0
-
-            table_data.append({
-                "Zone (District)": zone,
-                "Status": status,
-                "Active V2G Cars": f"{z_cars:,}",
-                "Dispatched Power (MW)": f"{z_mw:.2f}",
-                "Est. Payout (SAR)": f"{z_payout:,.0f}"
-            })
-            
-            total_active_cars += z_cars
-            total_mw_table += z_mw
-            total_payout += z_payout
-
-        df_ops = pd.DataFrame(table_data)
+# ---------------------------------------------------------
+# 9. لوحة التشخيص (Profiler Panel)
+# ---------------------------------------------------------
+follow_grid_state()
+PROFILER.end_run()
+if show_profiler:
+    with profiler_slot.container():
+        st.caption("Rolling section timings across all sessions (last 256 reruns)")
         st.dataframe(
-            df_ops, 
-            use_container_width=True, 
-            column_config={
-                "Status": st.column_config.TextColumn("System Status"),
-                "Est. Payout (SAR)": st.column_config.TextColumn("Payment Due (SAR)"),
-            }
+            pd.DataFrame(PROFILER.stats()), use_container_width=True, hide_index=True,
+            column_config={c: st.column_config.NumberColumn(format="%.1f") for c in ("last_ms", "p50_ms", "p95_ms")},
         )
-        
-        st.markdown("---")
-        c_tot1, c_tot2, c_tot3 = st.columns(3)
-        c_tot1.metric("Total Participating Cars", f"{total_active_cars:,}")
-        c_tot2.metric("Total Power Dispatched", f"{total_mw_table:.2f} MW")
-        c_tot3.metric("Total Settlement Amount", f"{total_payout:,.0f} SAR", "4 Hours Cycle")
@@ -0,0 +1,188 @@
+"""Plotly figure builders for the VPP dashboard.
+
+Pure functions of their inputs: no Streamlit, no session state.  The page
+script wraps them with ``vpp.cache.memoize`` and benchmarks call them
+directly.
+"""
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from vpp import tiles, timeseries
+
+GRID_MAP_STATUS = np.array(["STABLE", "CRITICAL", "INJECTING"])
+FLEET_COLORS = {'Charging': '#D32F2F', 'V2G Ready': '#00C853', 'Idle': '#999999'}
+
+
+def gauge(value, title, bar_color):
+    fig = go.Figure(go.Indicator(mode="gauge+number", value=value, title={'text': title},
+                                 gauge={'axis': {'range': [0, 120]}, 'bar': {'color': bar_color}}))
+    # [Visual Update]: White Background Logic
+    fig.update_layout(paper_bgcolor="white", font={'color': "black"}, height=250)
+    return fig
+
+
+def grid_map(zones, status_code, zone_load):
+    # plotly.express بطيء الاستيراد، يُحمّل عند أول خريطة (slow to import: load on first use)
+    import plotly.express as px
+
+    df_map = pd.DataFrame({
+        "Zone": zones.name, "lat": zones.lat, "lon": zones.lon,
+        "Status": GRID_MAP_STATUS[status_code], "Load": zone_load,
+    })
+    # [Visual Update]: Light Map Style (Positron)
+    fig = px.scatter_mapbox(df_map, lat="lat", lon="lon", color="Status", size="Load", hover_name="Zone",
+                            color_discrete_map={"INJECTING": "#2962FF", "CRITICAL": "#D32F2F", "STABLE": "#00C853"},
+                            zoom=10, mapbox_style="carto-positron", height=450, size_max=40)
+    fig.update_layout(margin={"r":0,"t":0,"l":0,"b":0}, paper_bgcolor="white", font=dict(color="black"))
+    return fig
+
+
+def fleet_map(view, center, zoom):
+    """Density tiles or raw points from ``tiles.fleet_view``."""
+    is_tiles = isinstance(view, tiles.DensityTiles)
+
+    fig = go.Figure()
+    max_count = view.count.max() if is_tiles and len(view.count) else 1
+    for code, label in tiles.STATUS_LABELS.items():
+        sel = view.status == code
+        if is_tiles:
+            counts = view.count[sel]
+            marker = dict(size=4 + 26 * np.sqrt(counts / max_count), color=FLEET_COLORS[label], opacity=0.6)
+            fig.add_trace(go.Scattermapbox(lat=view.lat[sel], lon=view.lon[sel], mode="markers", name=label,
+                                           marker=marker, customdata=counts,
+                                           hovertemplate=label + ": %{customdata:,} cars<extra></extra>"))
+        else:
+            fig.add_trace(go.Scattermapbox(lat=view.lat[sel], lon=view.lon[sel], mode="markers", name=label,
+                                           marker=dict(size=5, color=FLEET_COLORS[label])))
+
+    # [Visual Update]: Light Map Style
+    fig.update_layout(
+        mapbox=dict(style="carto-positron", center=dict(lat=center[0], lon=center[1]), zoom=zoom),
+        height=450,
+        margin={"r":0,"t":0,"l":0,"b":0}, 
+        paper_bgcolor="white", 
+        font=dict(color="black"), 
+        showlegend=True,
+        legend=dict(x=0, y=1, bgcolor="rgba(255,255,255,0.7)", font=dict(size=10, color="black"))
+    )
+    return fig
+
+
+def load_curve(load_series):
+    fig = go.Figure()
+    fig.add_vrect(x0=timeseries.PEAK_START_HOUR, x1=timeseries.PEAK_END_HOUR, fillcolor="red", opacity=0.1, annotation_text="Peak Zone", annotation_position="top left")
+    fig.add_trace(go.Scatter(x=load_series.hours, y=load_series.load, name='BAU Load', line=dict(color='#D32F2F', width=2, dash='dot')))
+    fig.add_trace(go.Scatter(x=load_series.hours, y=load_series.net_load, name='Optimized (V2G)', fill='tozeroy', line=dict(color='#00C853', width=3)))
+    
+    # [Visual Update]: White Template
+    fig.update_layout(
+        template="plotly_white", height=350, 
+        paper_bgcolor="white", margin=dict(l=0,r=0,t=10,b=0), 
+        font=dict(color="black"), 
+        xaxis_title="Hour", yaxis_title="GW",
+        xaxis=dict(title_font=dict(color="black"), tickfont=dict(color="black")),
+        yaxis=dict(title_font=dict(color="black"), tickfont=dict(color="black")),
+        legend=dict(font=dict(color="black"))
+    )
+    return fig
+
+
+def charging_profile(schedule):
+    hours = schedule.hours
+    fig = go.Figure()
+    fig.add_trace(go.Bar(x=hours, y=schedule.charge_mw, name='Fleet Charging (MW)', marker_color='#00C853', yaxis='y'))
+    if schedule.discharge_mw.any():
+        fig.add_trace(go.Bar(x=hours, y=-schedule.discharge_mw, name='V2G Export (MW)', marker_color='#2962FF', yaxis='y'))
+    if np.isfinite(schedule.headroom_mw).all():
+        fig.add_trace(go.Scatter(x=hours, y=schedule.headroom_mw, name='Grid Headroom (MW)',
+                                 line=dict(color='#FF6D00', width=2), yaxis='y'))
+    fig.add_trace(go.Scatter(x=hours, y=schedule.tariff, name='Tariff (SAR)', line=dict(color='#D32F2F', width=3, dash='dot', shape='hv'), yaxis='y2'))
+    
+    # [Visual Update]: White Template
+    peak = max(float(schedule.charge_mw.max()), float(schedule.discharge_mw.max()), 1.0)
+    fig.update_layout(
+        template="plotly_white", paper_bgcolor="white", height=350, barmode='relative', bargap=0,
+        font=dict(color="black"),
+        xaxis=dict(title="Hour", range=[0, 24], dtick=2),
+        yaxis=dict(title="MW", range=[-peak * 1.1, peak * 1.3], tickfont=dict(color="#00C853"), title_font=dict(color="#00C853")),
+        yaxis2=dict(title="SAR", tickfont=dict(color="#D32F2F"), title_font=dict(color="#D32F2F"), overlaying="y", side="right"),
+        legend=dict(x=0, y=1.1, orientation="h", font=dict(color="black"))
+    )
+    return fig
+
+
+def history_curve(ts, values, label, color='#D32F2F', n_raw=None):
+    # WebGL: النقاط مقلّصة مسبقاً لكن التمرير يبقى سلساً (points are already downsampled; WebGL keeps panning smooth)
+    fig = go.Figure()
+    fig.add_trace(go.Scattergl(x=pd.to_datetime(ts, unit='s'), y=values, name=label, mode='lines',
+                               line=dict(color=color, width=1.5), connectgaps=False))
+    fig.update_layout(
+        template="plotly_white", height=350,
+        paper_bgcolor="white", margin=dict(l=0,r=0,t=30,b=0),
+        font=dict(color="black"), yaxis_title=label, showlegend=False,
+        title=dict(text=f"{len(values):,} of {n_raw:,} points" if n_raw else None, font=dict(size=12, color="#666666")),
+        xaxis=dict(title_font=dict(color="black"), tickfont=dict(color="black")),
+        yaxis=dict(title_font=dict(color="black"), tickfont=dict(color="black")),
+    )
+    return fig
+
+
+def fleet_availability(series, zone_names, static_mw=None, deficit_mw=None):
+    fig = go.Figure()
+    for name, mw in zip(zone_names, series.zone_vpp_mw.T):
+        fig.add_trace(go.Scatter(x=series.hours, y=mw, name=name, mode='lines', stackgroup='vpp', line=dict(width=0.5)))
+    fig.add_trace(go.Scatter(x=series.hours, y=series.zone_charging_mw.sum(axis=1), name='Fleet Charging',
+                             line=dict(color='#D32F2F', width=2, dash='dot')))
+    if deficit_mw is not None:
+        fig.add_trace(go.Scatter(x=series.hours, y=deficit_mw, name='Grid Deficit', line=dict(color='black', width=2)))
+    if static_mw is not None:
+        fig.add_hline(y=static_mw, line=dict(color='#999999', dash='dash'), annotation_text="Static slider assumption")
+    fig.update_layout(template="plotly_white", paper_bgcolor="white", height=350, font=dict(color="black"),
+                      margin=dict(l=0,r=0,t=10,b=0), xaxis=dict(title="Hour", dtick=2), yaxis_title="MW",
+                      legend=dict(x=0, y=1.15, orientation="h", font=dict(color="black")))
+    return fig
+
+
+def load_forecast(history, forecast, committed_mw, capacity_gw=None):
+    fig = go.Figure()
+    hist_t = pd.to_datetime(history.times(), unit='s')
+    fc_t = pd.to_datetime(forecast.times(), unit='s')
+    fig.add_trace(go.Scatter(x=hist_t, y=history.values, name='Actual', line=dict(color='black', width=1.5)))
+    fig.add_trace(go.Scatter(x=np.concatenate([fc_t, fc_t[::-1]]), y=np.concatenate([forecast.upper, forecast.lower[::-1]]),
+                             fill='toself', fillcolor='rgba(41,98,255,0.15)', line=dict(width=0), name='90% Band',
+                             hoverinfo='skip'))
+    fig.add_trace(go.Scatter(x=fc_t, y=forecast.mean, name='Forecast', line=dict(color='#2962FF', width=2)))
+    if capacity_gw is not None:
+        fig.add_hline(y=capacity_gw, line=dict(color='#D32F2F', dash='dash'), annotation_text="Capacity")
+    fig.add_trace(go.Bar(x=fc_t, y=committed_mw, name='V2G Commitment (MW)', marker_color='#00C853', opacity=0.6, yaxis='y2'))
+    fig.update_layout(template="plotly_white", paper_bgcolor="white", height=380, font=dict(color="black"), bargap=0,
+                      margin=dict(l=0,r=0,t=10,b=0), yaxis_title="GW",
+                      yaxis2=dict(title="MW", overlaying="y", side="right", showgrid=False, rangemode="tozero",
+                                  title_font=dict(color="#00C853"), tickfont=dict(color="#00C853")),
+                      legend=dict(x=0, y=1.12, orientation="h", font=dict(color="black")))
+    return fig
+
+
+def hot_spot_histogram(hot_spot_with, hot_spot_without, limit_c=110.0):
+    fig = go.Figure()
+    bins = dict(start=float(min(hot_spot_with.min(), hot_spot_without.min())) // 2 * 2, size=2)
+    fig.add_trace(go.Histogram(x=hot_spot_without, name='Without V2G', marker_color='#D32F2F', opacity=0.55, xbins=bins))
+    fig.add_trace(go.Histogram(x=hot_spot_with, name='With V2G', marker_color='#00C853', opacity=0.55, xbins=bins))
+    fig.add_vline(x=limit_c, line=dict(color='black', dash='dash'), annotation_text=f"{limit_c:.0f}°C ref.")
+    fig.update_layout(template="plotly_white", paper_bgcolor="white", height=300, barmode='overlay',
+                      font=dict(color="black"), margin=dict(l=0,r=0,t=10,b=0),
+                      xaxis_title="Daily Peak Hot-Spot (°C)", yaxis_title="Transformers",
+                      legend=dict(x=0, y=1.1, orientation="h", font=dict(color="black")))
+    return fig
+
+
+def reserve_risk(zone_names, risk):
+    fig = go.Figure()
+    fig.add_trace(go.Bar(x=zone_names, y=risk.headroom_p50_mw, name='P50 Headroom', marker_color='#00C853',
+                         error_y=dict(type='data', symmetric=False,
+                                      array=risk.headroom_p95_mw - risk.headroom_p50_mw,
+                                      arrayminus=risk.headroom_p50_mw - risk.headroom_p05_mw)))
+    fig.update_layout(template="plotly_white", paper_bgcolor="white", height=350, font=dict(color="black"),
+                      yaxis_title="VPP Headroom (MW, P5-P95)", margin=dict(l=0,r=0,t=10,b=0))
+    return fig
@@ -0,0 +1,26 @@
+import pandas as pd
+
+from vpp import cli, engine
+from vpp.zones import ZoneRegistry
+
+
+def test_run_with_zone_registry_outside_the_default_network(tmp_path):
+    zones_file, scenarios, out = tmp_path / "zones.csv", tmp_path / "scenarios.csv", tmp_path / "out.csv"
+    ZoneRegistry.synthetic(100, seed=1).to_frame().to_csv(zones_file, index=False)
+    pd.DataFrame({"pct_charging": [20, 40], "pct_v2g": [60, 10]}).to_csv(scenarios, index=False)
+
+    assert cli.main(["run", str(scenarios), "--out", str(out), "--zones", str(zones_file),
+                     "--fleet-size", "10000", "--workers", "1"]) == 0
+    result = pd.read_csv(out)
+    assert len(result) == 2
+    assert result["raw_deficit_gw"].notna().all()
+    assert engine.default_world(zones_file, fleet_size=10000)[2] is None
+
+
+def test_run_with_default_zones_uses_the_network(tmp_path):
+    scenarios, out = tmp_path / "scenarios.csv", tmp_path / "out.csv"
+    pd.DataFrame({"pct_charging": [20], "pct_v2g": [60]}).to_csv(scenarios, index=False)
+
+    assert cli.main(["run", str(scenarios), "--out", str(out), "--fleet-size", "10000", "--workers", "1"]) == 0
+    assert len(pd.read_csv(out)) == 1
+    assert engine.default_world(fleet_size=10000)[2] is not None
@@ -0,0 +1,40 @@
+"""Session-free simulation core for the Riyadh VPP Command Center."""
+from .constants import (
+    AVG_BATTERY_KWH,
+    AVG_CHARGER_CAPACITY_KW,
+    CHARGING_CONCURRENCY_FACTOR,
+    GRID_VOLTAGE_LIMIT_MW,
+    INVERTER_EFFICIENCY,
+    INVERTER_RAMP_MW_PER_S,
+    SETTLEMENT_HOURS,
+    TOTAL_FLEET,
+    V2G_RESERVE_SOC,
+)
+from .cache import LRUCache, cache_stats, clear_caches, memoize
+from .control import ControlInputs, DispatchController
+from .dispatch import DispatchResult, allocate, settlement_payout
+from .engine import BatchResult, commit_day_ahead, run_batch
+from .events import AvailabilitySeries, EventQueue, TripPlan, plan_trips, simulate_availability
+from .forecast import Forecast, SeasonalForecaster, follow_history
+from .fleet import CHARGING, UNPLUGGED, V2G_READY, Fleet, FleetSummary
+from .history import ALL_ZONES, GROSS_LOAD, HistoryRecorder, HistoryStore, HistoryWindow, downsample, lttb, minmax_decimate
+from .ledger import SettlementLedger
+from .montecarlo import RiskResult, RiskScenario, run_risk
+from .network import DCNetwork, PowerFlow
+from .profiling import Profiler
+from .scheduling import ChargeSchedule, Cohorts, fleet_cohorts, schedule_fleet
+from .state import GridState, GridStateStore
+from .physics import GridPhysics, fleet_physics, grid_balance, grid_physics, scenario_sweep
+from .timeseries import LoadSeries, simulate_load
+from .telemetry import (
+    RECORD_DTYPE,
+    ReplaySource,
+    SocketSource,
+    SyntheticSource,
+    TelemetryAggregator,
+    TelemetryPipeline,
+    ZoneRingBuffer,
+)
+from .thermal import ThermalResult, TransformerFleet, daily_aging, simulate_aging
+from .tiles import DensityTiles, FleetPoints, bin_density, fleet_view
+from .zones import ZoneRegistry
@@ -0,0 +1,117 @@
+"""Bounded LRU memoization keyed on exact inputs, with hit/miss counters.
+
+Streamlit re-executes the page script on every interaction, redefining
+every function in it.  Caches are therefore registered by the function's
+qualified name and bytecode, so a redefined but unchanged function keeps
+its warm cache across reruns and sessions.
+"""
+import functools
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+_REGISTRY = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def _freeze(value):
+    """Turn ``value`` into a hashable cache key component."""
+    if isinstance(value, np.ndarray):
+        digest = hashlib.blake2b(np.ascontiguousarray(value).view(np.uint8), digest_size=16).digest()
+        return ("ndarray", value.dtype.str, value.shape, digest)
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (list, tuple)):
+        return (type(value).__name__,) + tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return ("dict",) + tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    hash(value)
+    return value
+
+
+class LRUCache:
+    """Thread-safe LRU mapping that counts hits, misses and evictions."""
+
+    def __init__(self, name, maxsize=64):
+        self.name = name
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        return {"name": self.name, "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "size": len(self._data), "maxsize": self.maxsize}
+
+
+_MISSING = object()
+
+
+def memoize(maxsize=64):
+    """Decorator caching results by the exact positional and keyword arguments.
+
+    Cached values are shared, so callers must treat them as read-only.
+    """
+    def decorator(fn):
+        code = fn.__code__
+        ident = (fn.__module__, fn.__qualname__, code.co_code, code.co_consts)
+        with _REGISTRY_LOCK:
+            cache = _REGISTRY.get(ident)
+            if cache is None:
+                cache = _REGISTRY[ident] = LRUCache(fn.__qualname__, maxsize)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = (_freeze(args), _freeze(kwargs))
+            value = cache.get(key, _MISSING)
+            if value is _MISSING:
+                value = fn(*args, **kwargs)
+                cache.put(key, value)
+            return value
+
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+
+def cache_stats():
+    """Counters for every live cache, one dict per memoized function."""
+    with _REGISTRY_LOCK:
+        caches = list(_REGISTRY.values())
+    return [c.stats() for c in caches]
+
+
+def clear_caches():
+    with _REGISTRY_LOCK:
+        caches = list(_REGISTRY.values())
+    for c in caches:
+        c.clear()
@@ -0,0 +1,125 @@
+"""Batch command line for the headless engine.
+
+    python -m vpp run scenarios.csv --out results.parquet --workers 8
+
+Scenario files are CSV, Parquet or JSON lines with any subset of the
+``engine.SCENARIO_DEFAULTS`` columns; missing columns take the dashboard
+defaults.  Scenarios are split into chunks and evaluated in-process.
+Local capacity comes from a DC power flow over the transmission network,
+as in the dashboard, when every zone is one of its buses; other zone
+registries without ``--network`` use the fixed load-share estimate.
+Spawned workers each pay seconds of start-up (imports plus building the
+zone registry, fleet and network) against a few microseconds per
+scenario, so by default they are used only from
+``PARALLEL_MIN_SCENARIOS`` up, with one large chunk per worker.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from . import engine
+from .constants import TOTAL_FLEET
+
+_WORLD = None
+
+# نقطة التعادل: ~5 ث لبدء العمليات مقابل ~5.5 ميكروثانية لكل سيناريو (crossover: ~5 s pool start-up vs ~5.5 us per scenario)
+PARALLEL_MIN_SCENARIOS = 1_250_000
+
+
+def read_table(path):
+    path = Path(path)
+    if path.suffix == ".parquet":
+        return pd.read_parquet(path)
+    if path.suffix in (".json", ".jsonl"):
+        return pd.read_json(path, lines=True)
+    return pd.read_csv(path)
+
+
+def write_table(frame, path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.suffix == ".parquet":
+        frame.to_parquet(path, index=False)
+    else:
+        frame.to_csv(path, index=False)
+
+
+def _init_worker(zones_file, fleet_size, seed, network_file=None):
+    global _WORLD
+    _WORLD = engine.default_world(zones_file, fleet_size, seed, network_file)
+
+
+def _run_chunk(chunk):
+    zones, fleet, network = _WORLD
+    return engine.run_batch(chunk, zones, fleet, network=network)
+
+
+def run_scenarios(frame, zones_file=None, fleet_size=TOTAL_FLEET, seed=99, workers=1, chunk_size=5000,
+                  network_file=None):
+    """Evaluate ``frame`` in chunks, across ``workers`` processes when > 1.
+
+    ``workers=None`` runs serially below ``PARALLEL_MIN_SCENARIOS`` and on
+    every CPU above it.  In parallel, chunks grow so that each worker gets
+    at least one share of the whole table.
+    """
+    frame = engine.normalize_scenarios(frame)
+    if workers is None:
+        workers = os.cpu_count() if len(frame) >= PARALLEL_MIN_SCENARIOS else 1
+    if workers > 1:
+        chunk_size = max(chunk_size, int(np.ceil(len(frame) / workers)))
+    chunks = [frame.iloc[i:i + chunk_size] for i in range(0, len(frame), chunk_size)] or [frame]
+    if workers > 1 and len(chunks) > 1:
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), mp_context=ctx,
+                                 initializer=_init_worker, initargs=(zones_file, fleet_size, seed, network_file)) as pool:
+            parts = list(pool.map(_run_chunk, chunks))
+    else:
+        _init_worker(zones_file, fleet_size, seed, network_file)
+        parts = [_run_chunk(c) for c in chunks]
+    return engine.BatchResult(
+        pd.concat([p.scenarios for p in parts], ignore_index=True),
+        pd.concat([p.zones for p in parts], ignore_index=True),
+    )
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m vpp", description="Riyadh VPP headless simulation")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="evaluate a scenario file in batch")
+    run.add_argument("scenarios", help="CSV, Parquet or JSON-lines scenario table")
+    run.add_argument("--out", required=True, help="per-scenario results (.csv or .parquet)")
+    run.add_argument("--zone-out", help="optional per-zone results (.csv or .parquet)")
+    run.add_argument("--zones", help="zone registry file (default: data/riyadh_zones.csv)")
+    run.add_argument("--network", help="bus / line file for the power flow (default: data/riyadh_network.csv, "
+                                      "used only when it has a bus for every zone)")
+    run.add_argument("--fleet-size", type=int, default=TOTAL_FLEET)
+    run.add_argument("--seed", type=int, default=99)
+    run.add_argument("--workers", type=int, default=None,
+                     help=f"worker processes (default: 1 below {PARALLEL_MIN_SCENARIOS:,} scenarios, every CPU above; "
+                          "spawning costs ~5 s against ~5.5 us per scenario)")
+    run.add_argument("--chunk-size", type=int, default=5000,
+                     help="scenarios per chunk; with several workers each gets at least one share of the table")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == "run":
+        started = time.perf_counter()
+        frame = read_table(args.scenarios)
+        result = run_scenarios(frame, args.zones, args.fleet_size, args.seed, args.workers, args.chunk_size,
+                               args.network)
+        write_table(result.scenarios, args.out)
+        if args.zone_out:
+            write_table(result.zones, args.zone_out)
+        print(f"{len(result.scenarios):,} scenarios in {time.perf_counter() - started:.2f}s -> {args.out}",
+              file=sys.stderr)
+    return 0
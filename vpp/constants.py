@@ -0,0 +1,19 @@
+"""Engineering constants shared by the dashboard and the simulation core."""
+
+AVG_CHARGER_CAPACITY_KW = 8.5
+CHARGING_CONCURRENCY_FACTOR = 0.85
+INVERTER_EFFICIENCY = 0.95
+GRID_VOLTAGE_LIMIT_MW = 250.0
+
+# حجم الأسطول الافتراضي (Default fleet size)
+TOTAL_FLEET = 100000
+
+# مدة دورة التسوية بالساعات (Settlement cycle length, hours)
+SETTLEMENT_HOURS = 4
+
+# سرعة تصاعد العواكس لكل محطة (Aggregate inverter ramp rate per substation, MW/s)
+INVERTER_RAMP_MW_PER_S = 100.0
+
+# سعة البطارية المتوسطة وحد الاحتياط لتفريغ V2G (Average battery size, kWh; SoC floor kept back from V2G)
+AVG_BATTERY_KWH = 60.0
+V2G_RESERVE_SOC = 0.3
@@ -0,0 +1,231 @@
+"""Background dispatch control loop on its own asyncio event loop.
+
+Two coroutines share one loop thread.  The control task wakes at a fixed
+cadence (or at once when ``wake`` is called), recomputes the city deficit
+from the latest operator inputs and, if attached, live telemetry, and
+commands a fresh allocation into the shared ``GridStateStore``.  The ramp
+task moves each zone's inverter output toward its commanded set-point at
+a bounded rate and meters what was delivered: each zone's open interval
+is billed to the ledger, for the energy actually dispatched, when its
+set-point moves, after a settlement cycle, or once it is back at zero.
+Page scripts only push inputs and read the store.
+"""
+import asyncio
+import threading
+import time
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from . import dispatch, physics
+from .constants import INVERTER_RAMP_MW_PER_S, SETTLEMENT_HOURS
+from .engine import cars_for_mw, local_balance
+
+CONTROLLER_ID = "controller"
+
+
+class ControlInputs(NamedTuple):
+    base_residential_load: Optional[float]  # None: read it from attached telemetry
+    industrial_load: float
+    grid_cap: float
+    pct_charging: float
+    pct_v2g: float
+    sell_price: float
+    live_telemetry: bool = False
+
+
+class DispatchController:
+    """Fixed-cadence re-allocation plus inverter ramping, independent of UI reruns."""
+
+    def __init__(self, store, fleet, ledger=None, interval=1.0, ramp_interval=0.1,
+                 ramp_mw_per_s=INVERTER_RAMP_MW_PER_S, zones=None, network=None):
+        self.store = store
+        self.fleet = fleet
+        self.ledger = ledger
+        self.zones = zones
+        self.network = network
+        self.interval = interval
+        self.ramp_interval = ramp_interval
+        self.ramp_mw_per_s = ramp_mw_per_s
+        self.zone_names = np.asarray(store.zone_names, dtype=object)
+        self.telemetry = None
+        self.ticks = 0
+        self.last_tick_s = 0.0
+        self.last_error = None
+        self._inputs = None
+        self._open = None
+        self._deficit = (None, None)
+        self._loop = None
+        self._wake = None
+        self._task = None
+        self._thread = None
+        self._ready = threading.Event()
+
+    # -- من واجهة المشغّل (from operator sessions, any thread) --
+    @property
+    def inputs(self):
+        return self._inputs
+
+    def set_inputs(self, inputs):
+        self._inputs = inputs
+        self.wake()
+
+    def attach_telemetry(self, aggregator):
+        self.telemetry = aggregator
+
+    def wake(self):
+        """Run a control cycle now instead of at the next tick."""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    # -- دورة التحكم (one cycle of each task; also callable synchronously) --
+    def control_step(self):
+        """Recompute the deficit and re-allocate; returns the ``DispatchResult`` or ``None`` when idle."""
+        state, inputs = self.store.snapshot(), self._inputs
+        if not state.dispatch_active or inputs is None:
+            return None
+
+        summary = self.fleet.participation_summary(inputs.pct_charging, inputs.pct_v2g)
+        base_load = inputs.base_residential_load
+        if inputs.live_telemetry and self.telemetry is not None and self.telemetry.readings:
+            base_load, ev_load_kw = self.telemetry.physics_inputs()
+            summary = summary._replace(ev_load_kw=ev_load_kw)
+        if base_load is None:
+            return None  # بانتظار أول قراءة حية (waiting for the first live reading)
+        grid = physics.fleet_physics(summary, base_load, inputs.industrial_load, inputs.grid_cap)
+
+        # العجز المحلي من مدخلات التوزيع لا من عروض الأحياء (local deficits follow the dispatch inputs, not zone views)
+        local_deficit_gw = None
+        if self.zones is not None:
+            local_deficit_gw = self._local_deficit(float(grid.total_res_load), inputs.grid_cap)
+
+        # التوزيع مع احترام القيود (Constraint-aware allocation across zones)
+        allocation = dispatch.allocate(
+            float(grid.raw_deficit) * 1000, summary.zone_vpp_mw,
+            local_deficit_mw=(state.local_deficit_gw if local_deficit_gw is None else local_deficit_gw) * 1000,
+            sell_price=inputs.sell_price,
+        )
+        self.store.set_allocation(allocation.allocation_mw, allocation.payout_sar, local_deficit_gw, by=CONTROLLER_ID)
+        return allocation
+
+    def _local_deficit(self, total_res_load, grid_cap):
+        # تدفق القدرة يُعاد فقط عند تغيّر الحمل أو السعة (re-run the power flow only when load or capacity moves)
+        key, deficit = self._deficit
+        if key != (total_res_load, grid_cap):
+            deficit = local_balance(total_res_load, grid_cap, self.zones, self.network)[2]
+            self._deficit = ((total_res_load, grid_cap), deficit)
+        return deficit
+
+    def ramp_step(self, dt):
+        """Move every zone's output toward its set-point by at most ``ramp_mw_per_s * dt``."""
+        step = self.ramp_mw_per_s * dt
+
+        def change(state):
+            return {"dispatched_mw": state.dispatched_mw + np.clip(state.target_mw - state.dispatched_mw, -step, step)}
+        state = self.store.update(change, by=CONTROLLER_ID)
+        self._meter(state)
+        return state
+
+    # -- عدّاد التسوية (settlement metering, on the loop thread) --
+    def _meter(self, state):
+        now = time.time()
+        if self._open is None:
+            n = len(self.zone_names)
+            self._open = {"since": np.full(n, now), "mwh": np.zeros(n), "target": np.zeros(n),
+                          "price": np.zeros(n), "source": np.full(n, "central", dtype=object),
+                          "mw": np.zeros(n), "t": now}
+            self._reopen(state, np.ones(n, dtype=bool), now)
+        meter = self._open
+        # الخرج ثابت بين تحديثين للمخزن (output holds between store updates)
+        meter["mwh"] += meter["mw"] * (now - meter["t"]) / 3600.0
+        meter["mw"], meter["t"] = state.dispatched_mw, now
+        moved = ~np.isclose(state.target_mw, meter["target"], rtol=0.01, atol=0.5)
+        idle = (state.target_mw == 0) & (state.dispatched_mw == 0) & (meter["mwh"] > 0)
+        due = moved | idle | (now - meter["since"] >= SETTLEMENT_HOURS * 3600)
+        if due.any():
+            self._bill(due, now)
+            self._reopen(state, due, now)
+
+    def _reopen(self, state, zones, now):
+        meter = self._open
+        meter["since"][zones] = now
+        meter["target"][zones] = state.target_mw[zones]
+        # دخل الدورة عند نقطة الضبط يحمل السعر (the set-point's cycle payout carries its price)
+        priced = zones & (state.target_mw > 0)
+        meter["price"][priced] = state.payout_sar[priced] / (state.target_mw[priced] * 1000 * SETTLEMENT_HOURS)
+        meter["source"][priced] = "central" if state.dispatch_active else "local"
+
+    def _bill(self, zones, now):
+        meter = self._open
+        billed = zones & (meter["mwh"] > 0)
+        if self.ledger is not None and billed.any():
+            since = meter["since"][billed]
+            mw = meter["mwh"][billed] / (np.maximum(now - since, 1e-3) / 3600.0)
+            self.ledger.append(self.zone_names[billed], mw, since, now, meter["price"][billed],
+                               cars_for_mw(mw), meter["source"][billed])
+        meter["mwh"][zones] = 0.0
+
+    # -- الحلقات غير المتزامنة (asyncio tasks) --
+    def _guard(self, fn, *args):
+        # خطأ في دورة واحدة لا يوقف الحلقة (one failed cycle must not stop the loop)
+        try:
+            fn(*args)
+        except Exception as exc:
+            self.last_error = exc
+
+    async def _control_loop(self):
+        loop = asyncio.get_running_loop()
+        next_t = loop.time()
+        while True:
+            t0 = time.perf_counter()
+            self._guard(self.control_step)
+            self.last_tick_s = time.perf_counter() - t0
+            self.ticks += 1
+            next_t += self.interval
+            try:
+                await asyncio.wait_for(self._wake.wait(), max(0.0, next_t - loop.time()))
+            except asyncio.TimeoutError:
+                continue
+            self._wake.clear()
+            next_t = loop.time()
+
+    async def _ramp_loop(self):
+        loop = asyncio.get_running_loop()
+        last = loop.time()
+        while True:
+            await asyncio.sleep(self.ramp_interval)
+            now = loop.time()
+            self._guard(self.ramp_step, now - last)
+            last = now
+
+    async def _main(self):
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = asyncio.gather(self._control_loop(), self._ramp_loop())
+        self._ready.set()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._ready.clear()
+            self._thread = threading.Thread(target=asyncio.run, args=(self._main(),), name="vpp-dispatch", daemon=True)
+            self._thread.start()
+            self._ready.wait(timeout=2.0)
+        return self
+
+    def stop(self):
+        if self._loop is not None and self._task is not None:
+            self._loop.call_soon_threadsafe(self._task.cancel)
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+        self._loop = None
+        if self._open is not None:
+            self._meter(self.store.snapshot())
+            self._bill(np.ones(len(self.zone_names), dtype=bool), time.time())
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
@@ -0,0 +1,73 @@
+"""Constraint-aware VPP dispatch allocation.
+
+The allocation is a linear program with one coupling constraint (total MW
+equals the system deficit) and box constraints per zone, so it is solved
+exactly by a merit-order fill: sort zones by cost, take the cumulative
+headroom and clip.  Every step is an array operation along the last axis,
+so leading axes can batch many telemetry ticks into one call.
+"""
+from typing import NamedTuple
+
+import numpy as np
+
+from .constants import GRID_VOLTAGE_LIMIT_MW, SETTLEMENT_HOURS
+
+
+class DispatchResult(NamedTuple):
+    allocation_mw: np.ndarray  # MW per zone
+    payout_sar: np.ndarray     # SAR per zone for the settlement cycle
+    cap_mw: np.ndarray         # effective export cap per zone
+    unserved_mw: np.ndarray    # target left uncovered
+
+
+def settlement_payout(dispatched_mw, sell_price, hours=SETTLEMENT_HOURS):
+    """Payout in SAR for ``dispatched_mw`` held for ``hours`` at ``sell_price`` SAR/kWh."""
+    return np.asarray(dispatched_mw) * 1000 * sell_price * hours
+
+
+def _fill(target, headroom, cost):
+    """Fill ``target`` MW from ``headroom`` in ascending ``cost`` order."""
+    order = np.argsort(cost, axis=-1, kind="stable")
+    sorted_room = np.take_along_axis(headroom, order, axis=-1)
+    before = np.cumsum(sorted_room, axis=-1) - sorted_room
+    sorted_alloc = np.clip(target[..., None] - before, 0.0, sorted_room)
+    alloc = np.empty_like(sorted_alloc)
+    np.put_along_axis(alloc, order, sorted_alloc, axis=-1)
+    return alloc
+
+
+def allocate(deficit_mw, available_mw, local_deficit_mw=0.0, export_cap_mw=np.inf,
+             cost=None, voltage_limit_mw=GRID_VOLTAGE_LIMIT_MW, sell_price=0.0):
+    """Allocate ``deficit_mw`` of V2G injection across zones.
+
+    Each zone is capped at ``min(available, export_cap, voltage_limit)``.
+    Zones first cover their own ``local_deficit_mw``; the rest of the
+    system deficit is then spread over the remaining headroom, either
+    pro rata (``cost=None``, matching the old global dispatch ratio) or in
+    merit order of ``cost``.
+    """
+    available_mw = np.asarray(available_mw, dtype=np.float64)
+    cap = np.minimum(np.minimum(available_mw, export_cap_mw), voltage_limit_mw)
+    cap = np.maximum(cap, 0.0)
+    deficit_mw = np.maximum(np.asarray(deficit_mw, dtype=np.float64), 0.0)
+    deficit_mw = np.broadcast_to(deficit_mw, cap.shape[:-1])
+
+    # 1. تغطية العجز المحلي أولاً (Local deficits first)
+    local = np.minimum(np.maximum(local_deficit_mw, 0.0), cap)
+    local = np.broadcast_to(local, cap.shape)
+    remaining = np.maximum(deficit_mw - local.sum(axis=-1), 0.0)
+    headroom = cap - local
+
+    # 2. توزيع الباقي (Spread the remainder)
+    if cost is None:
+        total_room = headroom.sum(axis=-1)
+        ratio = np.divide(remaining, total_room, out=np.zeros_like(remaining), where=total_room > 0)
+        extra = headroom * np.minimum(ratio, 1.0)[..., None]
+    else:
+        cost = np.broadcast_to(np.asarray(cost, dtype=np.float64), cap.shape)
+        extra = _fill(remaining, headroom, cost)
+
+    allocation = local + extra
+    unserved = deficit_mw - allocation.sum(axis=-1)
+    unserved = np.where(unserved > 1e-9, unserved, 0.0)  # ignore float round-off
+    return DispatchResult(allocation, settlement_payout(allocation, sell_price), cap, unserved)
@@ -0,0 +1,211 @@
+"""Headless scenario engine: physics, dispatch and settlement without a UI.
+
+``run_batch`` evaluates a whole table of scenarios with array operations:
+fleet aggregates come from per-zone prefix sums, and dispatch is solved
+for every scenario in one batched ``allocate`` call.
+"""
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from .constants import AVG_CHARGER_CAPACITY_KW, INVERTER_EFFICIENCY, TOTAL_FLEET
+from .dispatch import allocate
+from .fleet import Fleet
+from .network import DCNetwork
+from .physics import grid_balance
+from .zones import ZoneRegistry
+
+# قيم افتراضية مطابقة للوحة التحكم (defaults match the dashboard sliders)
+SCENARIO_DEFAULTS = {
+    "pct_charging": 20.0,
+    "pct_v2g": 60.0,
+    "base_residential_load": 14.3,
+    "industrial_load": 4.0,
+    "grid_cap": 18.0,
+    "sell_price": 0.80,
+    "buy_price": 0.18,
+    "dispatch_active": True,
+}
+
+ONE_CAR_CAPACITY_MW = AVG_CHARGER_CAPACITY_KW * INVERTER_EFFICIENCY / 1000
+
+
+class BatchResult(NamedTuple):
+    scenarios: pd.DataFrame  # one row per scenario
+    zones: pd.DataFrame      # one row per (scenario, zone)
+
+
+def cars_for_mw(mw):
+    """Number of V2G cars needed to export ``mw``."""
+    return (np.asarray(mw) / ONE_CAR_CAPACITY_MW).astype(np.int64)
+
+
+def zone_power_flow(network, zones, zone_load_gw, dispatched_mw=0.0):
+    """DC power flow with zone loads withdrawn and V2G exports injected at the zone buses.
+
+    ``zone_load_gw`` and ``dispatched_mw`` are ``(..., n_zones)``; returns the
+    ``PowerFlow`` (line axis first, scenarios after) and the zone bus indices.
+    """
+    buses = network.bus_index(zones.names)
+    net_mw = np.asarray(dispatched_mw, dtype=np.float64) - np.asarray(zone_load_gw, dtype=np.float64) * 1000.0
+    injection = np.zeros((len(network),) + net_mw.shape[:-1])
+    injection[buses] = np.moveaxis(net_mw, -1, 0)
+    return network.solve(injection), buses
+
+
+def local_balance(total_res_load, grid_cap, zones, network=None):
+    """Per-zone ``(load_gw, capacity_gw, local_deficit_gw)`` for city totals.
+
+    Without a ``network`` each zone may draw a fixed share of ``grid_cap``.
+    With one, the deficit is the relief each zone must supply for the lines
+    it is best placed to unload, from a DC power flow, and the capacity is
+    the load its bus could take before any line it loads hits its rating
+    (capped at its present load while other zones' lines are overloaded).
+    """
+    return zone_balance(zones.zone_loads(total_res_load), grid_cap, zones, network)
+
+
+def zone_balance(zone_load, grid_cap, zones, network=None):
+    """``local_balance`` for per-zone loads ``(..., n_zones)`` in GW, e.g. recorded history."""
+    zone_load = np.asarray(zone_load, dtype=np.float64)
+    if network is None:
+        zone_cap = zones.zone_capacity(grid_cap)
+        return zone_load, zone_cap, np.maximum(0.0, zone_load - zone_cap)
+
+    flow, buses = zone_power_flow(network, zones, zone_load)
+    sensitivity = network.ptdf(buses)
+    headroom = network.bus_headroom(flow.flow_mw, buses, sensitivity)
+    relief = network.relief_needed(flow.flow_mw, buses, sensitivity)
+    headroom, deficit = np.moveaxis(headroom, 0, -1) / 1000.0, np.moveaxis(relief, 0, -1) / 1000.0
+    zone_cap = np.where(deficit > 0, zone_load - deficit, zone_load + np.maximum(headroom, 0.0))
+    return zone_load, zone_cap, deficit
+
+
+def commit_day_ahead(zone_load_gw, zone_capacity_gw, zone_available_mw, cost=None):
+    """V2G commitment per forecast step for ``(n_zones, n_steps)`` load and availability forecasts.
+
+    Each step's deficit is the sum of the zone overloads, and each zone
+    covers its own first; returns a ``DispatchResult`` with a leading step
+    axis.
+    """
+    load = np.moveaxis(np.asarray(zone_load_gw, dtype=np.float64), -1, 0)
+    local_mw = np.maximum(load - np.asarray(zone_capacity_gw, dtype=np.float64), 0.0) * 1000.0
+    available = np.moveaxis(np.asarray(zone_available_mw, dtype=np.float64), -1, 0)
+    return allocate(local_mw.sum(axis=-1), available, local_deficit_mw=local_mw, cost=cost)
+
+
+# حالة المنطقة على خريطة الشبكة (grid map status codes)
+MAP_STABLE, MAP_CRITICAL, MAP_INJECTING = 0, 1, 2
+
+
+def map_status(dispatched_mw, net_deficit_gw, dispatch_active):
+    """Per-zone grid map status code."""
+    dispatched_mw = np.asarray(dispatched_mw)
+    if net_deficit_gw > 0:
+        return np.full(len(dispatched_mw), MAP_CRITICAL, dtype=np.int8)
+    if dispatch_active:
+        return np.full(len(dispatched_mw), MAP_INJECTING, dtype=np.int8)
+    return np.where(dispatched_mw > 0, MAP_INJECTING, MAP_STABLE).astype(np.int8)
+
+
+def settlement_frame(zone_names, dispatched_mw, payout_sar, dispatch_active):
+    """Operations settlement table and its ``(cars, mw, payout)`` totals."""
+    z_mw = np.asarray(dispatched_mw, dtype=np.float64)
+    z_payout = np.asarray(payout_sar, dtype=np.float64)
+    active = z_mw > 0
+    z_cars = np.where(active, cars_for_mw(z_mw), 0)
+    active_label = "🟢 Active (Central)" if dispatch_active else "🟢 Active (Local)"
+
+    df_ops = pd.DataFrame({
+        "Zone (District)": zone_names,
+        "Status": np.where(active, active_label, "⚪ Standby"),
+        "Active V2G Cars": [f"{c:,}" for c in z_cars.tolist()],
+        "Dispatched Power (MW)": [f"{m:.2f}" for m in z_mw.tolist()],
+        "Est. Payout (SAR)": [f"{p:,.0f}" for p in z_payout.tolist()],
+    })
+    return df_ops, (int(z_cars.sum()), float(z_mw.sum()), float(z_payout.sum()))
+
+
+def normalize_scenarios(frame):
+    """Fill missing scenario columns with defaults and coerce dtypes."""
+    frame = frame.copy()
+    for col, default in SCENARIO_DEFAULTS.items():
+        if col not in frame.columns:
+            frame[col] = default
+        frame[col] = frame[col].fillna(default).astype(type(default))
+    if "scenario_id" not in frame.columns:
+        frame["scenario_id"] = np.arange(len(frame))
+    return frame.reset_index(drop=True)
+
+
+def run_batch(frame, zones, fleet, network=None):
+    """Evaluate every scenario in ``frame`` against ``zones`` and ``fleet``.
+
+    ``network`` (a ``DCNetwork``) replaces the fixed-share local capacity
+    with a power-flow one.
+    """
+    frame = normalize_scenarios(frame)
+    n, n_zones = len(frame), len(zones)
+
+    # 1. تجميع الأسطول بمجاميع تراكمية (fleet aggregates from per-zone prefix sums)
+    fleet_summary = fleet.participation_summary(frame["pct_charging"].to_numpy(), frame["pct_v2g"].to_numpy())
+    zone_vpp, zone_v2g = fleet_summary.zone_vpp_mw, fleet_summary.zone_num_v2g
+
+    # 2. الفيزياء (physics)
+    phys = grid_balance(fleet_summary.ev_load_kw, fleet_summary.vpp_cap_mw,
+                        fleet_summary.num_charging, fleet_summary.num_v2g,
+                        frame["base_residential_load"].to_numpy(), frame["industrial_load"].to_numpy(),
+                        frame["grid_cap"].to_numpy())
+    zone_load, zone_cap, local_deficit = local_balance(phys.total_res_load, frame["grid_cap"].to_numpy(), zones, network)
+
+    # 3. التوزيع والتسوية (dispatch and settlement)
+    active = frame["dispatch_active"].to_numpy()
+    result = allocate(np.where(active, phys.raw_deficit * 1000, 0.0), zone_vpp,
+                      local_deficit_mw=np.where(active[:, None], local_deficit * 1000, 0.0),
+                      sell_price=frame["sell_price"].to_numpy()[:, None])
+    alloc = np.where(active[:, None], result.allocation_mw, 0.0)
+    payout = np.where(active[:, None], result.payout_sar, 0.0)
+    dispatched = alloc.sum(axis=1)
+
+    scenarios = frame.assign(
+        total_city_load_gw=phys.total_city_load,
+        total_res_load_gw=phys.total_res_load,
+        raw_deficit_gw=phys.raw_deficit,
+        vpp_cap_mw=phys.vpp_cap_mw,
+        num_charging=phys.num_charging,
+        num_v2g=phys.num_v2g,
+        dispatched_mw=dispatched,
+        net_deficit_gw=np.maximum(0.0, phys.raw_deficit - dispatched / 1000.0),
+        payout_sar=payout.sum(axis=1),
+        active_cars=cars_for_mw(alloc).sum(axis=1),
+    )
+    zone_frame = pd.DataFrame({
+        "scenario_id": np.repeat(frame["scenario_id"].to_numpy(), n_zones),
+        "zone": np.tile(zones.name, n),
+        "load_gw": zone_load.ravel(),
+        "capacity_gw": zone_cap.ravel(),
+        "local_deficit_gw": local_deficit.ravel(),
+        "vpp_mw": zone_vpp.ravel(),
+        "v2g_cars": zone_v2g.ravel(),
+        "dispatched_mw": alloc.ravel(),
+        "payout_sar": payout.ravel(),
+    })
+    return BatchResult(scenarios, zone_frame)
+
+
+def default_world(zones_file=None, fleet_size=TOTAL_FLEET, seed=99, network_file=None):
+    """The dashboard's zone registry, fleet and transmission network, built without Streamlit.
+
+    Without ``network_file`` the default network is used only when every
+    zone is one of its buses; otherwise ``network`` is ``None`` and
+    ``run_batch`` falls back to the fixed load-share capacity.
+    """
+    zones = ZoneRegistry.from_file(zones_file) if zones_file else ZoneRegistry.from_file()
+    fleet = Fleet.synthesize(zones.ev_density, fleet_size, zone_lat=zones.lat, zone_lon=zones.lon, seed=seed)
+    if network_file:
+        return zones, fleet, DCNetwork.from_file(network_file)
+    network = DCNetwork.from_file()
+    if not set(zones.names) <= set(network.bus):
+        network = None  # سجل أحياء لا تعرفه الشبكة الافتراضية (a registry the default network does not cover)
+    return zones, fleet, network
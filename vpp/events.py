@@ -0,0 +1,268 @@
+"""Discrete-event simulation of vehicles arriving, leaving and charging.
+
+Each vehicle follows a daily trip plan: commuters go home -> work -> home,
+everyone else makes one midday errand.  Plan events are known up front.
+Charging creates further events as it goes: a charging car that crosses the
+V2G reserve floor becomes exportable, and one that reaches its target SoC
+stops drawing power.  Leaving the plug cancels both.
+
+Events wait in a heap keyed by ``(minute, kind)``.  Each key holds one
+batch: every event of that kind in that minute, as index arrays.  Popping a
+batch updates all of its vehicles with array operations and moves the
+per-zone running totals by their change in contribution.  A simulated day
+of millions of events therefore costs a few thousand heap operations.  The
+totals are sampled every output step, giving the dispatch a per-zone V2G
+capacity that moves through the day.
+"""
+import heapq
+from typing import NamedTuple
+
+import numpy as np
+
+from .constants import AVG_BATTERY_KWH, INVERTER_EFFICIENCY, V2G_RESERVE_SOC
+
+# أنواع الأحداث بترتيب المعالجة عند تساوي الوقت (event kinds, in processing order at equal times)
+DEPART, ARRIVE, SOC_RESERVE, SOC_TARGET = 0, 1, 2, 3
+EVENT_KINDS = ("depart", "arrive", "soc_reserve", "soc_target")
+
+MINUTES_PER_DAY = 1440
+KWH_PER_KM = 0.18
+
+
+class TripPlan(NamedTuple):
+    """Flat event table of the plan, one row per arrival or departure."""
+    vehicle: np.ndarray    # int64
+    time_min: np.ndarray   # int64, minutes from the start of the run
+    kind: np.ndarray       # DEPART / ARRIVE
+    zone: np.ndarray       # zone reached (arrivals)
+    plug: np.ndarray       # plugs in on arrival
+    trip_kwh: np.ndarray   # energy used by the leg ending at this arrival
+
+
+class AvailabilitySeries(NamedTuple):
+    hours: np.ndarray             # sample time, hours from the start of the first sampled day
+    zone_vpp_mw: np.ndarray       # (n_steps, n_zones) export capacity: plugged, enrolled, above the reserve
+    zone_charging_mw: np.ndarray  # (n_steps, n_zones) charging draw
+    zone_plugged: np.ndarray      # (n_steps, n_zones) vehicles plugged in
+    event_counts: np.ndarray      # events processed, per kind
+    n_batches: int
+
+
+class EventQueue:
+    """Min-heap of event batches keyed by ``(time, kind)``.
+
+    Pushing events for a time and kind already in the heap appends to that
+    batch instead of adding a heap entry.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._batches = {}
+        self.pushed = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, time, kind, *columns):
+        """Schedule one event per element of ``time`` (integer); ``columns`` are the per-event payload arrays."""
+        time = np.asarray(time, dtype=np.int64)
+        if not len(time):
+            return
+        order = np.argsort(time, kind="stable")
+        t = time[order]
+        columns = [c[order] for c in columns]
+        edges = np.flatnonzero(t[1:] != t[:-1]) + 1
+        for start, end in zip(np.concatenate(([0], edges)), np.concatenate((edges, [len(t)]))):
+            key = (int(t[start]), kind)
+            parts = self._batches.get(key)
+            if parts is None:
+                parts = self._batches[key] = []
+                heapq.heappush(self._heap, key)
+            parts.append([c[start:end] for c in columns])
+        self.pushed += len(t)
+
+    def peek_time(self):
+        return self._heap[0][0] if self._heap else None
+
+    def pop(self):
+        """Earliest batch as ``(time, kind, columns)``."""
+        key = heapq.heappop(self._heap)
+        parts = self._batches.pop(key)
+        columns = parts[0] if len(parts) == 1 else [np.concatenate(c) for c in zip(*parts)]
+        return key[0], key[1], columns
+
+
+def plan_trips(fleet, days=1, work_zone_share=None, commuter_share=0.65, home_plug_share=0.8,
+               work_plug_share=0.25, seed=None):
+    """Daily trips for every vehicle, starting parked at home at minute 0.
+
+    Commuters leave around 07:00 and return around 17:30; workplaces are
+    drawn from ``work_zone_share`` (default: the home zone).  Other vehicles
+    make one errand around midday.  Each arrival plugs in with the home or
+    work plug-in probability.
+    """
+    rng = np.random.default_rng(seed)
+    n = len(fleet)
+    home = fleet.zone_id.astype(np.int64)
+    commuter = rng.random(n) < commuter_share
+    if work_zone_share is None:
+        work = home
+    else:
+        share = np.asarray(work_zone_share, dtype=np.float64)
+        work = rng.choice(len(share), n, p=share / share.sum())
+    commute_km = rng.lognormal(np.log(18.0), 0.5, n)
+
+    # أعمدة الرحلات لكل مركبة، ثم فرض الترتيب الزمني (per-vehicle leg columns, then enforce time order)
+    c, o = np.flatnonzero(commuter), np.flatnonzero(~commuter)
+    day = np.arange(days)[:, None] * MINUTES_PER_DAY
+
+    travel = rng.lognormal(np.log(30.0), 0.4, (days, len(c)))
+    leave_home = day + rng.normal(7 * 60, 45, (days, len(c)))
+    at_work = leave_home + travel
+    leave_work = np.maximum(day + rng.normal(16.5 * 60, 60, (days, len(c))), at_work + 120)
+    at_home = leave_work + travel * rng.lognormal(0.0, 0.2, (days, len(c)))
+    c_times = np.stack([leave_home, at_work, leave_work, at_home], axis=-1)        # (days, nc, 4)
+
+    errand_start = day + np.clip(rng.normal(12 * 60, 150, (days, len(o))), 7 * 60, 21 * 60)
+    errand_end = errand_start + np.maximum(rng.lognormal(np.log(90.0), 0.6, (days, len(o))), 15)
+    o_times = np.stack([errand_start, errand_end], axis=-1)                        # (days, no, 2)
+
+    vehicle, time_min, kind, zone, plug, kwh = [], [], [], [], [], []
+    for idx, times, legs in ((c, c_times, 4), (o, o_times, 2)):
+        t = np.round(times.transpose(1, 0, 2).reshape(len(idx), days * legs))
+        t = np.maximum(t, 1)
+        for j in range(1, t.shape[1]):
+            t[:, j] = np.maximum(t[:, j], t[:, j - 1] + 1)
+        n_legs = t.shape[1]
+        is_arrive = np.arange(n_legs) % 2 == 1
+        if legs == 4:
+            at_work_leg = np.arange(n_legs) % 4 == 1
+            leg_zone = np.where(at_work_leg, work[idx][:, None], home[idx][:, None])
+            leg_km = np.broadcast_to(commute_km[idx][:, None], t.shape)
+        else:
+            at_work_leg = np.zeros(n_legs, dtype=bool)
+            leg_zone = np.broadcast_to(home[idx][:, None], t.shape)
+            leg_km = rng.lognormal(np.log(8.0), 0.6, t.shape) * 2
+        plug_p = np.where(at_work_leg, work_plug_share, home_plug_share)
+        vehicle.append(np.repeat(idx, n_legs))
+        time_min.append(t.ravel())
+        kind.append(np.tile(np.where(is_arrive, ARRIVE, DEPART), len(idx)))
+        zone.append(leg_zone.ravel())
+        plug.append(((rng.random(t.shape) < plug_p) & is_arrive).ravel())
+        kwh.append(np.where(is_arrive, leg_km * KWH_PER_KM, 0.0).ravel())
+
+    # الوضع الابتدائي: وصول إلى المنزل عند الدقيقة 0 (initial state: an arrival home at minute 0)
+    vehicle.append(np.arange(n))
+    time_min.append(np.zeros(n))
+    kind.append(np.full(n, ARRIVE))
+    zone.append(home)
+    plug.append(rng.random(n) < home_plug_share)
+    kwh.append(np.zeros(n))
+    return TripPlan(np.concatenate(vehicle).astype(np.int64), np.concatenate(time_min).astype(np.int64),
+                    np.concatenate(kind).astype(np.int8), np.concatenate(zone).astype(np.int64),
+                    np.concatenate(plug), np.concatenate(kwh))
+
+
+def simulate_availability(fleet, days=1, warmup_days=1, step_minutes=15, enrolled=None, plan=None,
+                          battery_kwh=AVG_BATTERY_KWH, target_soc=0.9, reserve_soc=V2G_RESERVE_SOC,
+                          seed=None, **plan_options):
+    """Run the fleet through ``warmup_days + days`` and sample the last ``days``.
+
+    ``enrolled`` masks the vehicles signed up for V2G (default: every
+    eligible one).  Vehicles charge on arrival at their charger rating.
+    Extra keyword arguments go to :func:`plan_trips`.
+    """
+    if plan is None:
+        plan = plan_trips(fleet, warmup_days + days, seed=seed, **plan_options)
+    n, n_zones = len(fleet), fleet.n_zones
+    kw = fleet.charger_kw.astype(np.float64)
+    export_kw = kw * INVERTER_EFFICIENCY
+    rate = kw / battery_kwh / 60.0                                   # SoC per minute
+    v2g = fleet.v2g_eligible if enrolled is None else (np.asarray(enrolled, dtype=bool) & fleet.v2g_eligible)
+
+    soc = fleet.soc.astype(np.float64).copy()
+    t_ref = np.zeros(n, dtype=np.int64)
+    zone = fleet.zone_id.astype(np.int64).copy()
+    plugged = np.zeros(n, dtype=bool)
+    charging = np.zeros(n, dtype=bool)
+    exportable = np.zeros(n, dtype=bool)
+    session = np.zeros(n, dtype=np.int64)
+
+    vpp_kw = np.zeros(n_zones)
+    charging_kw = np.zeros(n_zones)
+    n_plugged = np.zeros(n_zones)
+
+    queue = EventQueue()
+    for k in (DEPART, ARRIVE):
+        sel = np.flatnonzero(plan.kind == k)
+        queue.push(plan.time_min[sel], k, sel)
+
+    def total(v, weights=None):
+        return np.bincount(zone[v], weights=weights, minlength=n_zones)
+
+    def settle(v, t):
+        soc[v] = np.where(charging[v], np.minimum(soc[v] + rate[v] * (t - t_ref[v]), target_soc), soc[v])
+        t_ref[v] = t
+
+    def depart(t, v):
+        settle(v, t)
+        vpp_kw[:] -= total(v, np.where(exportable[v], export_kw[v], 0.0))
+        charging_kw[:] -= total(v, np.where(charging[v], kw[v], 0.0))
+        n_plugged[:] -= total(v, plugged[v])
+        plugged[v] = charging[v] = exportable[v] = False
+        session[v] += 1
+
+    def arrive(t, events):
+        v = plan.vehicle[events]
+        soc[v] = np.maximum(soc[v] - plan.trip_kwh[events] / battery_kwh, 0.02)
+        t_ref[v] = t
+        zone[v] = plan.zone[events]
+        plugged[v] = plan.plug[events]
+        charging[v] = plugged[v] & (soc[v] < target_soc)
+        exportable[v] = plugged[v] & v2g[v] & (soc[v] >= reserve_soc)
+        session[v] += 1
+        vpp_kw[:] += total(v, np.where(exportable[v], export_kw[v], 0.0))
+        charging_kw[:] += total(v, np.where(charging[v], kw[v], 0.0))
+        n_plugged[:] += total(v, plugged[v])
+
+        # أحداث الشحن القادمة لهذه الجلسة (threshold crossings for this plug-in session)
+        c = v[charging[v]]
+        queue.push(t + np.ceil((target_soc - soc[c]) / rate[c]), SOC_TARGET, c, session[c])
+        r = c[v2g[c] & (soc[c] < reserve_soc)]
+        queue.push(t + np.ceil((reserve_soc - soc[r]) / rate[r]), SOC_RESERVE, r, session[r])
+
+    def soc_reserve(t, v):
+        exportable[v] = True
+        vpp_kw[:] += total(v, export_kw[v])
+
+    def soc_target(t, v):
+        settle(v, t)
+        charging_kw[:] -= total(v, kw[v])
+        charging[v] = False
+
+    start = warmup_days * MINUTES_PER_DAY
+    sample_min = start + np.arange(0, days * MINUTES_PER_DAY, step_minutes)
+    out = np.empty((3, len(sample_min), n_zones))
+    counts = np.zeros(len(EVENT_KINDS), dtype=np.int64)
+    n_batches = 0
+    for i, ts in enumerate(sample_min):
+        while len(queue) and queue.peek_time() < ts:
+            t, kind, columns = queue.pop()
+            n_batches += 1
+            if kind == DEPART:
+                v = plan.vehicle[columns[0]]
+                depart(t, v)
+            elif kind == ARRIVE:
+                v = columns[0]
+                arrive(t, v)
+            else:
+                # أحداث جلسة انتهت تُهمل (events of a session that has ended are dropped)
+                v, sess = columns
+                v = v[session[v] == sess]
+                (soc_reserve if kind == SOC_RESERVE else soc_target)(t, v)
+            counts[kind] += len(v)
+        out[:, i] = vpp_kw, charging_kw, n_plugged
+
+    out = np.maximum(out, 0.0)                                       # running-sum round-off
+    return AvailabilitySeries((sample_min - start) / 60.0, out[0] / 1000.0, out[1] / 1000.0,
+                              np.round(out[2]).astype(np.int64), counts, n_batches)
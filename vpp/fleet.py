@@ -0,0 +1,199 @@
+"""Per-vehicle fleet state in structure-of-arrays form.
+
+Each attribute is one compact NumPy column indexed by vehicle, so every
+aggregate is a vectorized mask or ``np.bincount`` group-by over the zone id
+column -- no per-vehicle Python objects.
+"""
+from typing import NamedTuple
+
+import numpy as np
+
+from .constants import (
+    AVG_CHARGER_CAPACITY_KW,
+    CHARGING_CONCURRENCY_FACTOR,
+    INVERTER_EFFICIENCY,
+    TOTAL_FLEET,
+)
+
+
+# حالة القابس (plug status codes)
+UNPLUGGED = 0
+CHARGING = 1
+V2G_READY = 2
+
+
+class FleetSummary(NamedTuple):
+    num_charging: int
+    num_v2g: int
+    ev_load_kw: float             # حمل الشحن بعد معامل التزامن (after concurrency)
+    vpp_cap_mw: float
+    zone_num_v2g: np.ndarray      # int64[n_zones]
+    zone_vpp_mw: np.ndarray       # float64[n_zones]
+    zone_num_charging: np.ndarray  # int64[n_zones]
+
+
+class Fleet:
+    """Columnar store of every vehicle in the fleet."""
+
+    def __init__(self, zone_id, charger_kw, soc, v2g_eligible, plug_status, n_zones, lat=None, lon=None):
+        self.zone_id = np.asarray(zone_id, dtype=np.int32)
+        self.charger_kw = np.asarray(charger_kw, dtype=np.float32)
+        self.soc = np.asarray(soc, dtype=np.float32)
+        self.v2g_eligible = np.asarray(v2g_eligible, dtype=bool)
+        self.plug_status = np.asarray(plug_status, dtype=np.uint8)
+        self.n_zones = int(n_zones)
+        # الموقع اختياري (optional vehicle position, degrees)
+        self.lat = None if lat is None else np.asarray(lat, dtype=np.float32)
+        self.lon = None if lon is None else np.asarray(lon, dtype=np.float32)
+        # موقع المركبة داخل حيها (rank of each vehicle inside its zone)
+        counts = np.bincount(self.zone_id, minlength=self.n_zones)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        order = np.argsort(self.zone_id, kind="stable")
+        self._zone_rank = np.empty(len(self.zone_id), dtype=np.int64)
+        self._zone_rank[order] = np.arange(len(self.zone_id)) - np.repeat(starts, counts)
+        self.zone_size = counts
+
+    def __len__(self):
+        return len(self.zone_id)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.zone_id, self.charger_kw, self.soc,
+                                      self.v2g_eligible, self.plug_status, self.lat, self.lon)
+                   if a is not None)
+
+    @classmethod
+    def synthesize(cls, zone_share, n_vehicles=TOTAL_FLEET, charger_kw=AVG_CHARGER_CAPACITY_KW,
+                   v2g_eligible_share=1.0, zone_lat=None, zone_lon=None, spread_deg=0.03, seed=None):
+        """Build a fleet whose zone split follows ``zone_share`` (sums to 1).
+
+        When zone centroids are given, vehicle positions are scattered
+        around them with a normal spread of ``spread_deg``.
+        """
+        rng = np.random.default_rng(seed)
+        share = np.asarray(zone_share, dtype=np.float64)
+        share = share / share.sum()
+
+        # توزيع بالباقي الأكبر (largest-remainder allocation keeps the total exact)
+        raw = n_vehicles * share
+        counts = np.floor(raw).astype(np.int64)
+        short = n_vehicles - counts.sum()
+        if short:
+            counts[np.argsort(counts - raw, kind="stable")[:short]] += 1
+
+        zone_id = np.repeat(np.arange(len(share), dtype=np.int32), counts)
+        kw = np.full(n_vehicles, charger_kw, dtype=np.float32)
+        soc = rng.uniform(0.2, 0.95, n_vehicles).astype(np.float32)
+        eligible = rng.random(n_vehicles) < v2g_eligible_share if v2g_eligible_share < 1.0 \
+            else np.ones(n_vehicles, dtype=bool)
+        status = np.full(n_vehicles, UNPLUGGED, dtype=np.uint8)
+        lat = lon = None
+        if zone_lat is not None and zone_lon is not None:
+            lat = np.asarray(zone_lat, dtype=np.float64)[zone_id] + rng.normal(0.0, spread_deg, n_vehicles)
+            lon = np.asarray(zone_lon, dtype=np.float64)[zone_id] + rng.normal(0.0, spread_deg, n_vehicles)
+        return cls(zone_id, kw, soc, eligible, status, len(share), lat=lat, lon=lon)
+
+    def participation_status(self, pct_charging, pct_v2g):
+        """Plug status array for the given percentages, without mutating the fleet.
+
+        V2G-ready vehicles are taken from the front of each zone and charging
+        vehicles from the back.  The statuses are exclusive, so when the two
+        percentages add up to more than 100 charging gets the remainder.
+        """
+        v2g_quota = np.floor(self.zone_size * (pct_v2g / 100)).astype(np.int64)
+        chg_quota = np.floor(self.zone_size * (pct_charging / 100)).astype(np.int64)
+        chg_quota = np.minimum(chg_quota, self.zone_size - v2g_quota)
+        rank = self._zone_rank
+        status = np.full(len(self), UNPLUGGED, dtype=np.uint8)
+        status[rank >= (self.zone_size - chg_quota)[self.zone_id]] = CHARGING
+        status[rank < v2g_quota[self.zone_id]] = V2G_READY
+        return status
+
+    def apply_participation(self, pct_charging, pct_v2g):
+        self.plug_status[:] = self.participation_status(pct_charging, pct_v2g)
+        return self
+
+    @property
+    def charging(self):
+        return self.plug_status == CHARGING
+
+    def v2g_ready(self, min_soc=0.0, plug_status=None):
+        status = self.plug_status if plug_status is None else plug_status
+        mask = (status == V2G_READY) & self.v2g_eligible
+        if min_soc > 0:
+            mask &= self.soc >= min_soc
+        return mask
+
+    def summary(self, min_soc=0.0, plug_status=None):
+        """Aggregate the fleet into the totals the physics core consumes.
+
+        ``plug_status`` overrides the stored status column, e.g. with the
+        result of :meth:`participation_status`.
+        """
+        status = self.plug_status if plug_status is None else plug_status
+        ready = self.v2g_ready(min_soc, status)
+        charging = status == CHARGING
+        zone_num_v2g = np.bincount(self.zone_id, weights=ready, minlength=self.n_zones).astype(np.int64)
+        zone_num_charging = np.bincount(self.zone_id, weights=charging, minlength=self.n_zones).astype(np.int64)
+        zone_v2g_kw = np.bincount(self.zone_id, weights=np.where(ready, self.charger_kw, 0.0),
+                                  minlength=self.n_zones)
+        zone_vpp_mw = zone_v2g_kw * INVERTER_EFFICIENCY / 1000.0
+        charging_kw = float(np.dot(charging, self.charger_kw.astype(np.float64)))
+        return FleetSummary(
+            num_charging=int(zone_num_charging.sum()),
+            num_v2g=int(zone_num_v2g.sum()),
+            ev_load_kw=charging_kw * CHARGING_CONCURRENCY_FACTOR,
+            vpp_cap_mw=float(zone_vpp_mw.sum()),
+            zone_num_v2g=zone_num_v2g,
+            zone_vpp_mw=zone_vpp_mw,
+            zone_num_charging=zone_num_charging,
+        )
+
+    def _rank_prefix(self):
+        """Per-zone prefix sums in rank order, built once and reused."""
+        if getattr(self, "_prefix", None) is None:
+            order = np.lexsort((self._zone_rank, self.zone_id))
+            kw = self.charger_kw[order].astype(np.float64)
+            eligible = self.v2g_eligible[order]
+            zero = np.zeros(1)
+            self._prefix = {
+                "start": np.concatenate(([0], np.cumsum(self.zone_size)[:-1])),
+                "eligible": np.concatenate((zero, np.cumsum(eligible))),
+                "eligible_kw": np.concatenate((zero, np.cumsum(np.where(eligible, kw, 0.0)))),
+                "kw": np.concatenate((zero, np.cumsum(kw))),
+            }
+        return self._prefix
+
+    def participation_summary(self, pct_charging, pct_v2g):
+        """Same aggregates as ``summary(plug_status=participation_status(...))``.
+
+        Because participation picks vehicles by rank within each zone, every
+        aggregate is a difference of per-zone prefix sums: O(n_zones) per
+        scenario instead of a pass over the fleet.  ``pct_charging`` and
+        ``pct_v2g`` may be arrays; fields then gain their broadcast shape as
+        leading axes.
+        """
+        p = self._rank_prefix()
+        pct_charging = np.asarray(pct_charging, dtype=np.float64)[..., None]
+        pct_v2g = np.asarray(pct_v2g, dtype=np.float64)[..., None]
+        size, start = self.zone_size, p["start"]
+
+        v2g_quota = np.floor(size * (pct_v2g / 100)).astype(np.int64)
+        chg_quota = np.floor(size * (pct_charging / 100)).astype(np.int64)
+        chg_quota = np.minimum(chg_quota, size - v2g_quota)
+        end = start + size
+
+        zone_num_v2g = (p["eligible"][start + v2g_quota] - p["eligible"][start]).astype(np.int64)
+        zone_vpp_mw = (p["eligible_kw"][start + v2g_quota] - p["eligible_kw"][start]) * INVERTER_EFFICIENCY / 1000.0
+        zone_num_charging = chg_quota
+        charging_kw = (p["kw"][end] - p["kw"][end - chg_quota]).sum(axis=-1)
+
+        return FleetSummary(
+            num_charging=zone_num_charging.sum(axis=-1),
+            num_v2g=zone_num_v2g.sum(axis=-1),
+            ev_load_kw=charging_kw * CHARGING_CONCURRENCY_FACTOR,
+            vpp_cap_mw=zone_vpp_mw.sum(axis=-1),
+            zone_num_v2g=zone_num_v2g,
+            zone_vpp_mw=zone_vpp_mw,
+            zone_num_charging=zone_num_charging,
+        )
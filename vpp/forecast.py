@@ -0,0 +1,162 @@
+"""Per-zone load and availability forecasting with incremental updates.
+
+Additive Holt-Winters with a damped trend and a daily season, one row per
+series.  A forecaster's whole state is a level, a trend and a residual
+variance per row, plus an ``(n_series, season_length)`` seasonal profile.
+A new step of readings therefore updates every zone with a handful of
+``(n_series,)`` array operations, without refitting.  Missing readings
+(NaN) advance the clock without touching that row's state.
+
+Seasonal phase is taken from the step's epoch time, so a forecaster stays
+aligned with the store it follows across restarts and gaps.  Forecasts are
+cached per request and dropped on the next update.
+"""
+import threading
+from typing import NamedTuple
+
+import numpy as np
+
+from .history import ALL_ZONES, GROSS_LOAD
+
+# حد النطاق: 90% على الجانبين (two-sided 90% band)
+BAND_Z = 1.645
+
+
+class Forecast(NamedTuple):
+    start_ts: float        # epoch seconds of the first forecast step
+    step_s: float
+    mean: np.ndarray       # (n_series, horizon)
+    lower: np.ndarray
+    upper: np.ndarray
+
+    def times(self):
+        return self.start_ts + np.arange(self.mean.shape[-1]) * self.step_s
+
+
+class SeasonalForecaster:
+    """Damped-trend Holt-Winters state for many series at once."""
+
+    def __init__(self, n_series, step_s=900, season_length=96, alpha=0.1, beta=0.005, gamma=0.15, phi=0.98,
+                 var_decay=0.02):
+        self.n_series = int(n_series)
+        self.step_s = step_s
+        self.season_length = int(season_length)
+        self.alpha, self.beta, self.gamma, self.phi, self.var_decay = alpha, beta, gamma, phi, var_decay
+        self.level = np.zeros(self.n_series)
+        self.trend = np.zeros(self.n_series)
+        self.season = np.zeros((self.n_series, self.season_length))
+        self.var = np.zeros(self.n_series)
+        self.end_ts = None        # epoch seconds of the next expected step
+        self.updates = 0
+        self._cache = {}
+        self._lock = threading.RLock()
+
+    def phase(self, ts):
+        return (np.asarray(ts) // self.step_s).astype(np.int64) % self.season_length
+
+    @classmethod
+    def fit(cls, values, start_ts, step_s=900, season_length=96, warm_steps=None, **params):
+        """Initialize from ``values`` ``(n_series, n_steps)`` starting at ``start_ts``.
+
+        The per-phase mean of all but the last ``warm_steps`` (default one
+        season, when there is more than one) sets the level and seasonal
+        profile; the last ``warm_steps`` are then fed through
+        :meth:`update` so the level and trend settle.
+        """
+        values = np.atleast_2d(np.asarray(values, dtype=np.float64))
+        model = cls(values.shape[0], step_s, season_length, **params)
+        n_steps = values.shape[1]
+        if warm_steps is None:
+            warm_steps = season_length if n_steps > season_length else 0
+        n_init = n_steps - warm_steps
+        if n_init < 1:
+            raise ValueError("need at least one step before the warm-up window")
+
+        init = values[:, :n_init]
+        phase = model.phase(start_ts + np.arange(n_init) * step_s)
+        seen = ~np.isnan(init)
+        # متوسط كل طور لكل سلسلة في تجميع واحد (per-row, per-phase means in one group-by)
+        key = (np.arange(model.n_series)[:, None] * season_length + phase).ravel()
+        size = model.n_series * season_length
+        sums = np.bincount(key, weights=np.where(seen, init, 0.0).ravel(), minlength=size)
+        counts = np.bincount(key, weights=seen.ravel(), minlength=size)
+        with np.errstate(invalid="ignore"):
+            profile = (sums / counts).reshape(model.n_series, season_length)
+        # طور بلا قراءات يأخذ المتوسط العام (a phase never observed takes the overall mean)
+        overall = np.nanmean(init, axis=1)
+        profile = np.where(np.isnan(profile), overall[:, None], profile)
+        model.level = profile.mean(axis=1)
+        model.season = profile - model.level[:, None]
+        model.var = np.nanmean((init - profile[:, phase]) ** 2, axis=1)
+        model.end_ts = start_ts + n_init * step_s
+        model.update(values[:, n_init:])
+        return model
+
+    def update(self, values):
+        """Feed the next step(s), ``(n_series,)`` or ``(n_series, k)``; NaN marks a missing reading."""
+        values = np.asarray(values, dtype=np.float64)
+        if values.ndim == 1:
+            values = values[:, None]
+        a, b, g, phi, lam = self.alpha, self.beta, self.gamma, self.phi, self.var_decay
+        with self._lock:
+            rows = np.arange(self.n_series)
+            for y in values.T:
+                p = int(self.phase(self.end_ts))
+                s = self.season[:, p]
+                damped = phi * self.trend
+                seen = ~np.isnan(y)
+                y = np.where(seen, y, 0.0)
+                err = y - (self.level + damped + s)
+                level = a * (y - s) + (1 - a) * (self.level + damped)
+                level = np.where(seen, level, self.level + damped)
+                self.trend = np.where(seen, b * (level - self.level) + (1 - b) * damped, damped)
+                self.season[rows, p] = np.where(seen, g * (y - level) + (1 - g) * s, s)
+                self.var = np.where(seen, (1 - lam) * self.var + lam * err * err, self.var)
+                self.level = level
+                self.end_ts += self.step_s
+            self.updates += values.shape[1]
+            self._cache.clear()
+
+    def forecast(self, horizon, start_ts=None):
+        """``horizon`` steps from ``start_ts`` (default: the next expected step).
+
+        A later ``start_ts`` extrapolates over the steps in between.  The
+        band widens as ``var * (1 + (h - 1) * alpha²)``, the h-step variance of
+        simple exponential smoothing, which ignores trend and seasonal
+        uncertainty.
+        """
+        with self._lock:
+            start_ts = self.end_ts if start_ts is None else start_ts
+            key = (int(horizon), int(start_ts // self.step_s))
+            cached = self._cache.get(key)
+            if cached is not None:
+                return cached
+            first = max(int(round((start_ts - self.end_ts) / self.step_s)), 0)
+            h = np.arange(first, first + int(horizon)) + 1                        # steps ahead
+            damping = np.cumsum(self.phi ** np.arange(1, h[-1] + 1))[h - 1]
+            phase = self.phase(self.end_ts + (h - 1) * self.step_s)
+            mean = self.level[:, None] + self.trend[:, None] * damping + self.season[:, phase]
+            sd = np.sqrt(self.var[:, None] * (1 + (h - 1) * self.alpha ** 2))
+            result = Forecast(self.end_ts + (h[0] - 1) * self.step_s, self.step_s,
+                              mean, mean - BAND_Z * sd, mean + BAND_Z * sd)
+            self._cache[key] = result
+            return result
+
+
+def follow_history(forecaster, store, field=GROSS_LOAD, zone=ALL_ZONES):
+    """Feed ``forecaster`` the steps ``store`` gained since its last update; returns how many.
+
+    The forecaster's lock is held from reading its position to the last
+    update, so concurrent callers never feed the same steps twice.
+    """
+    with forecaster._lock:
+        if forecaster.end_ts is None or store.end_ts <= forecaster.end_ts:
+            return 0
+        window = store.window(field, forecaster.end_ts, zone=zone)
+        values = window.values
+        # الخطوات المفقودة بين الحالة والسجل تُعامل كقراءات غائبة (steps the store skipped are missing readings)
+        skipped = int(round((window.start_ts - forecaster.end_ts) / forecaster.step_s))
+        if skipped > 0:
+            forecaster.update(np.full((forecaster.n_series, skipped), np.nan))
+        forecaster.update(values)
+        return skipped + values.shape[-1]
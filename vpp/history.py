@@ -0,0 +1,333 @@
+"""Memory-mapped per-zone history with downsampled window reads.
+
+Each field (load, deficit, dispatch) is one raw ``float32`` file laid out
+zone-major, ``(n_zones + 1, capacity)``, with the last row holding the city
+total.  A zone's window is then one contiguous slice of the mapping, read
+without copying, and only the pages under that window are touched.  Rows
+are appended in step order.  The file is pre-sized as a sparse file and
+doubled (one copy) when full.  ``meta.json`` records the step, the start
+time and how many steps are valid; it is rewritten atomically after every
+append.
+
+Windows are reduced to a fixed number of points (min/max decimation or
+LTTB) before they are plotted, so a year at one-minute resolution costs the
+browser the same as a day.
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+from .timeseries import simulate_load
+
+DEFAULT_HISTORY_DIR = Path(__file__).resolve().parent.parent / "data" / "history"
+
+FIELDS = ("load_gw", "deficit_gw", "dispatch_mw")
+# الحمل قبل خصم حقن V2G، يُحسب عند القراءة (load before V2G injection was netted off, computed on read)
+GROSS_LOAD = "gross_load_gw"
+CITY = -1  # row index of the city total
+ALL_ZONES = slice(0, CITY)  # every zone row, for (n_zones, n_steps) windows
+
+# سنة بخطوة 15 دقيقة (one year of 15-minute steps)
+DEFAULT_CAPACITY_STEPS = 365 * 96
+
+
+class HistoryWindow(NamedTuple):
+    start_ts: float        # epoch seconds of values[0]
+    step_s: float
+    values: np.ndarray     # read-only view into the mapping, float32; steps on the last axis
+
+    def times(self, index=None):
+        """Epoch seconds of the steps of ``values`` (or of steps ``index``)."""
+        index = np.arange(self.values.shape[-1]) if index is None else np.asarray(index)
+        return self.start_ts + index * self.step_s
+
+
+class HistoryStore:
+    """Append-only per-zone series stored as one memory-mapped file per field."""
+
+    def __init__(self, path=DEFAULT_HISTORY_DIR, n_zones=None, step_s=900, start_ts=None,
+                 capacity_steps=DEFAULT_CAPACITY_STEPS):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._maps = {}
+        meta_file = self.path / "meta.json"
+        if meta_file.exists():
+            meta = json.loads(meta_file.read_text())
+            if n_zones is not None and meta["n_zones"] != n_zones:
+                raise ValueError(f"history at {self.path} has {meta['n_zones']} zones, not {n_zones}")
+        else:
+            if n_zones is None:
+                raise ValueError(f"no history at {self.path}; n_zones is required to create one")
+            start = time.time() if start_ts is None else start_ts
+            meta = {"n_zones": int(n_zones), "step_s": float(step_s), "start_ts": float(start - start % step_s),
+                    "length": 0, "capacity": int(capacity_steps), "fields": list(FIELDS)}
+            self.path.mkdir(parents=True, exist_ok=True)
+            for field in FIELDS:
+                self._allocate(self.path / f"{field}.f32", meta["n_zones"] + 1, meta["capacity"])
+            self._write_meta(meta)
+        self.meta = meta
+
+    # -- التخزين (storage) --
+    @staticmethod
+    def _allocate(file, rows, capacity):
+        # ملف متناثر: لا تُحجز الصفحات إلا عند الكتابة (sparse file: pages are only allocated when written)
+        with open(file, "wb") as fh:
+            fh.truncate(rows * capacity * 4)
+
+    def _write_meta(self, meta):
+        tmp = self.path / f".meta.{os.getpid()}.{threading.get_ident()}.tmp"
+        tmp.write_text(json.dumps(meta))
+        os.replace(tmp, self.path / "meta.json")
+
+    def _map(self, field):
+        mm = self._maps.get(field)
+        if mm is None or mm.shape[1] != self.meta["capacity"]:
+            mm = np.memmap(self.path / f"{field}.f32", dtype=np.float32, mode="r+",
+                           shape=(self.meta["n_zones"] + 1, self.meta["capacity"]))
+            self._maps[field] = mm
+        return mm
+
+    def _grow(self, needed):
+        capacity = max(needed, 2 * self.meta["capacity"])
+        rows, length = self.meta["n_zones"] + 1, self.meta["length"]
+        for field in FIELDS:
+            old = self._map(field)
+            tmp = self.path / f".{field}.f32.tmp"
+            self._allocate(tmp, rows, capacity)
+            new = np.memmap(tmp, dtype=np.float32, mode="r+", shape=(rows, capacity))
+            new[:, :length] = old[:, :length]
+            new.flush()
+            del new
+            os.replace(tmp, self.path / f"{field}.f32")
+            self._maps.pop(field)
+        self.meta = dict(self.meta, capacity=capacity)
+
+    # -- الخصائص (properties) --
+    @property
+    def n_zones(self):
+        return self.meta["n_zones"]
+
+    @property
+    def step_s(self):
+        return self.meta["step_s"]
+
+    @property
+    def start_ts(self):
+        return self.meta["start_ts"]
+
+    def __len__(self):
+        return self.meta["length"]
+
+    @property
+    def end_ts(self):
+        """Epoch seconds just past the last stored step."""
+        return self.start_ts + len(self) * self.step_s
+
+    @property
+    def nbytes(self):
+        return len(FIELDS) * (self.n_zones + 1) * len(self) * 4
+
+    def index_of(self, ts):
+        """Step index containing ``ts``, clipped to the stored range."""
+        return int(np.clip((ts - self.start_ts) // self.step_s, 0, len(self)))
+
+    # -- الكتابة (writes) --
+    def append(self, **fields):
+        """Append ``(n_zones, n_steps)`` blocks; missing fields are stored as NaN."""
+        blocks = {k: np.atleast_2d(np.asarray(v, dtype=np.float32)) for k, v in fields.items()}
+        unknown = set(blocks) - set(FIELDS)
+        if unknown:
+            raise ValueError(f"unknown history fields: {sorted(unknown)}")
+        n_steps = {b.shape[1] for b in blocks.values()}
+        if len(n_steps) != 1 or any(b.shape[0] != self.n_zones for b in blocks.values()):
+            raise ValueError(f"every field must be an ({self.n_zones}, n_steps) block of the same length")
+        n = n_steps.pop()
+        with self._lock:
+            i0 = len(self)
+            if i0 + n > self.meta["capacity"]:
+                self._grow(i0 + n)
+            for field in FIELDS:
+                mm = self._map(field)
+                block = blocks.get(field)
+                if block is None:
+                    mm[:, i0:i0 + n] = np.nan
+                else:
+                    mm[:-1, i0:i0 + n] = block
+                    mm[CITY, i0:i0 + n] = block.sum(axis=0)
+            # الطول يُنشر بعد كتابة البيانات (length is published only after the rows are written)
+            self.meta = dict(self.meta, length=i0 + n)
+            self._write_meta(self.meta)
+        return i0
+
+    def flush(self):
+        with self._lock:
+            for mm in self._maps.values():
+                mm.flush()
+
+    # -- القراءة (reads) --
+    def window(self, field, start_ts=None, end_ts=None, zone=CITY):
+        """Zero-copy view of ``field`` for one zone, the city or ``ALL_ZONES`` over ``[start_ts, end_ts)``.
+
+        ``GROSS_LOAD`` is ``load_gw + dispatch_mw / 1000``, a copy rather
+        than a view.
+        """
+        if field == GROSS_LOAD:
+            load = self.window("load_gw", start_ts, end_ts, zone)
+            dispatch = self.window("dispatch_mw", start_ts, end_ts, zone).values
+            n = min(load.values.shape[-1], dispatch.shape[-1])
+            return load._replace(values=load.values[..., :n] + dispatch[..., :n] / np.float32(1000.0))
+        if field not in FIELDS:
+            raise ValueError(f"unknown history field: {field}")
+        i0 = 0 if start_ts is None else self.index_of(start_ts)
+        i1 = len(self) if end_ts is None else self.index_of(end_ts + self.step_s - 1)
+        view = self._map(field)[zone, i0:max(i0, i1)]
+        view = view.view(np.ndarray)
+        view.flags.writeable = False
+        return HistoryWindow(self.start_ts + i0 * self.step_s, self.step_s, view)
+
+
+# ---------------------------------------------------------
+# تقليل النقاط قبل الرسم (downsampling before plotting)
+# ---------------------------------------------------------
+def minmax_decimate(values, n_points):
+    """Indices of each bucket's min and max, in time order; keeps every spike."""
+    n = len(values)
+    if n <= n_points:
+        return np.arange(n)
+    n_buckets = max(n_points // 2, 1)
+    size = -(-n // n_buckets)
+    padded = np.empty(n_buckets * size, dtype=np.float64)
+    padded[:n] = values
+    padded[n:] = values[-1]
+    buckets = padded.reshape(n_buckets, size)
+    base = np.arange(n_buckets) * size
+    # دلو فارغ بالكامل (NaN) يعيد أول نقطة فيه (an all-NaN bucket, i.e. a gap, yields its first index)
+    buckets = np.where(np.isnan(buckets).all(axis=1, keepdims=True), 0.0, buckets)
+    lo = base + np.nanargmin(buckets, axis=1)
+    hi = base + np.nanargmax(buckets, axis=1)
+    return np.unique(np.minimum(np.concatenate([lo, hi]), n - 1))
+
+
+def lttb(values, n_points):
+    """Largest-Triangle-Three-Buckets: indices of ``n_points`` shape-preserving samples."""
+    n = len(values)
+    if n <= n_points or n_points < 3:
+        return np.arange(n)
+    y = np.asarray(values, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_points - 1).astype(np.int64)
+    means_y = np.add.reduceat(np.nan_to_num(y[:n - 1]), edges[:-1]) / np.diff(edges)
+    means_x = (edges[:-1] + edges[1:] - 1) / 2.0
+    out = np.empty(n_points, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    # كل دلو يعتمد على النقطة المختارة قبله (each bucket depends on the previous pick)
+    for i in range(n_points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 1 < len(means_x):
+            cx, cy = means_x[i + 1], means_y[i + 1]
+        else:
+            cx, cy = n - 1, y[n - 1]
+        x = np.arange(lo, hi)
+        area = np.abs((a - cx) * (y[lo:hi] - y[a]) - (a - x) * (cy - y[a]))
+        a = lo + int(np.nanargmax(area)) if not np.isnan(area).all() else lo
+        out[i + 1] = a
+    return out
+
+
+DOWNSAMPLERS = {"minmax": minmax_decimate, "lttb": lttb}
+
+
+def downsample(window, n_points=2000, method="minmax"):
+    """``(epoch_seconds, values)`` of at most ``n_points`` samples from a ``HistoryWindow``."""
+    index = DOWNSAMPLERS[method](window.values, n_points)
+    return window.times(index), np.asarray(window.values[index], dtype=np.float64)
+
+
+# ---------------------------------------------------------
+# مصادر البيانات (writers)
+# ---------------------------------------------------------
+def backfill(store, zone_load_gw, zone_capacity_gw, zone_dispatch_gw=0.0, days=365, chunk_days=7,
+             seasonal_amplitude=0.15, seed=None, zone_deficit=None):
+    """Append ``days`` of simulated per-zone history, one ``chunk_days`` block at a time.
+
+    ``zone_deficit(load_gw) -> deficit_gw``, on ``(n_zones, n_steps)``
+    blocks, replaces the overload against ``zone_capacity_gw`` as the
+    recorded deficit.
+    """
+    step_minutes = store.step_s / 60
+    if step_minutes != int(step_minutes) or 60 % int(step_minutes):
+        raise ValueError("simulated history needs a step that divides one hour")
+    start_day = int(time.gmtime(store.end_ts).tm_yday) - 1
+    for day0 in range(0, days, chunk_days):
+        n_days = min(chunk_days, days - day0)
+        series = simulate_load(zone_load_gw, days=n_days, step_minutes=int(step_minutes),
+                               dispatch_gw=zone_dispatch_gw, grid_cap=zone_capacity_gw,
+                               seasonal_amplitude=seasonal_amplitude, start_day=start_day + day0,
+                               seed=None if seed is None else seed + day0)
+        deficit = series.net_deficit if zone_deficit is None else zone_deficit(series.net_load)
+        store.append(load_gw=series.net_load, deficit_gw=deficit,
+                     dispatch_mw=series.v2g_injection * 1000.0)
+    return store
+
+
+class HistoryRecorder:
+    """Averages live per-zone samples into the store's steps and appends each finished step.
+
+    Steps with no samples are written as NaN, so gaps show up as gaps.
+    Samples older than the stored range are ignored.  The deficit is the
+    overload against ``zone_capacity_gw`` unless ``zone_deficit`` (as in
+    ``backfill``) is given.
+    """
+
+    def __init__(self, store, zone_capacity_gw, grid_state=None, zone_deficit=None):
+        self.store = store
+        self.zone_capacity_gw = np.asarray(zone_capacity_gw, dtype=np.float64)
+        self.grid_state = grid_state
+        self.zone_deficit = zone_deficit
+        self._lock = threading.Lock()
+        self._reset(None)
+
+    def _reset(self, step):
+        self._step = step
+        self._n = 0
+        self._load = np.zeros(self.store.n_zones)
+        self._dispatch = np.zeros(self.store.n_zones)
+
+    def _close(self):
+        if self._n == 0:
+            return
+        gap = self._step - len(self.store)
+        if gap > 0:
+            nan = np.full((self.store.n_zones, gap), np.nan)
+            self.store.append(load_gw=nan, deficit_gw=nan, dispatch_mw=nan)
+        load = self._load / self._n
+        if self.zone_deficit is None:
+            deficit = np.maximum(load - self.zone_capacity_gw, 0.0)[:, None]
+        else:
+            deficit = self.zone_deficit(load[:, None])
+        self.store.append(load_gw=load[:, None], deficit_gw=deficit,
+                          dispatch_mw=(self._dispatch / self._n)[:, None])
+
+    def sample(self, ts, zone_load_gw):
+        step = int((ts - self.store.start_ts) // self.store.step_s)
+        if step < len(self.store):
+            return
+        dispatched = 0.0 if self.grid_state is None else self.grid_state.snapshot().dispatched_mw
+        with self._lock:
+            if step != self._step:
+                self._close()
+                self._reset(step)
+            self._load += zone_load_gw
+            self._dispatch += dispatched
+            self._n += 1
+
+    def __call__(self, aggregator):
+        """``TelemetryPipeline`` hook: record the aggregator's rolling zone loads."""
+        snap = aggregator.snapshot()
+        if snap.readings:
+            self.sample(snap.last_ts or time.time(), snap.zone_load_mw / 1000.0)
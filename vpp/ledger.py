@@ -0,0 +1,150 @@
+"""Append-only settlement ledger on SQLite.
+
+Each row is one delivery interval: zone, ``[start_ts, end_ts)``, average
+MW, price, vehicle count, energy and payout.  An interval that crosses
+local midnight is split at the day boundary, so a row never straddles two
+billing days and day / month totals only count energy delivered inside
+them.  Inserts are buffered and written with ``executemany`` in one
+transaction.  The day and month keys are computed with NumPy when a row is
+appended, and a covering index on (month, day, zone) lets billing range
+aggregations run as integer GROUP BYs without date parsing.
+"""
+import sqlite3
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .dispatch import settlement_payout
+
+DEFAULT_LEDGER_FILE = Path(__file__).resolve().parent.parent / "data" / "settlement_ledger.sqlite"
+
+# الفوترة بتوقيت الرياض (billing days follow Riyadh local time, UTC+3)
+LOCAL_UTC_OFFSET_S = 3 * 3600
+
+# جدول جديد، فصفوف dispatch_events القديمة دورات متداخلة (new table: old dispatch_events rows overlap)
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dispatch_intervals (
+    start_ts    REAL    NOT NULL,
+    end_ts      REAL    NOT NULL,
+    day         INTEGER NOT NULL,
+    month       INTEGER NOT NULL,
+    zone        TEXT    NOT NULL,
+    mw          REAL    NOT NULL,
+    duration_h  REAL    NOT NULL,
+    price       REAL    NOT NULL,
+    vehicles    INTEGER NOT NULL,
+    energy_mwh  REAL    NOT NULL,
+    payout_sar  REAL    NOT NULL,
+    source      TEXT    NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_intervals_billing
+    ON dispatch_intervals (month, day, zone, energy_mwh, payout_sar, vehicles);
+"""
+
+_GROUP_KEYS = {"zone": ("zone",), "day": ("day",), "month": ("month",),
+               "zone_day": ("zone", "day"), "zone_month": ("zone", "month")}
+
+
+def day_key(ts):
+    """Local calendar day as days since 1970-01-01."""
+    return np.floor_divide(np.asarray(ts, dtype=np.float64) + LOCAL_UTC_OFFSET_S, 86400).astype(np.int64)
+
+
+def month_key(ts):
+    """Local calendar month as months since 1970-01."""
+    return day_key(ts).astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+
+
+class SettlementLedger:
+    """Buffered append-only store of dispatch intervals."""
+
+    def __init__(self, path=DEFAULT_LEDGER_FILE, batch_size=10_000):
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        self.batch_size = batch_size
+        self._buffer = []
+        self._lock = threading.Lock()
+
+    def append(self, zone, mw, start_ts, end_ts, price, vehicles, source="central"):
+        """Record delivery of ``mw`` over ``[start_ts, end_ts)``; array arguments broadcast together."""
+        zone, mw, start_ts, end_ts, price, vehicles, source = (a.ravel() for a in np.broadcast_arrays(
+            np.asarray(zone, dtype=object), np.asarray(mw, dtype=np.float64),
+            np.asarray(start_ts, dtype=np.float64), np.asarray(end_ts, dtype=np.float64),
+            np.asarray(price, dtype=np.float64), np.asarray(vehicles, dtype=np.int64),
+            np.asarray(source, dtype=object),
+        ))
+        # تقسيم كل فترة عند منتصف الليل المحلي (split each interval at local midnight)
+        first = day_key(start_ts)
+        n_days = np.maximum(day_key(np.nextafter(end_ts, -np.inf)) - first + 1, 1)
+        row = np.repeat(np.arange(len(first)), n_days)
+        day = first[row] + np.arange(len(row)) - np.repeat(np.cumsum(n_days) - n_days, n_days)
+        day_start = day * 86400.0 - LOCAL_UTC_OFFSET_S
+        start = np.maximum(start_ts[row], day_start)
+        end = np.maximum(np.minimum(end_ts[row], day_start + 86400.0), start)
+        duration_h = (end - start) / 3600.0
+        mw, price = mw[row], price[row]
+        rows = zip(start.tolist(), end.tolist(), day.tolist(), month_key(start).tolist(), zone[row].tolist(),
+                   mw.tolist(), duration_h.tolist(), price.tolist(), vehicles[row].tolist(),
+                   (mw * duration_h).tolist(), settlement_payout(mw, price, duration_h).tolist(),
+                   source[row].tolist())
+        with self._lock:
+            self._buffer.extend(rows)
+            if len(self._buffer) >= self.batch_size:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if self._buffer:
+            with self.conn:
+                self.conn.executemany("INSERT INTO dispatch_intervals VALUES (?,?,?,?,?,?,?,?,?,?,?,?)", self._buffer)
+            self._buffer = []
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    def __len__(self):
+        self.flush()
+        return self.conn.execute("SELECT COUNT(*) FROM dispatch_intervals").fetchone()[0]
+
+    def totals(self, by="zone", start=None, end=None, zone=None):
+        """Intervals, energy, payout and vehicles per ``by`` group in ``[start, end)``.
+
+        ``by`` is one of ``zone``, ``day``, ``month``, ``zone_day`` or
+        ``zone_month``; ``start`` / ``end`` are epoch seconds.  Ranges are
+        resolved to whole local days so the billing index is used.
+        """
+        keys = _GROUP_KEYS[by]
+        where, params = [], []
+        if start is not None:
+            where.append("day >= ?")
+            params.append(int(day_key(start)))
+        if end is not None:
+            where.append("day < ?")
+            params.append(int(day_key(end)))
+        if zone is not None:
+            where.append("zone = ?")
+            params.append(zone)
+        cols = ", ".join(keys)
+        sql = (f"SELECT {cols}, COUNT(*) AS events, SUM(energy_mwh) AS energy_mwh, "
+               f"SUM(payout_sar) AS payout_sar, SUM(vehicles) AS vehicles FROM dispatch_intervals"
+               + (" WHERE " + " AND ".join(where) if where else "")
+               + f" GROUP BY {cols} ORDER BY {cols}")
+        self.flush()
+        with self._lock:
+            df = pd.DataFrame(self.conn.execute(sql, params).fetchall(),
+                              columns=list(keys) + ["events", "energy_mwh", "payout_sar", "vehicles"])
+        if "day" in df:
+            df["day"] = df["day"].to_numpy(dtype="int64").astype("datetime64[D]")
+        if "month" in df:
+            df["month"] = df["month"].to_numpy(dtype="int64").astype("datetime64[M]")
+        return df
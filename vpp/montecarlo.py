@@ -0,0 +1,153 @@
+"""Monte Carlo reserve-risk engine.
+
+Trials sample city load, EV plug-in rate and per-zone V2G availability.
+They are split into batches, each batch drawing from its own child of one
+``np.random.SeedSequence``, so results are reproducible for a given seed
+regardless of how many worker processes run them.  Batches return
+mergeable partial results (unserved energy samples and fixed-bin per-zone
+headroom histograms), which are reduced in the parent.
+
+Each trial is allocated under the live dispatch constraints: the
+per-substation voltage limit and the zones' local deficits.  A batch of
+10k trials takes milliseconds, while starting a spawn pool takes seconds,
+so worker processes are only used for runs of ``PARALLEL_MIN_TRIALS`` or
+more.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+import numpy as np
+
+from .constants import (
+    AVG_CHARGER_CAPACITY_KW,
+    CHARGING_CONCURRENCY_FACTOR,
+    GRID_VOLTAGE_LIMIT_MW,
+    SETTLEMENT_HOURS,
+    TOTAL_FLEET,
+)
+from .dispatch import allocate
+
+HEADROOM_BINS = 200
+MAX_AVAILABILITY = 2.0
+
+# دون هذا العدد يكون التشغيل المتسلسل أسرع من إنشاء العمليات (below this, serial beats spawning a pool)
+PARALLEL_MIN_TRIALS = 5_000_000
+
+
+class RiskScenario(NamedTuple):
+    base_residential_load: float   # GW
+    industrial_load: float         # GW
+    grid_cap: float                # GW
+    pct_charging: float
+    zone_vpp_mw: np.ndarray        # deterministic V2G capacity per zone
+    total_fleet: int = TOTAL_FLEET
+    load_sd: float = 0.03          # relative sd of residential load
+    industrial_sd: float = 0.05    # relative sd of industrial load
+    plug_in_sd: float = 0.20       # relative sd of the EV plug-in rate
+    v2g_sd: float = 0.15           # relative sd of per-zone V2G availability
+    event_hours: float = SETTLEMENT_HOURS
+    local_deficit_mw: np.ndarray = 0.0          # per zone, covered first as in the live allocator
+    voltage_limit_mw: float = GRID_VOLTAGE_LIMIT_MW
+
+
+class RiskResult(NamedTuple):
+    n_trials: int
+    deficit_probability: float     # P(raw deficit > 0)
+    unserved_probability: float    # P(deficit left after VPP dispatch > 0)
+    unserved_mean_mwh: float
+    unserved_p95_mwh: float
+    unserved_mwh: np.ndarray       # per-trial samples, float32
+    headroom_mean_mw: np.ndarray   # per zone
+    headroom_p05_mw: np.ndarray
+    headroom_p50_mw: np.ndarray
+    headroom_p95_mw: np.ndarray
+    headroom_hist: np.ndarray      # (n_zones, HEADROOM_BINS) counts
+    headroom_edges: np.ndarray     # (n_zones, HEADROOM_BINS + 1)
+
+
+def _headroom_edges(zone_vpp_mw):
+    top = np.maximum(zone_vpp_mw * MAX_AVAILABILITY, 1e-9)
+    return np.linspace(0.0, 1.0, HEADROOM_BINS + 1)[None, :] * top[:, None]
+
+
+def _run_batch(scenario, n_trials, seed_seq):
+    """Simulate one batch; returns ``(n_deficit, unserved_mwh, headroom_sum, headroom_hist)``."""
+    rng = np.random.default_rng(seed_seq)
+    zone_vpp = np.asarray(scenario.zone_vpp_mw, dtype=np.float64)
+    n_zones = len(zone_vpp)
+
+    res = scenario.base_residential_load * (1.0 + scenario.load_sd * rng.standard_normal(n_trials))
+    ind = scenario.industrial_load * (1.0 + scenario.industrial_sd * rng.standard_normal(n_trials))
+    plug_rate = np.clip(1.0 + scenario.plug_in_sd * rng.standard_normal(n_trials), 0.0, None)
+    num_charging = np.floor(scenario.total_fleet * scenario.pct_charging / 100 * plug_rate)
+    ev_gw = num_charging * AVG_CHARGER_CAPACITY_KW * CHARGING_CONCURRENCY_FACTOR / 1e6
+
+    deficit_mw = np.maximum(0.0, res + ev_gw + ind - scenario.grid_cap) * 1000.0
+    availability = np.clip(1.0 + scenario.v2g_sd * rng.standard_normal((n_trials, n_zones)), 0.0, MAX_AVAILABILITY)
+    available = zone_vpp[None, :] * availability
+
+    result = allocate(deficit_mw, available, local_deficit_mw=scenario.local_deficit_mw,
+                      voltage_limit_mw=scenario.voltage_limit_mw)
+    headroom = available - result.allocation_mw
+    unserved_mwh = (result.unserved_mw * scenario.event_hours).astype(np.float32)
+
+    # مدرج تكراري ثابت الحدود قابل للدمج (fixed-edge histogram so batches merge by addition)
+    edges = _headroom_edges(zone_vpp)
+    width = edges[:, -1] / HEADROOM_BINS
+    bins = np.clip((headroom / width[None, :]).astype(np.int64), 0, HEADROOM_BINS - 1)
+    flat = bins + (np.arange(n_zones) * HEADROOM_BINS)[None, :]
+    hist = np.bincount(flat.ravel(), minlength=n_zones * HEADROOM_BINS).reshape(n_zones, HEADROOM_BINS)
+
+    return int(np.count_nonzero(deficit_mw > 0)), unserved_mwh, headroom.sum(axis=0), hist
+
+
+def _hist_quantile(hist, edges, q):
+    cdf = np.cumsum(hist, axis=1) / np.maximum(hist.sum(axis=1, keepdims=True), 1)
+    idx = np.argmax(cdf >= q, axis=1)
+    return edges[np.arange(len(edges)), idx + 1]
+
+
+def run_risk(scenario, n_trials=100_000, batch_size=10_000, workers=None, seed=None):
+    """Run ``n_trials`` Monte Carlo trials, in parallel when ``workers`` > 1.
+
+    ``workers=None`` runs serially below ``PARALLEL_MIN_TRIALS`` and on every
+    CPU above it.  Worker processes are spawned (not forked) so the engine
+    is safe to call from a threaded server.
+    """
+    scenario = scenario._replace(zone_vpp_mw=np.asarray(scenario.zone_vpp_mw, dtype=np.float64))
+    sizes = [batch_size] * (n_trials // batch_size)
+    if n_trials % batch_size:
+        sizes.append(n_trials % batch_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    if workers is None:
+        workers = os.cpu_count() if n_trials >= PARALLEL_MIN_TRIALS else 1
+    if workers > 1 and len(sizes) > 1:
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(workers, len(sizes)), mp_context=ctx) as pool:
+            parts = list(pool.map(_run_batch, [scenario] * len(sizes), sizes, seeds))
+    else:
+        parts = [_run_batch(scenario, n, s) for n, s in zip(sizes, seeds)]
+
+    n_deficit = sum(p[0] for p in parts)
+    unserved = np.concatenate([p[1] for p in parts])
+    headroom_sum = np.sum([p[2] for p in parts], axis=0)
+    hist = np.sum([p[3] for p in parts], axis=0)
+    edges = _headroom_edges(scenario.zone_vpp_mw)
+
+    return RiskResult(
+        n_trials=n_trials,
+        deficit_probability=n_deficit / n_trials,
+        unserved_probability=float(np.count_nonzero(unserved > 0) / n_trials),
+        unserved_mean_mwh=float(unserved.mean()),
+        unserved_p95_mwh=float(np.percentile(unserved, 95)),
+        unserved_mwh=unserved,
+        headroom_mean_mw=headroom_sum / n_trials,
+        headroom_p05_mw=_hist_quantile(hist, edges, 0.05),
+        headroom_p50_mw=_hist_quantile(hist, edges, 0.50),
+        headroom_p95_mw=_hist_quantile(hist, edges, 0.95),
+        headroom_hist=hist,
+        headroom_edges=edges,
+    )
@@ -0,0 +1,190 @@
+"""Sparse DC power flow over the substation network.
+
+The network is a bus/line table.  The bus susceptance matrix
+``B = Aᵀ diag(1/x) A`` (``A`` is the line-bus incidence matrix) is built
+once, reduced by the slack bus and LU-factorized with SuperLU.  Solving for
+a new set of injections, or for many sets at once, then reuses that
+factorization: two sparse triangular solves instead of a new
+factorization.  Line sensitivities to a bus injection (PTDF columns) come
+from the same factors, one column per bus asked for, so congestion relief
+can be located on networks with thousands of buses without forming the
+dense PTDF matrix.
+"""
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.sparse.linalg import splu
+
+DEFAULT_NETWORK_FILE = Path(__file__).resolve().parent.parent / "data" / "riyadh_network.csv"
+
+REQUIRED_COLUMNS = ("from_bus", "to_bus", "reactance_pu", "rating_mw")
+
+# قاعدة القدرة لتحويل الممانعة (system MVA base for per-unit reactances)
+BASE_MVA = 100.0
+
+
+class PowerFlow(NamedTuple):
+    theta: np.ndarray      # bus voltage angle, rad; slack = 0
+    flow_mw: np.ndarray    # per line, positive from -> to
+    loading: np.ndarray    # |flow| / rating
+    slack_mw: np.ndarray   # power supplied by the slack bus (scalar per case)
+
+
+class DCNetwork:
+    """Bus/line network with a cached sparse factorization."""
+
+    def __init__(self, bus, from_bus, to_bus, reactance_pu, rating_mw, slack=None, line_name=None):
+        self.bus = np.asarray(bus, dtype=object)
+        self._index = {b: i for i, b in enumerate(self.bus)}
+        if len(self._index) != len(self.bus):
+            raise ValueError("bus names must be unique")
+        self.from_idx = self.bus_index(from_bus)
+        self.to_idx = self.bus_index(to_bus)
+        self.reactance = np.asarray(reactance_pu, dtype=np.float64)
+        if (self.reactance <= 0).any():
+            raise ValueError("line reactances must be positive")
+        self.rating_mw = np.asarray(rating_mw, dtype=np.float64)
+        self.line_name = (np.asarray(line_name, dtype=object) if line_name is not None
+                          else np.array([f"{self.bus[f]} - {self.bus[t]}" for f, t in zip(self.from_idx, self.to_idx)],
+                                        dtype=object))
+        self.slack = 0 if slack is None else self.bus_index([slack])[0]
+        self._build()
+
+    # -- construction ---------------------------------------------------
+    @classmethod
+    def from_frame(cls, lines, slack=None):
+        """Buses are taken from the line endpoints; the slack defaults to the first one."""
+        missing = [c for c in REQUIRED_COLUMNS if c not in lines.columns]
+        if missing:
+            raise ValueError(f"line table is missing columns: {missing}")
+        bus = pd.unique(pd.concat([lines["from_bus"], lines["to_bus"]], ignore_index=True))
+        names = lines["name"].to_numpy() if "name" in lines.columns else None
+        return cls(bus, lines["from_bus"].to_numpy(), lines["to_bus"].to_numpy(),
+                   lines["reactance_pu"].to_numpy(), lines["rating_mw"].to_numpy(),
+                   slack=bus[0] if slack is None else slack, line_name=names)
+
+    @classmethod
+    def from_file(cls, path=DEFAULT_NETWORK_FILE, slack=None):
+        path = Path(path)
+        df = pd.read_parquet(path) if path.suffix == ".parquet" else pd.read_csv(path)
+        return cls.from_frame(df, slack=slack)
+
+    @classmethod
+    def synthetic(cls, n_bus, chords_per_bus=0.5, reach=30, rating_mw=500.0, seed=None):
+        """Meshed test network for scale studies: a ring plus short chords.
+
+        Chords join buses at most ``reach`` apart, so the network stays
+        sparse and near-planar like a real grid rather than an expander.
+        """
+        rng = np.random.default_rng(seed)
+        ring_from = np.arange(n_bus)
+        n_chords = int(n_bus * chords_per_bus)
+        chord_from = rng.integers(0, n_bus, n_chords)
+        f = np.concatenate([ring_from, chord_from])
+        t = np.concatenate([(ring_from + 1) % n_bus, (chord_from + rng.integers(2, reach + 1, n_chords)) % n_bus])
+        keep = f != t
+        names = np.array([f"B{i:05d}" for i in range(n_bus)], dtype=object)
+        return cls(names, names[f[keep]], names[t[keep]], rng.uniform(0.01, 0.1, keep.sum()),
+                   np.full(keep.sum(), rating_mw), slack=names[0])
+
+    def _build(self):
+        n, m = len(self.bus), len(self.from_idx)
+        rows = np.repeat(np.arange(m), 2)
+        cols = np.column_stack([self.from_idx, self.to_idx]).ravel()
+        signs = np.tile([1.0, -1.0], m)
+        self.incidence = sp.csr_matrix((signs, (rows, cols)), shape=(m, n))
+        b_line = BASE_MVA / self.reactance                    # MW per radian
+        self._b_line = b_line
+        self.b_bus = (self.incidence.T @ sp.diags(b_line) @ self.incidence).tocsc()
+
+        self._keep = np.flatnonzero(np.arange(n) != self.slack)
+        reduced = self.b_bus[self._keep][:, self._keep].tocsc()
+        # تفكيك واحد يُعاد استخدامه لكل الحلول (one factorization, reused by every solve)
+        self._lu = splu(reduced)
+        self._branch = (sp.diags(b_line) @ self.incidence)[:, self._keep].tocsr()
+
+    # -- accessors -------------------------------------------------------
+    def __len__(self):
+        return len(self.bus)
+
+    @property
+    def n_lines(self):
+        return len(self.from_idx)
+
+    def bus_index(self, names):
+        try:
+            return np.array([self._index[b] for b in names], dtype=np.int64)
+        except KeyError as exc:
+            raise ValueError(f"unknown bus: {exc.args[0]}") from None
+
+    def lines_at(self, bus):
+        """Indices of the lines incident to ``bus`` (an index)."""
+        return np.flatnonzero((self.from_idx == bus) | (self.to_idx == bus))
+
+    # -- الحل (solves) ---------------------------------------------------
+    def solve(self, injection_mw):
+        """DC power flow for bus injections of shape ``(n_bus,)`` or ``(n_bus, k)``.
+
+        Positive injection is generation (or V2G export), negative is load.
+        The slack bus entry is ignored; the slack absorbs the imbalance.
+        """
+        p = np.asarray(injection_mw, dtype=np.float64)
+        theta_r = self._lu.solve(np.ascontiguousarray(p[self._keep]))
+        theta = np.zeros(p.shape)
+        theta[self._keep] = theta_r
+        flow = self._branch @ theta_r
+        rating = self.rating_mw.reshape((-1,) + (1,) * (p.ndim - 1))
+        return PowerFlow(theta, flow, np.abs(flow) / rating, -(p.sum(axis=0) - p[self.slack]))
+
+    def ptdf(self, buses):
+        """Line flow change per MW injected at each of ``buses`` (withdrawn at the slack), ``(n_lines, len(buses))``."""
+        buses = np.asarray(buses, dtype=np.int64)
+        rhs = np.zeros((len(self._keep), len(buses)))
+        pos = np.searchsorted(self._keep, buses)
+        valid = buses != self.slack
+        rhs[pos[valid], np.flatnonzero(valid)] = 1.0
+        return self._branch @ self._lu.solve(rhs)
+
+    def bus_headroom(self, flow, buses, sensitivity=None, min_sensitivity=0.05):
+        """Extra MW each of ``buses`` can withdraw before any line hits its rating.
+
+        ``flow`` is ``PowerFlow.flow_mw`` (``(n_lines,)`` or ``(n_lines, k)``);
+        the result is ``(len(buses),)`` or ``(len(buses), k)``.  Negative
+        headroom means lines are already overloaded and is the MW of local
+        relief (load shed or injection at that bus) needed to clear them.
+        Lines whose sensitivity to the bus is below ``min_sensitivity``
+        (the usual 5% PTDF cut-off) are not counted against it.
+        """
+        s = -(self.ptdf(buses) if sensitivity is None else sensitivity)   # withdrawal = negative injection
+        f = np.asarray(flow, dtype=np.float64)[:, None, ...]
+        s = s.reshape(s.shape + (1,) * (f.ndim - 2))
+        r = self.rating_mw.reshape((-1, 1) + (1,) * (f.ndim - 2))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            limit = np.where(s >= min_sensitivity, (r - f) / s, np.where(s <= -min_sensitivity, (r + f) / -s, np.inf))
+        # خطوط لا تتأثر بالحافلة تقريباً لا تقيدها (lines the bus barely loads cannot limit it)
+        return limit.min(axis=0)
+
+    def relief_needed(self, flow, buses, sensitivity=None):
+        """MW of injection needed at each of ``buses`` to clear overloaded lines.
+
+        Each overloaded line is assigned to the bus, among ``buses``, whose
+        injection relieves it most per MW.  That bus needs ``overload / |PTDF|``;
+        a bus assigned several lines takes the largest.  Shapes follow
+        :meth:`bus_headroom`.
+        """
+        s = self.ptdf(buses) if sensitivity is None else sensitivity
+        f = np.asarray(flow, dtype=np.float64)
+        r = self.rating_mw.reshape((-1,) + (1,) * (f.ndim - 1))
+        overload = np.maximum(np.abs(f) - r, 0.0)                     # (n_lines, ...)
+        # التخفيف الفعّال: الحقن يعاكس اتجاه التدفق (effective relief: injection opposes the flow)
+        relief = np.maximum(-np.sign(f)[:, None, ...] * s.reshape(s.shape + (1,) * (f.ndim - 1)), 0.0)
+        best = relief.argmax(axis=1)                                  # (n_lines, ...)
+        best_relief = np.take_along_axis(relief, best[:, None, ...], axis=1)[:, 0, ...]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            needed = np.where((overload > 0) & (best_relief > 0), overload / best_relief, 0.0)
+        out = np.zeros((len(buses),) + f.shape[1:])
+        np.maximum.at(out, (best,) + tuple(np.indices(best.shape)[1:]), needed)
+        return out
@@ -0,0 +1,83 @@
+"""Vectorized grid physics core.
+
+Every input may be a scalar or a NumPy array; inputs are broadcast against
+each other so a whole scenario grid is evaluated in a single call.  Nothing
+here touches ``st.session_state``.
+"""
+from typing import NamedTuple
+
+import numpy as np
+
+from .constants import (
+    AVG_CHARGER_CAPACITY_KW,
+    CHARGING_CONCURRENCY_FACTOR,
+    INVERTER_EFFICIENCY,
+    TOTAL_FLEET,
+)
+
+
+class GridPhysics(NamedTuple):
+    total_city_load: np.ndarray  # GW
+    total_res_load: np.ndarray   # GW
+    raw_deficit: np.ndarray      # GW
+    vpp_cap_mw: np.ndarray       # MW
+    num_charging: np.ndarray
+    num_v2g: np.ndarray
+
+
+def grid_balance(ev_load_kw, vpp_cap_mw, num_charging, num_v2g, base_residential_load,
+                 industrial_load, grid_cap):
+    """Combine fleet aggregates with the network loads into a ``GridPhysics``."""
+    ev_load_kw, vpp_cap_mw, base_residential_load, industrial_load, grid_cap = np.broadcast_arrays(
+        *(np.asarray(a, dtype=np.float64) for a in
+          (ev_load_kw, vpp_cap_mw, base_residential_load, industrial_load, grid_cap))
+    )
+    # 2. الأحمال الكلية (Total loads)
+    total_res_load = base_residential_load + ev_load_kw / 1e6
+    total_city_load = total_res_load + industrial_load
+
+    # 3. العجز (Deficit)
+    raw_deficit = np.maximum(0.0, total_city_load - grid_cap)
+
+    shape = total_city_load.shape
+    num_charging = np.broadcast_to(np.asarray(num_charging, dtype=np.int64), shape)
+    num_v2g = np.broadcast_to(np.asarray(num_v2g, dtype=np.int64), shape)
+    return GridPhysics(total_city_load, total_res_load, raw_deficit, vpp_cap_mw, num_charging, num_v2g)
+
+
+def grid_physics(pct_charging, pct_v2g, base_residential_load, industrial_load,
+                 grid_cap, total_fleet=TOTAL_FLEET):
+    """Evaluate load, deficit and VPP capacity for every broadcast scenario."""
+    pct_charging, pct_v2g, total_fleet = (np.asarray(a, dtype=np.float64)
+                                          for a in (pct_charging, pct_v2g, total_fleet))
+
+    # 1. حمل الشحن (EV charging load)
+    num_charging = np.floor(total_fleet * (pct_charging / 100)).astype(np.int64)
+    ev_load_kw = num_charging * (AVG_CHARGER_CAPACITY_KW * CHARGING_CONCURRENCY_FACTOR)
+
+    # 4. قدرة VPP (VPP capacity)
+    num_v2g = np.floor(total_fleet * (pct_v2g / 100)).astype(np.int64)
+    vpp_cap_mw = num_v2g * (AVG_CHARGER_CAPACITY_KW * INVERTER_EFFICIENCY / 1000.0)
+
+    return grid_balance(ev_load_kw, vpp_cap_mw, num_charging, num_v2g,
+                        base_residential_load, industrial_load, grid_cap)
+
+
+def fleet_physics(summary, base_residential_load, industrial_load, grid_cap):
+    """Evaluate the network against a per-vehicle ``FleetSummary``."""
+    return grid_balance(summary.ev_load_kw, summary.vpp_cap_mw, summary.num_charging, summary.num_v2g,
+                        base_residential_load, industrial_load, grid_cap)
+
+
+def scenario_sweep(pct_charging, pct_v2g, base_residential_load, industrial_load,
+                   grid_cap, total_fleet=TOTAL_FLEET):
+    """Evaluate the full cartesian product of 1-D parameter axes.
+
+    Result arrays have shape ``(len(pct_charging), len(pct_v2g),
+    len(base_residential_load), len(industrial_load), len(grid_cap))``.
+    """
+    axes = [np.atleast_1d(np.asarray(a, dtype=np.float64))
+            for a in (pct_charging, pct_v2g, base_residential_load, industrial_load, grid_cap)]
+    n = len(axes)
+    shaped = [a.reshape((1,) * i + (-1,) + (1,) * (n - i - 1)) for i, a in enumerate(axes)]
+    return grid_physics(*shaped, total_fleet=total_fleet)
@@ -0,0 +1,132 @@
+"""Per-rerun timing spans with rolling percentiles and file exporters.
+
+The page script opens a run with ``begin_run``, wraps each section in
+``span(name)`` and closes it with ``end_run``.  Every finished span is
+pushed straight into a fixed-size window per name, so sections timed in a
+run that was cut short by ``st.rerun()`` still count.  Completed runs can
+be appended to a JSON-lines log and the rolling summary rewritten as a
+Prometheus text file (node_exporter textfile collector format).
+"""
+import contextlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+RUN_SPAN = "rerun"
+
+
+class SpanWindow:
+    """Last ``window`` durations of one span, plus lifetime count and sum."""
+
+    def __init__(self, window=256):
+        self.values = np.zeros(window, dtype=np.float64)
+        self.pos = 0
+        self.count = 0
+        self.total = 0.0
+        self.last = 0.0
+
+    def push(self, seconds):
+        self.values[self.pos] = seconds
+        self.pos = (self.pos + 1) % len(self.values)
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+
+    def recent(self):
+        return self.values[:min(self.count, len(self.values))]
+
+
+class Profiler:
+    """Process-wide span collector shared by all sessions."""
+
+    def __init__(self, window=256, jsonl_path=None, prom_path=None, prom_interval=5.0):
+        self.window = window
+        self.jsonl_path = Path(jsonl_path) if jsonl_path else None
+        self.prom_path = Path(prom_path) if prom_path else None
+        self.prom_interval = prom_interval
+        self._spans = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._prom_written = 0.0
+
+    def record(self, name, seconds):
+        with self._lock:
+            win = self._spans.get(name)
+            if win is None:
+                win = self._spans[name] = SpanWindow(self.window)
+            win.push(seconds)
+
+    def begin_run(self, **labels):
+        """Start timing a rerun on this thread; ``labels`` go into the JSON-lines record."""
+        self._local.run = {"ts": time.time(), "t0": time.perf_counter(), "labels": labels, "spans": {}}
+
+    @contextlib.contextmanager
+    def span(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - t0
+            self.record(name, seconds)
+            run = getattr(self._local, "run", None)
+            if run is not None:
+                run["spans"][name] = run["spans"].get(name, 0.0) + seconds
+
+    def end_run(self):
+        """Close the rerun opened by ``begin_run`` and export it; returns its span totals."""
+        run = getattr(self._local, "run", None)
+        if run is None:
+            return {}
+        self._local.run = None
+        seconds = time.perf_counter() - run["t0"]
+        self.record(RUN_SPAN, seconds)
+        spans = dict(run["spans"], **{RUN_SPAN: seconds})
+
+        if self.jsonl_path is not None:
+            line = json.dumps({"ts": run["ts"], **run["labels"], "spans": spans})
+            with self._lock, self.jsonl_path.open("a") as fh:
+                fh.write(line + "\n")
+        if self.prom_path is not None and time.time() - self._prom_written >= self.prom_interval:
+            self.write_prometheus()
+        return spans
+
+    def stats(self, quantiles=(50, 95)):
+        """Rolling summary per span, slowest median first."""
+        with self._lock:
+            items = [(name, win.recent().copy(), win.count, win.last) for name, win in self._spans.items()]
+        rows = []
+        for name, recent, count, last in items:
+            p = np.percentile(recent, quantiles)
+            row = {"span": name, "runs": count, "last_ms": last * 1e3}
+            row.update({f"p{q}_ms": v * 1e3 for q, v in zip(quantiles, p)})
+            rows.append(row)
+        return sorted(rows, key=lambda r: -r[f"p{quantiles[0]}_ms"])
+
+    def to_prometheus(self, metric="vpp_rerun_span_seconds"):
+        with self._lock:
+            items = [(name, win.recent().copy(), win.count, win.total) for name, win in sorted(self._spans.items())]
+        lines = [f"# HELP {metric} Wall time of Command Center page sections per rerun.",
+                 f"# TYPE {metric} summary"]
+        for name, recent, count, total in items:
+            label = name.replace("\\", "\\\\").replace('"', '\\"')
+            for q, v in zip((0.5, 0.95), np.percentile(recent, (50, 95))):
+                lines.append(f'{metric}{{span="{label}",quantile="{q}"}} {v:.6f}')
+            lines.append(f'{metric}_sum{{span="{label}"}} {total:.6f}')
+            lines.append(f'{metric}_count{{span="{label}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path=None):
+        # كتابة ذرية حتى لا يقرأ المُجمّع ملفاً نصف مكتوب (atomic replace for the scraper)
+        path = Path(path or self.prom_path)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(self.to_prometheus())
+        os.replace(tmp, path)
+        self._prom_written = time.time()
+
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
@@ -0,0 +1,191 @@
+"""Tariff-aware day-ahead charge / discharge scheduling for the fleet.
+
+Vehicles with the same plug-in interval, dwell, energy need, charger
+rating and V2G permission form one cohort and share one schedule, so a
+million vehicles collapse to a few thousand rows.  Every step below is an
+operation on a ``(n_cohorts, 96)`` array:
+
+1. energy needs are filled into each cohort's cheapest plugged-in intervals;
+2. V2G cohorts then pair their cheapest free intervals with their dearest
+   ones while the spread beats the round-trip loss, up to the usable
+   battery window;
+3. intervals where the fleet's net import exceeds grid headroom are
+   throttled and the displaced energy is refilled elsewhere, for a few
+   passes.
+
+The result is a greedy schedule, exact for the unconstrained case, that
+ignores the order of charge and discharge inside a dwell window.
+"""
+from typing import NamedTuple
+
+import numpy as np
+
+from .constants import AVG_BATTERY_KWH, INVERTER_EFFICIENCY, V2G_RESERVE_SOC
+from .fleet import CHARGING, V2G_READY
+from .timeseries import HOURLY_LOAD_FACTORS
+
+INTERVALS = 96
+INTERVAL_H = 24.0 / INTERVALS
+
+# نافذة الذروة في التعرفة الافتراضية (Default tariff: sell price 13:00-17:59, buy price otherwise)
+TARIFF_PEAK_HOURS = (13, 17)
+
+
+class Cohorts(NamedTuple):
+    arrival: np.ndarray     # plug-in interval, 0..95
+    dwell: np.ndarray       # plugged-in intervals, 1..95 (wraps past midnight)
+    need_kwh: np.ndarray    # battery-side energy to reach the target SoC
+    charger_kw: np.ndarray
+    v2g: np.ndarray         # may discharge
+    count: np.ndarray       # vehicles in the cohort
+
+
+class ChargeSchedule(NamedTuple):
+    hours: np.ndarray          # interval start, hours
+    tariff: np.ndarray         # SAR/kWh
+    charge_mw: np.ndarray      # fleet grid import
+    discharge_mw: np.ndarray   # fleet V2G export
+    headroom_mw: np.ndarray    # grid capacity left for the fleet
+    energy_cost_sar: float     # import cost minus export revenue
+    baseline_cost_sar: float   # same needs, charged on arrival, no V2G
+    unmet_mwh: float           # need that did not fit the windows / headroom
+    n_vehicles: int
+    n_cohorts: int
+
+
+def tariff_from_prices(sell_price, buy_price, peak_hours=TARIFF_PEAK_HOURS):
+    """The dashboard's two-level tariff at 15-minute resolution."""
+    hour = np.arange(INTERVALS) * INTERVAL_H
+    return np.where((hour >= peak_hours[0]) & (hour < peak_hours[1] + 1), sell_price, buy_price).astype(np.float64)
+
+
+def headroom_profile(total_city_load, ev_load_gw, grid_cap):
+    """Capacity left for the fleet per interval, MW.
+
+    The non-EV part of ``total_city_load`` is treated as the daily peak and
+    shaped by ``HOURLY_LOAD_FACTORS``.
+    """
+    shape = HOURLY_LOAD_FACTORS[(np.arange(INTERVALS) * INTERVAL_H).astype(int)] / HOURLY_LOAD_FACTORS.max()
+    return (grid_cap - (total_city_load - ev_load_gw) * shape) * 1000.0
+
+
+def fleet_cohorts(fleet, plug_status=None, battery_kwh=AVG_BATTERY_KWH, target_soc=0.9,
+                  arrival_hour=18.5, arrival_sd_h=2.0, dwell_h=12.0, dwell_sd_h=2.0,
+                  need_step_kwh=2.0, seed=None):
+    """Group the managed vehicles (charging or V2G-ready) into cohorts.
+
+    Plug-in times and dwell are drawn per vehicle (home charging: evening
+    arrival, next-morning departure); needs are rounded to ``need_step_kwh``
+    and dwell to whole hours so vehicles collapse into few cohorts.
+    """
+    status = fleet.plug_status if plug_status is None else plug_status
+    managed = np.flatnonzero((status == CHARGING) | (status == V2G_READY))
+    n = len(managed)
+    rng = np.random.default_rng(seed)
+
+    arrival = np.round(rng.normal(arrival_hour, arrival_sd_h, n) / INTERVAL_H).astype(np.int64) % INTERVALS
+    per_hour = int(round(1 / INTERVAL_H))
+    dwell = np.clip(np.round(rng.normal(dwell_h, dwell_sd_h, n)), 1, 23).astype(np.int64) * per_hour
+    need = np.maximum(target_soc - fleet.soc[managed], 0.0) * battery_kwh
+    need_q = np.round(need / need_step_kwh).astype(np.int64)
+    kw_q = np.round(fleet.charger_kw[managed] * 10).astype(np.int64)
+    v2g = (status[managed] == V2G_READY) & fleet.v2g_eligible[managed]
+
+    # مفتاح واحد لكل مجموعة (one packed integer key per cohort)
+    key = ((((arrival * INTERVALS + dwell) * 1024 + need_q) * 4096 + kw_q) << 1) | v2g
+    _, first, count = np.unique(key, return_index=True, return_counts=True)
+    return Cohorts(arrival[first], dwell[first], need_q[first] * need_step_kwh,
+                   kw_q[first] / 10.0, v2g[first], count)
+
+
+def _availability(cohorts):
+    t = np.arange(INTERVALS)
+    return (t[None, :] - cohorts.arrival[:, None]) % INTERVALS < cohorts.dwell[:, None]
+
+
+def _fill(order, capacity, need):
+    """Fill ``need`` per row into ``capacity`` taken in column ``order`` (per row or shared)."""
+    cap = np.take_along_axis(capacity, order, axis=1) if order.ndim == 2 else capacity[:, order]
+    before = np.cumsum(cap, axis=1) - cap
+    take = np.clip(need[:, None] - before, 0.0, cap)
+    out = np.empty_like(take)
+    if order.ndim == 2:
+        np.put_along_axis(out, order, take, axis=1)
+    else:
+        out[:, order] = take
+    return out
+
+
+def _arbitrage(tariff, order, free, slot_kwh, throughput_kwh, eta2):
+    """Pair cheapest and dearest free intervals per row while ``dear * eta2 > cheap``."""
+    n_rows = free.shape[0]
+    free_sorted = free[:, order]
+    n_free = free_sorted.sum(axis=1)
+    pos = np.argsort(~free_sorted, axis=1, kind="stable")   # free positions first, cheapest first
+    price_sorted = tariff[order]
+    k = np.arange(INTERVALS)
+
+    asc = price_sorted[pos]
+    desc_pos = np.take_along_axis(pos, np.clip(n_free[:, None] - 1 - k, 0, INTERVALS - 1), axis=1)
+    desc = price_sorted[desc_pos]
+    profitable = (k < (n_free // 2)[:, None]) & (desc * eta2 > asc)
+
+    pairs = np.minimum(profitable.sum(axis=1), throughput_kwh / np.maximum(slot_kwh, 1e-12))
+    weight = np.clip(pairs[:, None] - k, 0.0, 1.0) * slot_kwh[:, None]
+    charge = np.zeros((n_rows, INTERVALS))
+    discharge = np.zeros((n_rows, INTERVALS))
+    np.put_along_axis(charge, order[pos], weight, axis=1)
+    np.put_along_axis(discharge, order[desc_pos], weight * eta2, axis=1)
+    return charge, discharge
+
+
+def schedule_fleet(cohorts, tariff, headroom_mw=None, battery_kwh=AVG_BATTERY_KWH,
+                   reserve_soc=V2G_RESERVE_SOC, target_soc=0.9, efficiency=INVERTER_EFFICIENCY, passes=6):
+    """Cost-minimizing 96-interval schedule for every cohort, aggregated to the fleet."""
+    tariff = np.asarray(tariff, dtype=np.float64)
+    if tariff.shape != (INTERVALS,):
+        raise ValueError(f"tariff must have {INTERVALS} intervals")
+    headroom = np.full(INTERVALS, np.inf) if headroom_mw is None else np.asarray(headroom_mw, dtype=np.float64)
+
+    avail = _availability(cohorts)
+    slot_kwh = cohorts.charger_kw * INTERVAL_H                  # grid-side energy per interval per vehicle
+    grid_need = cohorts.need_kwh / efficiency
+    throughput = np.where(cohorts.v2g, battery_kwh * (target_soc - reserve_soc) / efficiency, 0.0)
+    weight_mw = cohorts.count / INTERVAL_H / 1000.0             # per-vehicle kWh in one interval -> fleet MW
+    order = np.argsort(tariff, kind="stable")
+
+    # تقليص الفترات التي تتجاوز سعة الشبكة ثم إعادة التعبئة (throttle over-subscribed intervals, refill)
+    share = np.ones(INTERVALS)
+    for _ in range(passes):
+        capacity = avail * slot_kwh[:, None] * share
+        charge = _fill(order, capacity, grid_need)
+        free = avail & (charge == 0) & (share == 1.0)
+        arb_in, arb_out = _arbitrage(tariff, order, free, slot_kwh, throughput, efficiency ** 2)
+        arb_in, arb_out = arb_in * cohorts.v2g[:, None], arb_out * cohorts.v2g[:, None]
+        charge_mw = weight_mw @ (charge + arb_in)
+        discharge_mw = weight_mw @ arb_out
+        over = charge_mw - discharge_mw > headroom + 1e-9
+        if not over.any():
+            break
+        allowed = np.maximum(headroom + discharge_mw, 0.0)
+        share = np.where(over, share * allowed / np.maximum(charge_mw, 1e-12), share)
+
+    # الشحن عند الوصول للمقارنة (uncontrolled baseline: charge from arrival until done)
+    by_time = (cohorts.arrival[:, None] + np.arange(INTERVALS)) % INTERVALS
+    baseline = _fill(by_time, avail * slot_kwh[:, None], grid_need)
+    baseline_mw = weight_mw @ baseline
+
+    mwh = INTERVAL_H
+    unmet = np.maximum(grid_need - charge.sum(axis=1), 0.0) @ cohorts.count / 1000.0
+    return ChargeSchedule(
+        hours=np.arange(INTERVALS) * INTERVAL_H,
+        tariff=tariff,
+        charge_mw=charge_mw,
+        discharge_mw=discharge_mw,
+        headroom_mw=headroom,
+        energy_cost_sar=float(tariff @ (charge_mw - discharge_mw) * mwh * 1000.0),
+        baseline_cost_sar=float(tariff @ baseline_mw * mwh * 1000.0),
+        unmet_mwh=float(unmet),
+        n_vehicles=int(cohorts.count.sum()),
+        n_cohorts=len(cohorts.count),
+    )
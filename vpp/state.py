@@ -0,0 +1,147 @@
+"""Process-wide dispatch state shared by every operator session.
+
+One ``GridStateStore`` holds what has been commanded and what is actually
+being injected where.  Every change goes through a single lock and
+produces a new immutable ``GridState`` with the version bumped; a change
+that leaves the state as it was is dropped without a bump, so readers can
+treat "same version" as "nothing to redraw".  Consumers either compare
+versions (cheap polling from the page script) or block in ``wait`` /
+register a ``subscribe`` callback (background threads).
+"""
+import threading
+import time
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+
+class GridState(NamedTuple):
+    version: int
+    dispatch_active: bool
+    target_mw: np.ndarray         # per zone, read-only: commanded set-point
+    dispatched_mw: np.ndarray     # per zone, read-only: inverter output, ramps toward target
+    payout_sar: np.ndarray        # per zone, read-only
+    local_deficit_gw: np.ndarray  # per zone, read-only, from the running dispatch inputs
+    updated_by: Optional[str]
+    updated_at: float
+
+    @property
+    def total_dispatched_mw(self):
+        return float(self.dispatched_mw.sum())
+
+    @property
+    def ramping(self):
+        return not np.allclose(self.dispatched_mw, self.target_mw)
+
+    def frame(self, zone_names):
+        """Per-zone view with the columns the dashboard tables use."""
+        return pd.DataFrame({
+            "status": np.where(self.target_mw > 0, "STABILIZED", "STABLE"),
+            "payout": self.payout_sar,
+            "target_mw": self.target_mw,
+            "dispatched_mw": self.dispatched_mw,
+            "local_deficit": self.local_deficit_gw,
+        }, index=pd.Index(zone_names, name="zone"))
+
+
+def _frozen(values, n):
+    arr = np.array(np.broadcast_to(np.asarray(values, dtype=np.float64), (n,)))
+    arr.flags.writeable = False
+    return arr
+
+
+class GridStateStore:
+    """Thread-safe, versioned holder of the shared ``GridState``."""
+
+    def __init__(self, zone_names):
+        self.zone_names = list(zone_names)
+        self._index = {name: i for i, name in enumerate(self.zone_names)}
+        n = len(self.zone_names)
+        self._cond = threading.Condition()
+        self._subscribers = []
+        zeros = _frozen(0.0, n)
+        self._state = GridState(0, False, zeros, zeros, zeros, zeros, None, time.time())
+
+    @property
+    def version(self):
+        return self._state.version
+
+    def snapshot(self):
+        return self._state
+
+    def update(self, fn, by=None):
+        """Apply ``fn(state) -> dict of field changes`` atomically; returns the resulting state.
+
+        ``fn`` runs under the store lock, so it sees the latest state and
+        may return ``{}`` to leave it alone (compare-and-set).
+        """
+        n = len(self.zone_names)
+        with self._cond:
+            old = self._state
+            changes = fn(old) or {}
+            for field in ("target_mw", "dispatched_mw", "payout_sar", "local_deficit_gw"):
+                if field in changes:
+                    changes[field] = _frozen(changes[field], n)
+            same = all(
+                np.array_equal(v, getattr(old, k)) if isinstance(v, np.ndarray) else v == getattr(old, k)
+                for k, v in changes.items()
+            )
+            if same:
+                return old
+            new = old._replace(version=old.version + 1, updated_by=by, updated_at=time.time(), **changes)
+            self._state = new
+            self._cond.notify_all()
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            callback(new)
+        return new
+
+    # -- العمليات (operations) --
+    def set_zone(self, zone, mw, payout_sar, by=None):
+        """Command a manual injection (or stop, with ``mw=0``) at one substation."""
+        i = self._index[zone]
+
+        def change(state):
+            mw_all, pay_all = state.target_mw.copy(), state.payout_sar.copy()
+            mw_all[i], pay_all[i] = mw, payout_sar
+            return {"target_mw": mw_all, "payout_sar": pay_all}
+        return self.update(change, by)
+
+    def start_dispatch(self, by=None):
+        return self.update(lambda state: {"dispatch_active": True}, by)
+
+    def stop_dispatch(self, by=None):
+        """SCRAM: end central dispatch and trip every zone's injection at once (no ramp)."""
+        return self.update(
+            lambda state: {"dispatch_active": False, "target_mw": 0.0, "dispatched_mw": 0.0, "payout_sar": 0.0}, by
+        )
+
+    def set_allocation(self, allocation_mw, payout_sar, local_deficit_gw=None, by=None):
+        """Command a central dispatch allocation; ignored once dispatch has been stopped."""
+        def change(state):
+            if not state.dispatch_active:
+                return {}
+            changes = {"target_mw": allocation_mw, "payout_sar": payout_sar}
+            if local_deficit_gw is not None:
+                changes["local_deficit_gw"] = local_deficit_gw
+            return changes
+        return self.update(change, by)
+
+    # -- الاشتراك في التغييرات (change notification) --
+    def subscribe(self, callback):
+        """Call ``callback(state)`` after every version bump; returns an unsubscribe function."""
+        with self._cond:
+            self._subscribers.append(callback)
+
+        def unsubscribe():
+            with self._cond:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+        return unsubscribe
+
+    def wait(self, version, timeout=None):
+        """Block until the version moves past ``version`` (or ``timeout``); returns the current state."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._state.version != version, timeout)
+            return self._state
@@ -0,0 +1,339 @@
+"""Streaming meter / charger telemetry with ring-buffered per-zone aggregates.
+
+Readings arrive as batches of ``RECORD_DTYPE`` structured arrays from a
+pluggable source (replay file, TCP socket or a synthetic generator).  Meter
+and charger readings both keep each source's latest value.  A zone's load
+is the sum of its meters' latest readings, and the total after every
+meter reading goes into a fixed-size ring buffer per zone whose running
+sums are updated incrementally; charger readings adjust per-zone totals by
+the delta.  Nothing is recomputed from the full history.
+"""
+import socket
+import threading
+import time
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+METER = 0
+CHARGER = 1
+
+RECORD_DTYPE = np.dtype([
+    ("ts", "<f8"),         # epoch seconds
+    ("zone", "<i4"),
+    ("source_id", "<i4"),  # meter or charger id
+    ("kind", "u1"),        # METER / CHARGER
+    ("value", "<f4"),      # kW; chargers are negative while discharging (V2G)
+])
+
+
+def _grow(values, max_id):
+    """``values`` with room for index ``max_id``, doubling so repeated growth stays cheap."""
+    if max_id < len(values):
+        return values
+    size = max(max_id + 1, 2 * len(values))
+    return np.concatenate([values, np.zeros(size - len(values), dtype=values.dtype)])
+
+
+def _last_per_id(ids):
+    """Index of the last reading of each id, in arrival order."""
+    _, last = np.unique(ids[::-1], return_index=True)
+    return len(ids) - 1 - last
+
+
+class ZoneRingBuffer:
+    """Fixed-size window of recent values per zone with running sum and sum of squares."""
+
+    # إعادة حساب المجاميع دورياً لتفادي تراكم خطأ الفاصلة العائمة (periodic resync against float drift)
+    RESYNC_EVERY = 4096
+
+    def __init__(self, n_zones, window=256):
+        self.n_zones = n_zones
+        self.window = window
+        self.values = np.zeros((n_zones, window), dtype=np.float64)
+        self.head = np.zeros(n_zones, dtype=np.int64)   # next slot to write
+        self.count = np.zeros(n_zones, dtype=np.int64)
+        self.total = np.zeros(n_zones, dtype=np.float64)
+        self.total_sq = np.zeros(n_zones, dtype=np.float64)
+        self._pushes = 0
+
+    def push(self, zone, value):
+        """Append a batch of ``(zone, value)`` readings in arrival order."""
+        zone = np.asarray(zone, dtype=np.int64)
+        value = np.asarray(value, dtype=np.float64)
+        if not len(zone):
+            return
+
+        # ترتيب القراءة داخل حيها في هذه الدفعة (rank of each reading within its zone)
+        order = np.argsort(zone, kind="stable")
+        zone, value = zone[order], value[order]
+        n_new = np.bincount(zone, minlength=self.n_zones)
+        seg_start = np.cumsum(n_new) - n_new
+        rank = np.arange(len(zone)) - seg_start[zone]
+
+        # فقط آخر window قراءة لكل حي تبقى (only the last `window` readings per zone survive)
+        keep = rank >= n_new[zone] - self.window
+        zone, value, rank = zone[keep], value[keep], rank[keep]
+        rank -= np.maximum(n_new - self.window, 0)[zone]
+
+        slot = (self.head[zone] + rank) % self.window
+        old = self.values[zone, slot]
+        self.values[zone, slot] = value
+        self.total += np.bincount(zone, weights=value - old, minlength=self.n_zones)
+        self.total_sq += np.bincount(zone, weights=value * value - old * old, minlength=self.n_zones)
+
+        self.head = (self.head + n_new) % self.window
+        self.count = np.minimum(self.count + n_new, self.window)
+
+        self._pushes += 1
+        if self._pushes % self.RESYNC_EVERY == 0:
+            self.total = self.values.sum(axis=1)
+            self.total_sq = (self.values ** 2).sum(axis=1)
+
+    def mean(self):
+        return np.divide(self.total, self.count, out=np.zeros(self.n_zones), where=self.count > 0)
+
+    def std(self):
+        mean = self.mean()
+        var = np.divide(self.total_sq, self.count, out=np.zeros(self.n_zones), where=self.count > 0) - mean ** 2
+        return np.sqrt(np.maximum(var, 0.0))
+
+    def latest(self):
+        return self.values[np.arange(self.n_zones), (self.head - 1) % self.window]
+
+
+class TelemetrySnapshot(NamedTuple):
+    zone_load_mw: np.ndarray      # rolling mean of the zone's summed meter readings
+    zone_load_std_mw: np.ndarray
+    zone_charging_mw: np.ndarray  # sum of latest charger draw
+    zone_v2g_mw: np.ndarray       # sum of latest charger injection
+    readings: int
+    last_ts: float
+
+
+class TelemetryAggregator:
+    """Per-zone rolling aggregates fed by telemetry batches."""
+
+    def __init__(self, n_zones, window=256, n_chargers=0, n_meters=0):
+        self.n_zones = n_zones
+        self.meter = ZoneRingBuffer(n_zones, window)
+        self.meter_kw = np.zeros(n_meters, dtype=np.float64)
+        self.meter_zone = np.zeros(n_meters, dtype=np.int64)
+        self.charger_kw = np.zeros(n_chargers, dtype=np.float64)
+        self.charger_zone = np.zeros(n_chargers, dtype=np.int64)
+        self.zone_charging_kw = np.zeros(n_zones, dtype=np.float64)
+        self.zone_v2g_kw = np.zeros(n_zones, dtype=np.float64)
+        self.readings = 0
+        self.last_ts = 0.0
+        self._lock = threading.Lock()
+
+    def _grow_meters(self, max_id):
+        self.meter_kw, self.meter_zone = _grow(self.meter_kw, max_id), _grow(self.meter_zone, max_id)
+
+    def _grow_chargers(self, max_id):
+        self.charger_kw, self.charger_zone = _grow(self.charger_kw, max_id), _grow(self.charger_zone, max_id)
+
+    def _meter_totals(self, meters):
+        """Zone load in kW after each meter reading: every meter's latest value, summed per zone.
+
+        A meter id belongs to one zone; the sums are rebuilt from the
+        per-meter values, so they do not drift.
+        """
+        mid, zone = meters["source_id"].astype(np.int64), meters["zone"].astype(np.int64)
+        kw = meters["value"].astype(np.float64)
+        self._grow_meters(int(mid.max()))
+        zone_kw = np.bincount(self.meter_zone, weights=self.meter_kw, minlength=self.n_zones)
+
+        # القراءة السابقة لكل متر: في الدفعة أو المخزنة (each reading's predecessor from the same meter)
+        order = np.argsort(mid, kind="stable")
+        first = np.r_[True, mid[order][1:] != mid[order][:-1]]
+        prev = np.empty_like(kw)
+        prev[order] = np.where(first, self.meter_kw[mid[order]], np.r_[0.0, kw[order][:-1]])
+
+        # مجموع الحي بعد كل قراءة بترتيب الوصول (zone total after each reading, in arrival order)
+        order = np.argsort(zone, kind="stable")
+        step = np.cumsum((kw - prev)[order])
+        n = np.bincount(zone, minlength=self.n_zones)
+        before = np.r_[0.0, step][np.cumsum(n) - n]
+        totals = np.empty_like(kw)
+        totals[order] = zone_kw[zone[order]] + step - before[zone[order]]
+
+        last = _last_per_id(mid)
+        self.meter_kw[mid[last]] = kw[last]
+        self.meter_zone[mid[last]] = zone[last]
+        return zone, totals
+
+    def ingest(self, batch):
+        """Fold one batch of ``RECORD_DTYPE`` readings into the aggregates."""
+        if not len(batch):
+            return
+        with self._lock:
+            is_meter = batch["kind"] == METER
+            meters = batch[is_meter]
+            if len(meters):
+                zone, totals = self._meter_totals(meters)
+                # المتر يرسل kW ونخزن MW (meters report kW, buffers hold MW)
+                self.meter.push(zone, totals / 1000.0)
+
+            chargers = batch[~is_meter]
+            if len(chargers):
+                cid = chargers["source_id"].astype(np.int64)
+                self._grow_chargers(int(cid.max()))
+                # آخر قراءة لكل شاحن في الدفعة (last reading per charger in this batch)
+                last = _last_per_id(cid)
+                cid, zone, kw = cid[last], chargers["zone"][last].astype(np.int64), chargers["value"][last].astype(np.float64)
+
+                old_kw, old_zone = self.charger_kw[cid], self.charger_zone[cid]
+                self.zone_charging_kw -= np.bincount(old_zone, weights=np.maximum(old_kw, 0), minlength=self.n_zones)
+                self.zone_v2g_kw -= np.bincount(old_zone, weights=np.maximum(-old_kw, 0), minlength=self.n_zones)
+                self.zone_charging_kw += np.bincount(zone, weights=np.maximum(kw, 0), minlength=self.n_zones)
+                self.zone_v2g_kw += np.bincount(zone, weights=np.maximum(-kw, 0), minlength=self.n_zones)
+                self.charger_kw[cid] = kw
+                self.charger_zone[cid] = zone
+
+            self.readings += len(batch)
+            self.last_ts = max(self.last_ts, float(batch["ts"].max()))
+
+    def snapshot(self):
+        with self._lock:
+            return TelemetrySnapshot(
+                zone_load_mw=self.meter.mean(),
+                zone_load_std_mw=self.meter.std(),
+                zone_charging_mw=self.zone_charging_kw / 1000.0,
+                zone_v2g_mw=self.zone_v2g_kw / 1000.0,
+                readings=self.readings,
+                last_ts=self.last_ts,
+            )
+
+    def physics_inputs(self):
+        """``(base_residential_load_gw, ev_load_kw)`` for the physics core."""
+        snap = self.snapshot()
+        return float(snap.zone_load_mw.sum() / 1000.0), float(snap.zone_charging_mw.sum() * 1000.0)
+
+
+# ---------------------------------------------------------
+# مصادر القراءات (Telemetry sources)
+# ---------------------------------------------------------
+class ReplaySource:
+    """Replays a recorded ``.npy`` (structured) or ``.csv`` file in batches."""
+
+    def __init__(self, path, batch_size=5000, speed=None):
+        path = Path(path)
+        if path.suffix == ".npy":
+            self.records = np.load(path, mmap_mode="r")
+        else:
+            df = pd.read_csv(path)
+            self.records = np.empty(len(df), dtype=RECORD_DTYPE)
+            for name in RECORD_DTYPE.names:
+                self.records[name] = df[name].to_numpy()
+        self.batch_size = batch_size
+        self.speed = speed  # None = as fast as possible, else x real time
+        self._pos = 0
+
+    def read_batch(self):
+        if self._pos >= len(self.records):
+            return None
+        batch = np.asarray(self.records[self._pos:self._pos + self.batch_size])
+        if self.speed and self._pos:
+            time.sleep(max(0.0, float(batch["ts"][-1] - self.records["ts"][self._pos - 1]) / self.speed))
+        self._pos += len(batch)
+        return batch
+
+
+class SocketSource:
+    """Reads raw ``RECORD_DTYPE`` records from a TCP stream."""
+
+    def __init__(self, host="127.0.0.1", port=9750, timeout=1.0, chunk_records=8192):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.chunk = chunk_records * RECORD_DTYPE.itemsize
+        self._pending = b""
+
+    def read_batch(self):
+        try:
+            data = self.sock.recv(self.chunk)
+        except socket.timeout:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        if not data:
+            return None
+        data = self._pending + data
+        usable = len(data) - len(data) % RECORD_DTYPE.itemsize
+        self._pending = data[usable:]
+        return np.frombuffer(data[:usable], dtype=RECORD_DTYPE)
+
+    def close(self):
+        self.sock.close()
+
+
+class SyntheticSource:
+    """Stand-in generator: noisy meter load around ``zone_load_mw`` plus charger updates."""
+
+    def __init__(self, zone_load_mw, chargers_per_zone=50, batch_size=5000, charger_kw=8.5,
+                 interval=0.1, seed=None):
+        self.zone_load_mw = np.asarray(zone_load_mw, dtype=np.float64)
+        self.n_zones = len(self.zone_load_mw)
+        self.n_chargers = self.n_zones * chargers_per_zone
+        self.charger_zone = np.repeat(np.arange(self.n_zones), chargers_per_zone)
+        self.batch_size = batch_size
+        self.charger_kw = charger_kw
+        self.interval = interval
+        self.rng = np.random.default_rng(seed)
+
+    def read_batch(self):
+        if self.interval:
+            time.sleep(self.interval)
+        n = self.batch_size
+        batch = np.empty(n, dtype=RECORD_DTYPE)
+        batch["ts"] = time.time()
+        kind = (self.rng.random(n) < 0.5).astype(np.uint8)
+        batch["kind"] = kind
+        zone = self.rng.integers(0, self.n_zones, n)
+        cid = self.rng.integers(0, self.n_chargers, n)
+        zone = np.where(kind == CHARGER, self.charger_zone[cid], zone)
+        batch["zone"] = zone
+        batch["source_id"] = np.where(kind == CHARGER, cid, zone)
+        meter_kw = self.zone_load_mw[zone] * 1000.0 * (1.0 + self.rng.normal(0.0, 0.02, n))
+        charger_kw = self.rng.choice([0.0, self.charger_kw, -self.charger_kw], n, p=[0.4, 0.4, 0.2])
+        batch["value"] = np.where(kind == METER, meter_kw, charger_kw)
+        return batch
+
+
+class TelemetryPipeline:
+    """Background thread draining a source into an aggregator.
+
+    ``on_batch(aggregator)``, if given, runs after every ingested batch
+    (e.g. a ``HistoryRecorder``).
+    """
+
+    def __init__(self, source, aggregator, on_batch=None):
+        self.source = source
+        self.aggregator = aggregator
+        self.on_batch = on_batch
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="vpp-telemetry", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self.source.read_batch()
+            if batch is None:
+                break
+            self.aggregator.ingest(batch)
+            if self.on_batch is not None:
+                self.on_batch(self.aggregator)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
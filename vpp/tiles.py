@@ -0,0 +1,83 @@
+"""Server-side density tiling for fleet maps.
+
+Vehicle positions are binned into a regular lat/lon grid per plug status
+with one ``np.bincount``, so the browser receives one marker per occupied
+cell and status instead of one per vehicle.  Small enough views fall back
+to plain point rendering.
+"""
+from typing import NamedTuple
+
+import numpy as np
+
+from .fleet import CHARGING, UNPLUGGED, V2G_READY
+
+STATUS_LABELS = {UNPLUGGED: "Idle", CHARGING: "Charging", V2G_READY: "V2G Ready"}
+
+# عدد البكسلات لكل خلية عند التكبير المعطى (target on-screen cell size)
+CELL_PX = 24
+TILE_PX = 256
+
+
+class DensityTiles(NamedTuple):
+    lat: np.ndarray     # cell centre latitude
+    lon: np.ndarray     # cell centre longitude
+    status: np.ndarray  # plug status code
+    count: np.ndarray   # vehicles in the cell with that status
+
+
+class FleetPoints(NamedTuple):
+    lat: np.ndarray
+    lon: np.ndarray
+    status: np.ndarray
+    total: int          # vehicles in view before sampling
+
+
+def cell_size_for_zoom(zoom, cell_px=CELL_PX):
+    """Cell edge in degrees so that a cell spans about ``cell_px`` pixels."""
+    return 360.0 / (TILE_PX * 2.0 ** zoom) * cell_px
+
+
+def in_bbox(lat, lon, bbox):
+    lat_min, lon_min, lat_max, lon_max = bbox
+    return (lat >= lat_min) & (lat < lat_max) & (lon >= lon_min) & (lon < lon_max)
+
+
+def bin_density(lat, lon, status, bbox, cell_deg, n_status=3):
+    """Count vehicles per grid cell and status inside ``bbox``."""
+    lat_min, lon_min, lat_max, lon_max = bbox
+    n_rows = max(1, int(np.ceil((lat_max - lat_min) / cell_deg)))
+    n_cols = max(1, int(np.ceil((lon_max - lon_min) / cell_deg)))
+
+    mask = in_bbox(lat, lon, bbox)
+    row = ((lat[mask] - lat_min) / cell_deg).astype(np.int64)
+    col = ((lon[mask] - lon_min) / cell_deg).astype(np.int64)
+    np.minimum(row, n_rows - 1, out=row)
+    np.minimum(col, n_cols - 1, out=col)
+
+    n_cells = n_rows * n_cols
+    flat = status[mask].astype(np.int64) * n_cells + row * n_cols + col
+    counts = np.bincount(flat, minlength=n_status * n_cells)
+    occupied = np.flatnonzero(counts)
+
+    cell_status, cell = np.divmod(occupied, n_cells)
+    cell_row, cell_col = np.divmod(cell, n_cols)
+    return DensityTiles(
+        lat=lat_min + (cell_row + 0.5) * cell_deg,
+        lon=lon_min + (cell_col + 0.5) * cell_deg,
+        status=cell_status.astype(np.uint8),
+        count=counts[occupied],
+    )
+
+
+def fleet_view(lat, lon, status, bbox, zoom, point_limit=20000):
+    """Tiles for wide views, raw points once the view holds ``point_limit`` vehicles or fewer."""
+    mask = in_bbox(lat, lon, bbox)
+    total = int(np.count_nonzero(mask))
+    if total > point_limit:
+        return bin_density(lat, lon, status, bbox, cell_size_for_zoom(zoom))
+    idx = np.flatnonzero(mask)
+    return FleetPoints(lat[idx], lon[idx], status[idx], total)
+
+
+def bbox_around(lat, lon, half_extent_deg):
+    return (lat - half_extent_deg, lon - half_extent_deg, lat + half_extent_deg, lon + half_extent_deg)
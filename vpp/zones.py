@@ -0,0 +1,180 @@
+"""Columnar zone / substation registry with a grid spatial index.
+
+Zones are held as parallel NumPy columns loaded from CSV or Parquet, so
+per-zone quantities are array expressions rather than dict walks.  A
+uniform lat/lon grid answers nearest-substation and bounding-box queries
+without scanning every zone.
+"""
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+REQUIRED_COLUMNS = ("name", "load", "ev_density", "lat", "lon")
+
+DEFAULT_ZONES_FILE = Path(__file__).resolve().parent.parent / "data" / "riyadh_zones.csv"
+
+
+class ZoneRegistry:
+    """Parallel columns describing every zone, plus a spatial index."""
+
+    def __init__(self, name, load, ev_density, lat, lon, capacity_mw=None, zones_per_cell=4):
+        self.name = np.asarray(name, dtype=object)
+        self.load = np.asarray(load, dtype=np.float64)
+        self.ev_density = np.asarray(ev_density, dtype=np.float64)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        # فارغة = تُشتق من سعة الشبكة (NaN means "derive from the grid capacity")
+        self.capacity_mw = (np.full(len(self.name), np.nan) if capacity_mw is None
+                            else np.asarray(capacity_mw, dtype=np.float64))
+        self._index = {n: i for i, n in enumerate(self.name)}
+        if len(self._index) != len(self.name):
+            raise ValueError("zone names must be unique")
+        self._build_grid(zones_per_cell)
+
+    # -- construction ---------------------------------------------------
+    @classmethod
+    def from_frame(cls, df, **kwargs):
+        missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
+        if missing:
+            raise ValueError(f"zone table is missing columns: {missing}")
+        capacity = df["capacity_mw"].to_numpy(dtype=np.float64) if "capacity_mw" in df.columns else None
+        return cls(df["name"].to_numpy(), df["load"].to_numpy(), df["ev_density"].to_numpy(),
+                   df["lat"].to_numpy(), df["lon"].to_numpy(), capacity_mw=capacity, **kwargs)
+
+    @classmethod
+    def from_file(cls, path=DEFAULT_ZONES_FILE, **kwargs):
+        path = Path(path)
+        df = pd.read_parquet(path) if path.suffix == ".parquet" else pd.read_csv(path)
+        return cls.from_frame(df, **kwargs)
+
+    @classmethod
+    def synthetic(cls, n_zones, center=(24.75, 46.65), spread_deg=0.15, seed=None, **kwargs):
+        """Random substation network for scale studies; shares sum to 1."""
+        rng = np.random.default_rng(seed)
+        load = rng.gamma(2.0, 1.0, n_zones)
+        ev = rng.gamma(2.0, 1.0, n_zones)
+        return cls([f"SS-{i:05d}" for i in range(n_zones)], load / load.sum(), ev / ev.sum(),
+                   center[0] + rng.normal(0.0, spread_deg, n_zones),
+                   center[1] + rng.normal(0.0, spread_deg, n_zones), **kwargs)
+
+    def to_frame(self):
+        return pd.DataFrame({"name": self.name, "load": self.load, "ev_density": self.ev_density,
+                             "capacity_mw": self.capacity_mw, "lat": self.lat, "lon": self.lon})
+
+    # -- accessors -------------------------------------------------------
+    def __len__(self):
+        return len(self.name)
+
+    def __contains__(self, name):
+        return name in self._index
+
+    @property
+    def names(self):
+        return self.name.tolist()
+
+    def index_of(self, name):
+        return self._index[name]
+
+    def zone_loads(self, total_load):
+        """Split a city-wide load across zones by load share."""
+        return np.multiply.outer(total_load, self.load)
+
+    def zone_capacity(self, grid_cap_gw, share=0.8):
+        """Per-zone capacity in GW; zones without a rating get ``share`` of their load share."""
+        derived = np.multiply.outer(grid_cap_gw, self.load) * share
+        return np.where(np.isnan(self.capacity_mw), derived, self.capacity_mw / 1000.0)
+
+    def bounds(self, pad_deg=0.0):
+        return (self.lat.min() - pad_deg, self.lon.min() - pad_deg,
+                self.lat.max() + pad_deg, self.lon.max() + pad_deg)
+
+    # -- spatial index ---------------------------------------------------
+    def _build_grid(self, zones_per_cell):
+        n = max(len(self.name), 1)
+        lat_min, lon_min, lat_max, lon_max = self.bounds() if len(self.name) else (0.0, 0.0, 1.0, 1.0)
+        # خلايا مربعة بحيث تحوي كل خلية بضع مناطق (square cells holding a few zones each)
+        area = max((lat_max - lat_min) * (lon_max - lon_min), 1e-12)
+        self._cell = max(np.sqrt(area * zones_per_cell / n), 1e-6)
+        self._origin = (lat_min, lon_min)
+        self._shape = (int((lat_max - lat_min) / self._cell) + 1, int((lon_max - lon_min) / self._cell) + 1)
+
+        cell_id = self._cell_of(self.lat, self.lon)
+        self._order = np.argsort(cell_id, kind="stable")
+        n_cells = self._shape[0] * self._shape[1]
+        self._starts = np.searchsorted(cell_id[self._order], np.arange(n_cells + 1))
+
+    def _rowcol(self, lat, lon):
+        row = np.floor((np.asarray(lat) - self._origin[0]) / self._cell).astype(np.int64)
+        col = np.floor((np.asarray(lon) - self._origin[1]) / self._cell).astype(np.int64)
+        return row, col
+
+    def _cell_of(self, lat, lon):
+        row, col = self._rowcol(lat, lon)
+        row = np.clip(row, 0, self._shape[0] - 1)
+        col = np.clip(col, 0, self._shape[1] - 1)
+        return row * self._shape[1] + col
+
+    def _zones_in_cells(self, rows, cols):
+        rows, cols = np.meshgrid(rows, cols, indexing="ij")
+        cells = (rows * self._shape[1] + cols).ravel()
+        starts, stops = self._starts[cells], self._starts[cells + 1]
+        lengths = stops - starts
+        if not lengths.sum():
+            return np.empty(0, dtype=np.int64)
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        return self._order[np.repeat(starts, lengths) + offsets]
+
+    def query_bbox(self, lat_min, lon_min, lat_max, lon_max):
+        """Indices of zones inside the box, visiting only overlapping cells."""
+        r0, c0 = self._rowcol(lat_min, lon_min)
+        r1, c1 = self._rowcol(lat_max, lon_max)
+        rows = np.arange(max(r0, 0), min(r1, self._shape[0] - 1) + 1)
+        cols = np.arange(max(c0, 0), min(c1, self._shape[1] - 1) + 1)
+        cand = self._zones_in_cells(rows, cols)
+        keep = ((self.lat[cand] >= lat_min) & (self.lat[cand] <= lat_max)
+                & (self.lon[cand] >= lon_min) & (self.lon[cand] <= lon_max))
+        return np.sort(cand[keep])
+
+    def nearest(self, lat, lon):
+        """Index of the nearest zone for each query point (planar lat/lon metric)."""
+        lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        lon = np.atleast_1d(np.asarray(lon, dtype=np.float64))
+        result = np.empty(len(lat), dtype=np.int64)
+        best = np.full(len(lat), np.inf)
+
+        # البحث في الخلايا المجاورة (search the 3x3 neighbourhood of each query cell)
+        cell = self._cell_of(lat, lon)
+        row, col = np.divmod(cell, self._shape[1])
+        for dr in (-1, 0, 1):
+            for dc in (-1, 0, 1):
+                r, c = row + dr, col + dc
+                valid = (r >= 0) & (r < self._shape[0]) & (c >= 0) & (c < self._shape[1])
+                nb = np.where(valid, r * self._shape[1] + c, 0)
+                starts = np.where(valid, self._starts[nb], 0)
+                lengths = np.where(valid, self._starts[nb + 1] - starts, 0)
+                if not lengths.any():
+                    continue
+                has = np.flatnonzero(lengths)
+                seg = np.cumsum(lengths) - lengths
+                offsets = np.arange(lengths.sum()) - np.repeat(seg, lengths)
+                z = self._order[np.repeat(starts, lengths) + offsets]
+                q = np.repeat(np.arange(len(lat)), lengths)
+                d = (self.lat[z] - lat[q]) ** 2 + (self.lon[z] - lon[q]) ** 2
+                # أقرب مرشح لكل استعلام (segment-wise minimum; queries are contiguous in q)
+                seg_min = np.minimum.reduceat(d, seg[has])
+                hit = d == np.repeat(seg_min, lengths[has])
+                first = np.flatnonzero(hit)
+                first = first[np.r_[True, q[first][1:] != q[first][:-1]]]
+                qs, zs, ds = q[first], z[first], d[first]
+                better = ds < best[qs]
+                best[qs[better]] = ds[better]
+                result[qs[better]] = zs[better]
+
+        # ما لم يُحسم محلياً يُحسب بالقوة (fall back to a full scan where the 3x3 ring is not conclusive)
+        unresolved = np.flatnonzero(best > self._cell ** 2)
+        for start in range(0, len(unresolved), 1024):
+            chunk = unresolved[start:start + 1024]
+            d = (self.lat[None, :] - lat[chunk, None]) ** 2 + (self.lon[None, :] - lon[chunk, None]) ** 2
+            result[chunk] = d.argmin(axis=1)
+        return result